@@ -0,0 +1,15 @@
+# emacs: -*- mode: python; py-indent-offset: 4; tab-width: 4; indent-tabs-mode: nil -*-
+# ex: set sts=4 ts=4 sw=4 noet:
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+#
+#   See COPYING file distributed along with the datalad package for the
+#   copyright and license terms.
+#
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+"""Benchmarks of datalad, to be ran with airspeed velocity (asv)
+
+    asv run            # benchmark the recent commits
+    asv dev            # quick run against the source tree
+
+Every module could also be ran directly with python for a quick look.
+"""
@@ -0,0 +1,99 @@
+# emacs: -*- mode: python; py-indent-offset: 4; tab-width: 4; indent-tabs-mode: nil -*-
+# ex: set sts=4 ts=4 sw=4 noet:
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+#
+#   See COPYING file distributed along with the datalad package for the
+#   copyright and license terms.
+#
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+"""Benchmarks of copying files' load by the methods of link_file_load
+
+Files are copied within a temporary directory, or into the directory in
+DATALAD_BENCHMARK_COPY_DST environment variable if set, e.g. to benchmark
+copies to another file system
+"""
+
+import os
+import shutil
+import tempfile
+from os.path import join as opj
+
+from datalad import cmd
+
+MiB = 1024 * 1024
+
+
+class CopyFile(object):
+    """Throughput of copying a file by each of the methods"""
+
+    number = 1
+    repeat = 3
+    timeout = 600
+
+    params = ([256], [name for name, _ in cmd._COPY_METHODS] + ['shutil'])
+    param_names = ['MiB', 'method']
+
+    def setup(self, size, method):
+        self.path = tempfile.mkdtemp(prefix='datalad_benchmark_')
+        self.dst_path = tempfile.mkdtemp(
+            prefix='datalad_benchmark_',
+            dir=os.environ.get('DATALAD_BENCHMARK_COPY_DST'))
+        self.src = opj(self.path, 'src')
+        self.dst = opj(self.dst_path, 'dst')
+        chunk = os.urandom(MiB)
+        with open(self.src, 'wb') as f:
+            for _ in range(size):
+                f.write(chunk)
+        # so the source is read from the page cache by all methods
+        with open(self.src, 'rb') as f:
+            while f.read(16 * MiB):
+                pass
+
+    def teardown(self, size, method):
+        shutil.rmtree(self.path)
+        shutil.rmtree(self.dst_path)
+
+    def time_copy(self, size, method):
+        if os.path.exists(self.dst):
+            os.unlink(self.dst)
+        if method == 'shutil':
+            shutil.copyfile(self.src, self.dst)
+            return
+        copy = dict(cmd._COPY_METHODS)[method]
+        with open(self.src, 'rb') as fsrc, open(self.dst, 'wb') as fdst:
+            try:
+                copy(fsrc.fileno(), fdst.fileno(), size * MiB)
+            except (IOError, OSError) as exc:
+                if exc.errno in cmd._UNSUPPORTED_ERRNOS:
+                    # skipped by asv
+                    raise NotImplementedError(
+                        "%s is not supported here: %s" % (method, exc))
+                raise
+
+
+class LinkFileLoad(CopyFile):
+    """link_file_load as is, i.e. hardlinking if possible"""
+
+    params = ([256], ['link_file_load'])
+
+    def time_copy(self, size, method):
+        cmd.link_file_load(self.src, self.dst)
+
+
+if __name__ == '__main__':
+    import timeit
+    for bench in (CopyFile(), LinkFileLoad()):
+        for size in bench.params[0]:
+            for method in bench.params[1]:
+                bench.setup(size, method)
+                try:
+                    t = min(timeit.repeat(
+                        lambda: bench.time_copy(size, method),
+                        number=bench.number, repeat=bench.repeat))
+                except NotImplementedError as exc:
+                    print("%s(%d MiB): %s" % (method, size, exc))
+                    continue
+                finally:
+                    bench.teardown(size, method)
+                print("%s(%d MiB): %.3f sec, %.0f MiB/s"
+                      % (method, size, t, size / t))
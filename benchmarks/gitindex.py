@@ -0,0 +1,99 @@
+# emacs: -*- mode: python; py-indent-offset: 4; tab-width: 4; indent-tabs-mode: nil -*-
+# ex: set sts=4 ts=4 sw=4 noet:
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+#
+#   See COPYING file distributed along with the datalad package for the
+#   copyright and license terms.
+#
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+"""Benchmarks of reading git's index
+
+"""
+
+import shutil
+import tempfile
+from subprocess import PIPE
+from subprocess import Popen
+from subprocess import check_call
+
+import git as gitpy
+
+from datalad.support.gitindex import GitIndex
+
+# sha of an empty blob
+EMPTY_SHA = 'e69de29bb2d1d6434b8b29ae775ad8c2e48c5391'
+
+
+def _create_index(path, n, version):
+    """Create a repository with `n` entries in its index, without files"""
+    check_call(['git', 'init', '-q', path])
+    proc = Popen(['git', 'update-index', '--index-info'], stdin=PIPE, cwd=path)
+    proc.communicate(''.join(
+        '100644 %s\td%03d/sub%03d/file%06d.dat\n'
+        % (EMPTY_SHA, i % 1000, i % 97, i) for i in range(n)).encode())
+    check_call(['git', 'update-index', '--index-version', str(version)],
+               cwd=path)
+
+
+class IndexRead(object):
+    """Cost of reading the index and testing membership of paths"""
+
+    number = 1
+    repeat = 3
+    timeout = 600
+
+    params = ([500000], [2, 4])
+    param_names = ['entries', 'version']
+
+    def setup(self, n, version):
+        self.path = tempfile.mkdtemp(prefix='datalad_benchmark_')
+        _create_index(self.path, n, version)
+        self.queries = ['d%03d/sub%03d/file%06d.dat' % (i % 1000, i % 97, i)
+                        for i in range(0, 2 * n, 5000)]
+        self.index = GitIndex(self.path)
+        len(self.index)
+
+    def teardown(self, n, version):
+        shutil.rmtree(self.path)
+
+    def time_gitpython(self, n, version):
+        if version > 3:
+            # skipped by asv
+            raise NotImplementedError("GitPython reads only index v1-v3")
+        entries = gitpy.Repo(self.path).index.entries
+        paths = [x[0] for x in entries.keys()]
+        for q in self.queries:
+            q in paths
+
+    def time_gitindex(self, n, version):
+        index = GitIndex(self.path)
+        for q in self.queries:
+            q in index
+
+    def time_gitindex_cached(self, n, version):
+        for q in self.queries:
+            q in self.index
+
+    def time_gitindex_prefix(self, n, version):
+        for i in range(1000):
+            self.index.get_files_under('d%03d' % i)
+
+
+if __name__ == '__main__':
+    import timeit
+    bench = IndexRead()
+    for n in bench.params[0]:
+        for version in bench.params[1]:
+            bench.setup(n, version)
+            try:
+                for name in sorted(dir(bench)):
+                    if name.startswith('time_'):
+                        try:
+                            t = min(timeit.repeat(
+                                lambda: getattr(bench, name)(n, version),
+                                number=bench.number, repeat=bench.repeat))
+                        except NotImplementedError:
+                            continue
+                        print("%s(%d, v%d): %.3f sec" % (name, n, version, t))
+            finally:
+                bench.teardown(n, version)
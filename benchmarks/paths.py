@@ -0,0 +1,83 @@
+# emacs: -*- mode: python; py-indent-offset: 4; tab-width: 4; indent-tabs-mode: nil -*-
+# ex: set sts=4 ts=4 sw=4 noet:
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+#
+#   See COPYING file distributed along with the datalad package for the
+#   copyright and license terms.
+#
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+"""Benchmarks of normalization of paths passed to repository methods
+
+"""
+
+import os
+import shutil
+import tempfile
+from os.path import join as opj
+from os.path import curdir
+
+from datalad.support.gitrepo import normalize_paths
+from datalad.utils import chpwd
+
+
+class _Repo(object):
+    """Stands for a repository, since only its path is needed"""
+
+    def __init__(self, path):
+        self.path = path
+
+    @normalize_paths
+    def files(self, files):
+        return files
+
+    @normalize_paths(map_filenames_back=True)
+    def files_mapped(self, files):
+        return dict((f, None) for f in files)
+
+
+class NormalizePaths(object):
+    """Cost of normalize_paths for long lists of files"""
+
+    params = ([1000, 100000], ['relative', 'absolute', 'curdir'])
+    param_names = ['files', 'kind']
+
+    def setup(self, n, kind):
+        self.topdir = tempfile.mkdtemp(prefix='datalad_benchmark_')
+        for d in range(10):
+            os.makedirs(opj(self.topdir, 'd%d' % d))
+        self.repo = _Repo(self.topdir)
+        relpaths = [opj('d%d' % (i % 10), 'file%d' % i) for i in range(n)]
+        if kind == 'relative':
+            self.paths = relpaths
+        elif kind == 'absolute':
+            self.paths = [opj(self.topdir, p) for p in relpaths]
+        else:
+            self.paths = [opj(curdir, p) for p in relpaths]
+
+    def teardown(self, n, kind):
+        shutil.rmtree(self.topdir)
+
+    def time_normalize_paths(self, n, kind):
+        with chpwd(self.topdir):
+            self.repo.files(self.paths)
+
+    def time_normalize_paths_mapped(self, n, kind):
+        with chpwd(self.topdir):
+            self.repo.files_mapped(self.paths)
+
+
+if __name__ == '__main__':
+    import timeit
+    bench = NormalizePaths()
+    for n in bench.params[0]:
+        for kind in bench.params[1]:
+            bench.setup(n, kind)
+            try:
+                for name in sorted(dir(bench)):
+                    if name.startswith('time_'):
+                        t = min(timeit.repeat(
+                            lambda: getattr(bench, name)(n, kind),
+                            number=1, repeat=3))
+                        print("%s(%d, %s): %.3f sec" % (name, n, kind, t))
+            finally:
+                bench.teardown(n, kind)
@@ -0,0 +1,85 @@
+# emacs: -*- mode: python; py-indent-offset: 4; tab-width: 4; indent-tabs-mode: nil -*-
+# ex: set sts=4 ts=4 sw=4 noet:
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+#
+#   See COPYING file distributed along with the datalad package for the
+#   copyright and license terms.
+#
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+"""Benchmarks of construction of repository instances
+
+"""
+
+import os
+import shutil
+import tempfile
+from os.path import join as opj
+from subprocess import check_call
+
+from datalad.support.annexrepo import AnnexRepo
+from datalad.distribution.dataset import Dataset
+
+
+def _create_subdatasets(topdir, n):
+    """Create `n` repositories which look like initialized annexes with
+    an ssh remote, without requiring git-annex to be installed"""
+    template = opj(topdir, 'template')
+    check_call(['git', 'init', '-q', template])
+    check_call(['git', 'remote', 'add', 'origin',
+                'ssh://example.com/path/to/ds'], cwd=template)
+    os.makedirs(opj(template, '.git', 'annex'))
+    paths = []
+    for i in range(n):
+        path = opj(topdir, 'sub%04d' % i)
+        shutil.copytree(template, path, symlinks=True)
+        paths.append(path)
+    return paths
+
+
+class SubdatasetsConstruction(object):
+    """Cost of creating instances for many subdatasets, e.g. as `ls -r` does"""
+
+    number = 1
+    repeat = 3
+    timeout = 600
+
+    params = [1000]
+    param_names = ['subdatasets']
+
+    def setup(self, n):
+        self.topdir = tempfile.mkdtemp(prefix='datalad_benchmark_')
+        self.paths = _create_subdatasets(self.topdir, n)
+        # ssh options get configured once, so make it a steady state
+        for path in self.paths:
+            AnnexRepo(path, create=False, init=False)
+
+    def teardown(self, n):
+        shutil.rmtree(self.topdir)
+
+    def time_annexrepo(self, n):
+        for path in self.paths:
+            AnnexRepo(path, create=False, init=False)
+
+    def time_annexrepo_lazy(self, n):
+        for path in self.paths:
+            AnnexRepo(path, create=False, init=False, lazy=True)
+
+    def time_dataset_repo(self, n):
+        for path in self.paths:
+            Dataset(path).repo
+
+
+if __name__ == '__main__':
+    import timeit
+    bench = SubdatasetsConstruction()
+    for n in bench.params:
+        bench.setup(n)
+        try:
+            for name in sorted(dir(bench)):
+                if name.startswith('time_'):
+                    t = min(timeit.repeat(lambda: getattr(bench, name)(n),
+                                          number=bench.number,
+                                          repeat=bench.repeat))
+                    print("%s(%d): %.3f sec" % (name, n, t))
+        finally:
+            bench.teardown(n)
@@ -20,20 +20,43 @@ import shutil
 import shlex
 import atexit
 import functools
+import tempfile
+import codecs
+import errno
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+from threading import Thread
 
 from six import PY3, PY2
-from six import string_types, binary_type
+from six import string_types, binary_type, text_type
+from six.moves.queue import Queue
 from os.path import abspath, isabs
 
 from .dochelpers import exc_str
 from .support.exceptions import CommandError
 from .support.protocol import NullProtocol, DryRunProtocol, \
-    ExecutionTimeProtocol, ExecutionTimeExternalsProtocol
+    ExecutionTimeProtocol, ExecutionTimeExternalsProtocol, \
+    ResourceUsageProtocol, get_cassette_protocol
 from .utils import on_windows
 from . import cfg
 
+try:
+    import selectors
+except ImportError:  # pragma: no cover
+    # PY2
+    selectors = None
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    # Windows
+    fcntl = None
+
 lgr = logging.getLogger('datalad.cmd')
 
+# AsyncRunner and others in datalad.cmd_async are available
+HAVE_ASYNC = sys.version_info >= (3, 5)
+
 _TEMP_std = sys.stdout, sys.stderr
 
 if PY2:
@@ -42,6 +65,200 @@ if PY2:
     # https://pypi.python.org/pypi/subprocess32/
     pass
 
+# Maximal size (in bytes) of command line arguments we would produce while
+# splitting long lists of files (see get_cmdline_chunks).  Only half of the
+# system limit, since environment is counted towards it as well
+try:
+    CMD_MAX_ARG = os.sysconf('SC_ARG_MAX') // 2
+except (ValueError, AttributeError, OSError):
+    # e.g. on Windows where the limit for the entire command line is 32k
+    CMD_MAX_ARG = 2 ** 14
+
+
+def _get_arg_size(arg):
+    # the argument itself, terminating NUL and a pointer to it in argv
+    if isinstance(arg, text_type):
+        arg = arg.encode('utf-8')
+    return len(arg) + 1 + 8
+
+
+def get_cmdline_chunks(files, base_cmd=(), max_size=None):
+    """Split list of files into chunks which fit on a command line
+
+    Parameters
+    ----------
+    files : list of str
+    base_cmd : list of str, optional
+      command with its options, to which each chunk is to be appended
+    max_size : int, optional
+      maximal size in bytes of the command line.  CMD_MAX_ARG by default
+
+    Returns
+    -------
+    list of list of str
+      Always at least a single (possibly empty) chunk
+    """
+    if max_size is None:
+        max_size = CMD_MAX_ARG
+    avail = max_size - sum(map(_get_arg_size, base_cmd))
+    chunks = []
+    chunk = []
+    chunk_size = 0
+    for f in files:
+        size = _get_arg_size(f)
+        if chunk and chunk_size + size > avail:
+            chunks.append(chunk)
+            chunk = []
+            chunk_size = 0
+        chunk.append(f)
+        chunk_size += size
+    if chunk or not chunks:
+        chunks.append(chunk)
+    return chunks
+
+
+def _iter_records(stream, sep, size=65536, chunks=None):
+    """Yield records separated by `sep` as they are read from `stream`
+
+    If `chunks` list is given, all data read is also appended to it
+    """
+    if not isinstance(sep, binary_type):
+        sep = sep.encode()
+    fd = stream.fileno()
+    tail = binary_type()
+    while True:
+        chunk = os.read(fd, size)
+        if not chunk:
+            break
+        if chunks is not None:
+            chunks.append(chunk)
+        records = (tail + chunk).split(sep)
+        tail = records.pop()
+        for record in records:
+            yield record
+    if tail:
+        yield tail
+
+
+def _decode_outputs(out):
+    """Decode outputs (bytes) of a command, with None for not captured as ''
+    """
+    if PY3:
+        return tuple("" if x is None else x.decode() for x in out)
+    return tuple("" if x is None else x for x in out)
+
+
+def _tee(items, collected):
+    """Yield `items` while appending them to `collected` list"""
+    for item in items:
+        collected.append(item)
+        yield item
+
+
+def _iter_chunks(streams, size=65536):
+    """Yield (stream, chunk) from any of the pipes `streams` as data arrives
+
+    Chunks are bytes of at most `size`.  Ends once all streams reached EOF, so
+    nothing is lost if the process exits while output is still buffered.
+    """
+    if selectors is None or on_windows:
+        for item in _iter_chunks_threaded(streams, size):
+            yield item
+        return
+    selector = selectors.DefaultSelector()
+    try:
+        for stream in streams:
+            selector.register(stream, selectors.EVENT_READ)
+        while selector.get_map():
+            for key, _ in selector.select():
+                chunk = os.read(key.fd, size)
+                if chunk:
+                    yield key.fileobj, chunk
+                else:
+                    selector.unregister(key.fileobj)
+    finally:
+        selector.close()
+
+
+def _iter_chunks_threaded(streams, size):
+    """_iter_chunks for PY2 and Windows, where pipes could not be selected
+
+    Has to be consumed till the end, or reading threads would stay blocked
+    """
+    # bounded, so readers wait for us instead of accumulating output
+    queue = Queue(maxsize=16)
+
+    def read(stream):
+        fd = stream.fileno()
+        while True:
+            chunk = os.read(fd, size)
+            if not chunk:
+                break
+            queue.put((stream, chunk))
+        queue.put((stream, None))
+
+    for stream in streams:
+        reader = Thread(target=read, args=(stream,),
+                        name="reader of %s" % stream)
+        reader.daemon = True
+        reader.start()
+    remaining = len(streams)
+    while remaining:
+        stream, chunk = queue.get()
+        if chunk is None:
+            remaining -= 1
+        else:
+            yield stream, chunk
+
+
+class _StreamConsumer(object):
+    """Consumer of chunks of output of a stream
+
+    Either passes (decoded) chunks to a callback, or collects them while
+    passing complete lines to `log_line`
+    """
+
+    __slots__ = ['callback', 'log_line', 'decoder', 'chunks', 'partial']
+
+    def __init__(self, log_line=None, callback=None):
+        self.callback = callback
+        self.log_line = log_line
+        # chunks could split multibyte characters
+        self.decoder = codecs.getincrementaldecoder('utf-8')() \
+            if callback and PY3 else None
+        self.chunks = []
+        # chunks of the line not yet logged
+        self.partial = []
+
+    def feed(self, chunk):
+        if self.callback:
+            self.callback(self.decoder.decode(chunk) if self.decoder
+                          else chunk)
+            return
+        self.chunks.append(chunk)
+        if not self.log_line:
+            return
+        if b'\n' not in chunk:
+            self.partial.append(chunk)
+            return
+        lines = (b''.join(self.partial) + chunk).split(b'\n')
+        self.partial = [lines.pop()] if lines[-1] else []
+        for line in lines:
+            self.log_line(line)
+
+    def finish(self):
+        """Return all collected output"""
+        if self.callback:
+            if self.decoder:
+                rest = self.decoder.decode(binary_type(), final=True)
+                if rest:
+                    self.callback(rest)
+            return binary_type()
+        if self.partial and self.log_line:
+            self.log_line(b''.join(self.partial))
+        return binary_type().join(self.chunks)
+
+
 class Runner(object):
     """Provides a wrapper for calling functions and commands.
 
@@ -54,6 +271,9 @@ class Runner(object):
     Additionally, a protocol object can be a used with the Runner. Such a
     protocol has to implement datalad.support.protocol.ProtocolInterface, is
     able to record calls and allows for dry runs.
+
+    A Runner could be shared among threads: its settings are not changed by
+    calls and every call keeps its own state.
     """
 
     __slots__ = ['commands', 'dry', 'cwd', 'env', 'protocol']
@@ -77,9 +297,23 @@ class Runner(object):
         if protocol is None:
             # TODO: config cmd.protocol = null
             cfg = os.environ.get('DATALAD_CMD_PROTOCOL', 'null')
+        else:
+            cfg = None
+        if cfg in ('record', 'replay'):
+            cassette = os.environ.get('DATALAD_CMD_CASSETTE')
+            if not cassette:
+                raise ValueError(
+                    "DATALAD_CMD_PROTOCOL=%s requires DATALAD_CMD_CASSETTE to "
+                    "be set to the path of the cassette file" % cfg)
+            # shared by all runners, and written at exit if recording
+            protocol = get_cassette_protocol(
+                cfg, cassette,
+                root=os.environ.get('DATALAD_CMD_CASSETTE_ROOT'))
+        elif cfg is not None:
             protocol = {
                 'externals-time': ExecutionTimeExternalsProtocol,
                 'time': ExecutionTimeProtocol,
+                'rusage': ResourceUsageProtocol,
                 'null': NullProtocol
             }[cfg]()
             if cfg != 'null':
@@ -136,37 +370,86 @@ class Runner(object):
                             False: logging.ERROR}[expected])
 
     def _get_output_online(self, proc, log_stdout, log_stderr,
-                           expect_stderr=False, expect_fail=False):
-        stdout, stderr = binary_type(), binary_type()
-        while proc.poll() is None:
-            if log_stdout:
-                line = proc.stdout.readline()
-                if line:
-                    stdout += line
-                    self._log_out(line.decode())
-                    # TODO: what level to log at? was: level=5
-                    # Changes on that should be properly adapted in
-                    # test.cmd.test_runner_log_stdout()
-            else:
-                pass
+                           expect_stderr=False, expect_fail=False,
+                           stdout_callback=None, stderr_callback=None):
+        # both streams are read as output arrives on any of them, so the
+        # process never stalls on a full pipe we are not reading from
+        def log_out(line):
+            self._log_out(line.decode())
+            # TODO: what level to log at? was: level=5
+            # Changes on that should be properly adapted in
+            # test.cmd.test_runner_log_stdout()
+
+        def log_err(line):
+            self._log_err(line.decode() if PY3 else line,
+                          expect_stderr or expect_fail)
+            # TODO: what's the proper log level here?
+            # Changes on that should be properly adapted in
+            # test.cmd.test_runner_log_stderr()
+
+        consumers = {}
+        if proc.stdout is not None:
+            consumers[proc.stdout] = _StreamConsumer(
+                log_out if log_stdout else None, stdout_callback)
+        if proc.stderr is not None:
+            consumers[proc.stderr] = _StreamConsumer(
+                log_err if log_stderr else None, stderr_callback)
+        for stream, chunk in _iter_chunks(list(consumers)):
+            consumers[stream].feed(chunk)
+        return tuple(consumers[stream].finish() if stream in consumers
+                     else None
+                     for stream in (proc.stdout, proc.stderr))
+
+    def _wait(self, proc):
+        """Wait for `proc` to finish
 
-            if log_stderr:
-                line = proc.stderr.readline()
-                if line:
-                    stderr += line
-                    self._log_err(line.decode() if PY3 else line,
-                                  expect_stderr or expect_fail)
-                    # TODO: what's the proper log level here?
-                    # Changes on that should be properly adapted in
-                    # test.cmd.test_runner_log_stderr()
+        Returns
+        -------
+        (status, rusage)
+          rusage is None unless the protocol records results and os.wait4 is
+          available
+        """
+        if proc.returncode is None and hasattr(os, 'wait4') \
+                and self.protocol.records_ext_commands \
+                and self.protocol.records_results:
+            try:
+                _, status, rusage = os.wait4(proc.pid, 0)
+            except OSError as exc:
+                # e.g. reaped already
+                lgr.debug("Failed to wait for %s: %s", proc.pid, exc_str(exc))
             else:
-                pass
-
-        return stdout, stderr
+                # so Popen would not wait for it again
+                proc.returncode = -os.WTERMSIG(status) \
+                    if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+                return proc.returncode, rusage
+        return proc.wait(), None
+
+    def _check_status(self, cmd, cwd, status, out, expect_stderr=False,
+                      expect_fail=False, log_output=True):
+        """Log (decoded) output and raise CommandError if `status` is a failure
+        """
+        # needs to be done after we know status
+        if log_output:
+            self._log_out(out[0])
+            if status not in [0, None]:
+                self._log_err(out[1], expected=expect_fail)
+            else:
+                # as directed
+                self._log_err(out[1], expected=expect_stderr)
+
+        if status not in [0, None]:
+            msg = "Failed to run %r%s. Exit code=%d. out=%s err=%s" \
+                % (cmd, " under %r" % cwd, status, out[0], out[1])
+            (lgr.debug if expect_fail else lgr.error)(msg)
+            raise CommandError(str(cmd), msg, status, out[0], out[1])
+        else:
+            self.log("Finished running %r with status %s" % (cmd, status),
+                     level=8)
 
     def run(self, cmd, log_stdout=True, log_stderr=True, log_online=False,
             expect_stderr=False, expect_fail=False,
-            cwd=None, env=None, shell=None):
+            cwd=None, env=None, shell=None,
+            stdout_callback=None, stderr_callback=None):
         """Runs the command `cmd` using shell.
 
         In case of dry-mode `cmd` is just added to `commands` and it is
@@ -219,9 +502,15 @@ class Runner(object):
             Run command in a shell.  If not specified, then it runs in a shell
             only if command is specified as a string (not a list)
 
+        stdout_callback, stderr_callback: callable, optional
+            Called with every chunk of the stream's output (str) as it arrives,
+            instead of logging and collecting it, so output of any size could
+            be consumed while the command runs.  Implies `log_online`
+
         Returns
         -------
         (stdout, stderr)
+          Empty for a stream passed to a callback
 
         Raises
         ------
@@ -231,8 +520,11 @@ class Runner(object):
            in CommandError's `stdout` and `stderr` fields respectively.
         """
 
-        outputstream = subprocess.PIPE if log_stdout else sys.stdout
-        errstream = subprocess.PIPE if log_stderr else sys.stderr
+        outputstream = subprocess.PIPE if log_stdout or stdout_callback \
+            else sys.stdout
+        errstream = subprocess.PIPE if log_stderr or stderr_callback \
+            else sys.stderr
+        log_online = log_online or bool(stdout_callback or stderr_callback)
 
         self.log("Running: %s" % (cmd,))
 
@@ -265,49 +557,251 @@ class Runner(object):
                 if self.protocol.records_ext_commands:
                     self.protocol.end_section(prot_id, prot_exc)
 
+            records_results = self.protocol.records_ext_commands \
+                and self.protocol.records_results
             if log_online:
                 out = self._get_output_online(proc, log_stdout, log_stderr,
                                               expect_stderr=expect_stderr,
-                                              expect_fail=expect_fail)
+                                              expect_fail=expect_fail,
+                                              stdout_callback=stdout_callback,
+                                              stderr_callback=stderr_callback)
+            elif records_results:
+                # communicate() would reap the process before we could get
+                # its resource usage.  Output is logged at the end as usual
+                out = self._get_output_online(proc, False, False)
             else:
                 out = proc.communicate()
 
-            if PY3:
-                # Decoding was delayed to this point
-                def decode_if_not_None(x):
-                    return "" if x is None else binary_type.decode(x)
-                # TODO: check if we can avoid PY3 specific here
-                out = tuple(map(decode_if_not_None, out))
+            status, rusage = self._wait(proc)
+            if records_results:
+                self.protocol.add_result(prot_id, status, out[0], out[1],
+                                         cwd=cwd or self.cwd,
+                                         env=env or self.env, rusage=rusage)
+
+            # Decoding was delayed to this point
+            out = _decode_outputs(out)
+
+            self._check_status(cmd, cwd or self.cwd, status, out,
+                               expect_stderr=expect_stderr,
+                               expect_fail=expect_fail,
+                               log_output=not log_online)
+
+        else:
+            cmd_args = shlex.split(cmd, posix=not on_windows) \
+                if isinstance(cmd, string_types) else cmd
+            replayed = self.protocol.replay(cmd_args, cwd=cwd or self.cwd,
+                                            env=env or self.env)
+            if self.protocol.records_ext_commands:
+                self.protocol.add_section(cmd_args, None)
+            if replayed is None:
+                out = ("DRY", "DRY")
+            else:
+                status, out = replayed[0], _decode_outputs(replayed[1:])
+                self._check_status(cmd, cwd or self.cwd, status, out,
+                                   expect_stderr=expect_stderr,
+                                   expect_fail=expect_fail)
+
+        return out
+
+    def run_gen(self, cmd, log_stderr=True, expect_stderr=False,
+                expect_fail=False, cwd=None, env=None, shell=None, sep=None):
+        """Runs the command `cmd` and yields lines of its stdout as they come
+
+        Unlike run(), stdout is never accumulated in memory, so it is suitable
+        for commands producing huge outputs, which could be processed while
+        the command is still running.  stderr is collected into a temporary
+        file, so the command would not stall on it, and logged at the end.
+
+        Parameters
+        ----------
+        cmd : str, list
+        log_stderr, expect_stderr, expect_fail, cwd, env, shell:
+            see run()
+        sep : str, optional
+            separator of records (e.g. '\\0' for output of git's -z option)
+            to split stdout on instead of lines
+
+        Yields
+        ------
+        str
+          line of stdout, including line ending.  Or a record without the
+          separator if `sep` was given
 
-            status = proc.poll()
+        Raises
+        ------
+        CommandError
+           once all of stdout was yielded, if command's exitcode wasn't 0 or
+           None.  `stdout` field is empty since it was already yielded.
+        """
+        self.log("Running: %s" % (cmd,))
 
-            # needs to be done after we know status
-            if not log_online:
-                self._log_out(out[0])
-                if status not in [0, None]:
-                    self._log_err(out[1], expected=expect_fail)
+        if not self.protocol.do_execute_ext_commands:
+            cmd_args = shlex.split(cmd, posix=not on_windows) \
+                if isinstance(cmd, string_types) else cmd
+            replayed = self.protocol.replay(cmd_args, cwd=cwd or self.cwd,
+                                            env=env or self.env)
+            if self.protocol.records_ext_commands:
+                self.protocol.add_section(cmd_args, None)
+            if replayed is None:
+                return
+            status, out, err = replayed
+            if out:
+                if sep is None:
+                    lines = out.splitlines(True)
                 else:
-                    # as directed
-                    self._log_err(out[1], expected=expect_stderr)
+                    if not isinstance(sep, binary_type):
+                        sep = sep.encode()
+                    lines = out.split(sep)
+                    if not lines[-1]:
+                        lines.pop()
+                for line in lines:
+                    yield line.decode() if PY3 else line
+            self._check_gen_status(cmd, cwd or self.cwd, status,
+                                   _decode_outputs([err])[0],
+                                   expect_stderr=expect_stderr,
+                                   expect_fail=expect_fail)
+            return
+
+        if shell is None:
+            shell = isinstance(cmd, string_types)
+
+        errstream = tempfile.TemporaryFile() if log_stderr else sys.stderr
+
+        if self.protocol.records_ext_commands:
+            prot_exc = None
+            prot_id = self.protocol.start_section(
+                shlex.split(cmd, posix=not on_windows)
+                if isinstance(cmd, string_types)
+                else cmd)
+
+        try:
+            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                                    stderr=errstream,
+                                    shell=shell,
+                                    cwd=cwd or self.cwd,
+                                    env=env or self.env)
+
+        except Exception as e:
+            prot_exc = e
+            lgr.error("Failed to start %r%r: %s" %
+                      (cmd, " under %r" % cwd if cwd else '', exc_str(e)))
+            if log_stderr:
+                errstream.close()
+            raise
 
-            if status not in [0, None]:
-                msg = "Failed to run %r%s. Exit code=%d. out=%s err=%s" \
-                    % (cmd, " under %r" % (cwd or self.cwd), status, out[0], out[1])
-                (lgr.debug if expect_fail else lgr.error)(msg)
-                raise CommandError(str(cmd), msg, status, out[0], out[1])
+        finally:
+            if self.protocol.records_ext_commands:
+                self.protocol.end_section(prot_id, prot_exc)
+
+        records_results = self.protocol.records_ext_commands \
+            and self.protocol.records_results
+        # raw output for the protocol
+        out = [] if records_results else None
+        finished = False
+        try:
+            if sep is None:
+                # iter() over readline since file iteration in PY2 reads ahead
+                lines = iter(proc.stdout.readline, binary_type())
+                if records_results:
+                    lines = _tee(lines, out)
+            else:
+                lines = _iter_records(proc.stdout, sep, chunks=out)
+            for line in lines:
+                yield line.decode() if PY3 else line
+            finished = True
+        finally:
+            proc.stdout.close()
+            if not finished and proc.poll() is None:
+                # we were not asked for the rest of the output
+                lgr.debug("Terminating %r since its output is not needed", cmd)
+                proc.terminate()
+            status, rusage = self._wait(proc)
+            if log_stderr:
+                errstream.seek(0)
+                err = errstream.read()
+                errstream.close()
             else:
-                self.log("Finished running %r with status %s" % (cmd, status),
-                         level=8)
+                err = None
+            if records_results:
+                self.protocol.add_result(prot_id, status,
+                                         binary_type().join(out), err,
+                                         cwd=cwd or self.cwd,
+                                         env=env or self.env, rusage=rusage)
+            err = _decode_outputs([err])[0]
+
+        self._check_gen_status(cmd, cwd or self.cwd, status, err,
+                               expect_stderr=expect_stderr,
+                               expect_fail=expect_fail)
+
+    def _check_gen_status(self, cmd, cwd, status, err, expect_stderr=False,
+                          expect_fail=False):
+        """Log stderr and raise CommandError if `status` of run_gen failed"""
+        if status not in [0, None]:
+            self._log_err(err, expected=expect_fail)
+            msg = "Failed to run %r%s. Exit code=%d. err=%s" \
+                % (cmd, " under %r" % cwd, status, err)
+            (lgr.debug if expect_fail else lgr.error)(msg)
+            raise CommandError(str(cmd), msg, status, '', err)
+        else:
+            self._log_err(err, expected=expect_stderr)
+            self.log("Finished running %r with status %s" % (cmd, status),
+                     level=8)
+
+    def run_chunked(self, cmd, files, parallel=False, jobs=None, **kwargs):
+        """Runs the command `cmd` with `files` appended to it
 
+        If the command line would get too long (see get_cmdline_chunks),
+        `files` are split into chunks and the command is ran per each chunk.
+
+        Parameters
+        ----------
+        cmd : list
+        files : list of str
+        parallel : bool, optional
+          Either to run chunks concurrently.  Should be used only for
+          commands which are safe to run in parallel (e.g. not modifying
+          git index)
+        jobs : int, optional
+          Maximal number of concurrent runs if `parallel`.  Number of CPUs
+          by default
+        **kwargs
+          passed to run()
+
+        Returns
+        -------
+        (stdout, stderr)
+          concatenated in the order of chunks
+
+        Raises
+        ------
+        CommandError
+          of the first failed chunk
+        """
+        chunks = get_cmdline_chunks(files, base_cmd=cmd)
+        if len(chunks) == 1:
+            return self.run(cmd + chunks[0], **kwargs)
+
+        lgr.debug("Running %s on %d files in %d chunks", cmd, len(files),
+                  len(chunks))
+
+        def run_chunk(chunk):
+            return self.run(cmd + chunk, **kwargs)
+
+        if parallel:
+            pool = ThreadPool(min(jobs or cpu_count(), len(chunks)))
+            try:
+                # map preserves the order
+                outs = pool.map(run_chunk, chunks)
+            finally:
+                pool.close()
+                pool.join()
         else:
-            if self.protocol.records_ext_commands:
-                self.protocol.add_section(shlex.split(cmd,
-                                                      posix=not on_windows)
-                                          if isinstance(cmd, string_types)
-                                          else cmd, None)
-            out = ("DRY", "DRY")
+            outs = [run_chunk(chunk) for chunk in chunks]
 
-        return out
+        if outs[0] == ('DRY', 'DRY'):
+            # nothing was ran, but replayed outputs are to be concatenated
+            return outs[0]
+        return tuple(''.join(out[i] or '' for out in outs) for i in (0, 1))
 
     def call(self, f, *args, **kwargs):
         """Helper to unify collection of logging all "dry" actions.
@@ -381,7 +875,126 @@ class GitRunner(Runner):
 
     def run(self, cmd, env=None, *args, **kwargs):
         return super(GitRunner, self).run(
-            cmd, env=self.get_git_environ_adjusted(), *args, **kwargs)
+            cmd, env=self.get_git_environ_adjusted(env), *args, **kwargs)
+
+    def run_gen(self, cmd, env=None, *args, **kwargs):
+        return super(GitRunner, self).run_gen(
+            cmd, env=self.get_git_environ_adjusted(env), *args, **kwargs)
+
+# errors of link(), ioctl() etc. meaning that the method is not supported
+# for the files, so the next one should be tried
+_UNSUPPORTED_ERRNOS = set(
+    getattr(errno, name) for name in
+    ('EXDEV', 'EPERM', 'EINVAL', 'ENOTSUP', 'EOPNOTSUPP', 'ENOSYS', 'ENOTTY',
+     'EMLINK', 'EBADF', 'ETXTBSY')
+    if hasattr(errno, name))
+# errors of link() which would be the same for any file on the same devices
+_LINK_UNSUPPORTED_ERRNOS = set(
+    getattr(errno, name) for name in ('EXDEV', 'EPERM', 'ENOTSUP')
+    if hasattr(errno, name))
+
+# ioctl to clone (reflink) a file on e.g. btrfs or XFS, from linux/fs.h
+_FICLONE = 0x40049409
+_COPY_BUFSIZE = 1024 * 1024
+
+# (device of source, device of destination) pairs which cannot be hardlinked
+_link_unsupported = set()
+# name of the copy method found to work per (device of source, device of
+# destination) pair, so other methods are not tried again
+_copy_methods = {}
+
+
+def _copy_reflink(src_fd, dst_fd, size):
+    fcntl.ioctl(dst_fd, _FICLONE, src_fd)
+
+
+def _check_copied(copied, size):
+    """Raise if not all `size` bytes were copied by an in-kernel method
+
+    Some file systems make copy_file_range (or sendfile) return 0 instead of
+    failing, so the copy must be started anew using another method
+    """
+    if copied < size:
+        raise OSError(errno.ENOTSUP,
+                      "Only %d out of %d bytes were copied" % (copied, size))
+
+
+def _copy_file_range(src_fd, dst_fd, size):
+    copied = 0
+    while copied < size:
+        n = os.copy_file_range(src_fd, dst_fd, size - copied)
+        if not n:
+            break
+        copied += n
+    _check_copied(copied, size)
+
+
+def _copy_sendfile(src_fd, dst_fd, size):
+    offset = 0
+    while offset < size:
+        n = os.sendfile(dst_fd, src_fd, offset, size - offset)
+        if not n:
+            break
+        offset += n
+    _check_copied(offset, size)
+
+
+def _copy_userspace(src_fd, dst_fd, size):
+    while True:
+        chunk = os.read(src_fd, _COPY_BUFSIZE)
+        if not chunk:
+            break
+        os.write(dst_fd, chunk)
+
+
+# from the fastest to the slowest, as available on the platform
+_COPY_METHODS = [
+    (name, method) for name, method, available in (
+        ('reflink', _copy_reflink,
+         fcntl is not None and sys.platform.startswith('linux')),
+        ('copy_file_range', _copy_file_range, hasattr(os, 'copy_file_range')),
+        # only on Linux sendfile could write to a file
+        ('sendfile', _copy_sendfile,
+         hasattr(os, 'sendfile') and sys.platform.startswith('linux')),
+        ('copy', _copy_userspace, True))
+    if available]
+
+
+def _copy_file(src, dst):
+    """Copy content of `src` into a new `dst` in the fastest way supported
+
+    Copy-on-write clone (reflink), in-kernel copy (copy_file_range or sendfile)
+    and copy via userspace are tried in this order.  The first method which
+    works is remembered for the pair of devices of `src` and `dst`.
+
+    Returns
+    -------
+    str
+      name of the method used
+    """
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        src_fd, dst_fd = fsrc.fileno(), fdst.fileno()
+        st = os.fstat(src_fd)
+        devices = (st.st_dev, os.fstat(dst_fd).st_dev)
+        names = [name for name, _ in _COPY_METHODS]
+        known = _copy_methods.get(devices)
+        start = names.index(known) if known in names else 0
+        for name, method in _COPY_METHODS[start:]:
+            try:
+                method(src_fd, dst_fd, st.st_size)
+            except (IOError, OSError) as exc:
+                if exc.errno not in _UNSUPPORTED_ERRNOS or name == 'copy':
+                    raise
+                lgr.log(5, "Copying %s using %s failed: %s",
+                        src, name, exc_str(exc))
+                # start anew, since some of the content might be copied
+                os.lseek(src_fd, 0, os.SEEK_SET)
+                os.lseek(dst_fd, 0, os.SEEK_SET)
+                os.ftruncate(dst_fd, 0)
+                continue
+            _copy_methods[devices] = name
+            return name
+
 
 # ####
 # Preserve from previous version
@@ -390,6 +1003,9 @@ class GitRunner(Runner):
 # this one might get under Runner for better output/control
 def link_file_load(src, dst, dry_run=False):
     """Just a little helper to hardlink files's load
+
+    If hardlinking is not possible (e.g. across file systems), the file is
+    copied as fast as the file systems permit (see _copy_file)
     """
     dst_dir = os.path.dirname(dst)
     if not os.path.exists(dst_dir):
@@ -399,17 +1015,28 @@ def link_file_load(src, dst, dry_run=False):
                   % locals())
         # TODO: how would it interact with git/git-annex
         os.unlink(dst)
-    lgr.debug("Hardlinking %(src)s under %(dst)s" % locals())
     src_realpath = os.path.realpath(src)
 
-    try:
-        os.link(src_realpath, dst)
-    except AttributeError as e:
-        lgr.warn("Linking of %s failed (%s), copying file" % (src, e))
-        shutil.copyfile(src_realpath, dst)
-        shutil.copystat(src_realpath, dst)
-    else:
-        lgr.log(2, "Hardlinking finished")
+    devices = (os.stat(src_realpath).st_dev, os.stat(dst_dir).st_dev)
+    if devices not in _link_unsupported:
+        lgr.debug("Hardlinking %(src)s under %(dst)s" % locals())
+        try:
+            os.link(src_realpath, dst)
+        except AttributeError as e:
+            lgr.warn("Linking of %s failed (%s), copying file" % (src, e))
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED_ERRNOS:
+                raise
+            lgr.debug("Linking of %s failed (%s), copying file", src, e)
+            if e.errno in _LINK_UNSUPPORTED_ERRNOS:
+                _link_unsupported.add(devices)
+        else:
+            lgr.log(2, "Hardlinking finished")
+            return
+
+    method = _copy_file(src_realpath, dst)
+    shutil.copystat(src_realpath, dst)
+    lgr.log(2, "Copying %s using %s finished", src, method)
 
 
 def get_runner(*args, **kwargs):
@@ -0,0 +1,229 @@
+# emacs: -*- mode: python; py-indent-offset: 4; tab-width: 4; indent-tabs-mode: nil -*-
+# ex: set sts=4 ts=4 sw=4 noet:
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+#
+#   See COPYING file distributed along with the datalad package for the
+#   copyright and license terms.
+#
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+"""
+asyncio counterparts of Runner and GitRunner to run many commands at once
+
+Requires Python >= 3.5, so import it only from code paths guarded
+accordingly (see `HAVE_ASYNC` in datalad.cmd)
+"""
+
+import asyncio
+import logging
+import shlex
+import subprocess
+from multiprocessing import cpu_count
+
+from six import string_types
+from six.moves import shlex_quote
+
+from .cmd import Runner, GitRunner
+from .cmd import _decode_outputs
+from .dochelpers import exc_str
+from .utils import on_windows
+
+lgr = logging.getLogger('datalad.cmd')
+
+
+async def gather(aws, jobs=None, return_exceptions=False):
+    """Await all `aws` with at most `jobs` of them running at once
+
+    Unlike asyncio.gather, hundreds of coroutines could be passed without
+    running them all at the same time.  If any of them fails (and
+    `return_exceptions` is False), the others are cancelled.
+
+    Parameters
+    ----------
+    aws : iterable of awaitables
+      e.g. coroutines as returned by AsyncRunner.run(), which are not started
+      until awaited here
+    jobs : int, optional
+      Maximal number of awaitables to run concurrently.  Number of CPUs by
+      default
+    return_exceptions : bool, optional
+      see asyncio.gather
+
+    Returns
+    -------
+    list
+      results in the order of `aws`
+    """
+    semaphore = asyncio.Semaphore(jobs or cpu_count())
+
+    async def bounded(aw):
+        try:
+            await semaphore.acquire()
+        except asyncio.CancelledError:
+            if asyncio.iscoroutine(aw):
+                # was never started
+                aw.close()
+            raise
+        try:
+            return await aw
+        finally:
+            semaphore.release()
+
+    tasks = [asyncio.ensure_future(bounded(aw)) for aw in aws]
+    try:
+        return await asyncio.gather(*tasks,
+                                    return_exceptions=return_exceptions)
+    except BaseException:
+        # do not leave the rest running (or waiting to run) behind
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+class AsyncRunner(object):
+    """Runs commands as asyncio coroutines
+
+    Uses the same protocols, logging and errors as Runner, which it wraps.
+    Output is collected as by Runner.run() without log_online, and is logged
+    once a command finishes.
+    """
+
+    __slots__ = ['runner']
+
+    def __init__(self, cwd=None, env=None, protocol=None):
+        """
+        Parameters
+        ----------
+        cwd, env, protocol:
+          see Runner
+        """
+        self.runner = Runner(cwd=cwd, env=env, protocol=protocol)
+
+    @property
+    def protocol(self):
+        return self.runner.protocol
+
+    def _get_env(self, env):
+        return env or self.runner.env
+
+    async def run(self, cmd, log_stdout=True, log_stderr=True,
+                  expect_stderr=False, expect_fail=False,
+                  cwd=None, env=None, shell=None):
+        """Runs the command `cmd`
+
+        If the coroutine gets cancelled, the command is killed.
+
+        Parameters
+        ----------
+        cmd : str, list
+        log_stdout, log_stderr, expect_stderr, expect_fail, cwd, env, shell:
+          see Runner.run()
+
+        Returns
+        -------
+        (stdout, stderr)
+
+        Raises
+        ------
+        CommandError
+          if command's exitcode wasn't 0
+        """
+        runner = self.runner
+        protocol = runner.protocol
+        runner.log("Running: %s" % (cmd,))
+        cmd_args = shlex.split(cmd, posix=not on_windows) \
+            if isinstance(cmd, string_types) else cmd
+
+        if not protocol.do_execute_ext_commands:
+            replayed = protocol.replay(cmd_args, cwd=cwd or runner.cwd,
+                                       env=env or runner.env)
+            if protocol.records_ext_commands:
+                protocol.add_section(cmd_args, None)
+            if replayed is None:
+                return "DRY", "DRY"
+            out = _decode_outputs(replayed[1:])
+            runner._check_status(cmd, cwd or runner.cwd, replayed[0], out,
+                                 expect_stderr=expect_stderr,
+                                 expect_fail=expect_fail)
+            return out
+
+        if shell is None:
+            shell = isinstance(cmd, string_types)
+        cwd = cwd or runner.cwd
+        kwargs = dict(
+            stdout=subprocess.PIPE if log_stdout else None,
+            stderr=subprocess.PIPE if log_stderr else None,
+            cwd=cwd, env=self._get_env(env))
+
+        if protocol.records_ext_commands:
+            prot_exc = None
+            prot_id = protocol.start_section(cmd_args)
+        try:
+            if shell:
+                proc = await asyncio.create_subprocess_shell(
+                    cmd if isinstance(cmd, string_types)
+                    else ' '.join(shlex_quote(arg) for arg in cmd),
+                    **kwargs)
+            else:
+                proc = await asyncio.create_subprocess_exec(*cmd, **kwargs)
+        except Exception as e:
+            prot_exc = e
+            lgr.error("Failed to start %r%r: %s" %
+                      (cmd, " under %r" % cwd if cwd else '', exc_str(e)))
+            raise
+        finally:
+            if protocol.records_ext_commands:
+                protocol.end_section(prot_id, prot_exc)
+
+        try:
+            out = await proc.communicate()
+        except asyncio.CancelledError:
+            lgr.debug("Killing %r since it was cancelled", cmd)
+            try:
+                proc.kill()
+            except ProcessLookupError:
+                # has finished already
+                pass
+            await proc.wait()
+            raise
+        if protocol.records_ext_commands and protocol.records_results:
+            # resource usage is not available since asyncio reaps the process
+            protocol.add_result(prot_id, proc.returncode, out[0], out[1],
+                                cwd=cwd, env=kwargs['env'])
+        out = _decode_outputs(out)
+        runner._check_status(cmd, cwd, proc.returncode, out,
+                             expect_stderr=expect_stderr,
+                             expect_fail=expect_fail)
+        return out
+
+    async def run_many(self, cmds, jobs=None, return_exceptions=False,
+                       **kwargs):
+        """Run all `cmds` with at most `jobs` of them at once
+
+        Parameters
+        ----------
+        cmds : iterable of str or list
+        jobs, return_exceptions :
+          see gather()
+        **kwargs
+          passed to run()
+
+        Returns
+        -------
+        list of (stdout, stderr)
+          in the order of `cmds`
+        """
+        return await gather((self.run(cmd, **kwargs) for cmd in cmds),
+                            jobs=jobs, return_exceptions=return_exceptions)
+
+
+class AsyncGitRunner(AsyncRunner):
+    """AsyncRunner to be used to run git and git annex commands
+
+    Adjusts environment as GitRunner does
+    """
+
+    __slots__ = []
+
+    def _get_env(self, env):
+        return GitRunner.get_git_environ_adjusted(env)
@@ -223,7 +223,7 @@ def get_repo_instance(path=curdir, class_=None):
             if class_ is None:
                 # detect repo type:
                 try:
-                    return AnnexRepo(dir_, create=False)
+                    return AnnexRepo(dir_, create=False, lazy=True)
                 except RuntimeError as e:
                     pass
                 try:
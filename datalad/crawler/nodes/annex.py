@@ -381,9 +381,9 @@ class Annexificator(object):
             lgr.debug("Adding %s to annex without url being provided" % filepath)
             # so we have only filename
             assert fpath
-            # just add into git directly for now
-            # TODO: tune  add so we could use its json output, and may be even batch it
-            out_json = _call(self.repo.add, fpath, options=self.options)
+            # batched, so there is no annex process started per each file
+            out_json = _call(self.repo.add, fpath, options=self.options,
+                             batch=True)
         # elif self.mode == 'full':
         #     # since addurl ignores annex.largefiles we need first to download that file and then
         #     # annex add it
@@ -621,8 +621,10 @@ class Annexificator(object):
         branch: str
           Branch to be merged
         target_branch: str, optional
-          Into which branch to merge. If not None, it will be checked out first.
-          At the end we will return into original branch
+          Into which branch to merge. If not None and `commit`, it is updated
+          without checking it out, unless there are conflicts to be resolved
+          in the worktree.  Otherwise it will be checked out first, and at the
+          end we will return into original branch
         strategy: None or 'theirs', optional
           With 'theirs' strategy remote branch content is used 100% as is.
           'theirs' with commit=False can be used to prepare data from that branch for
@@ -641,15 +643,18 @@ class Annexificator(object):
 
         def merge_branch(data):
 
-            if target_branch is not None:
-                orig_branch = self.repo.get_active_branch()
+            active_branch = self.repo.get_active_branch()
+            # merges committed into another branch do not need its worktree
+            detached = commit and target_branch not in (None, active_branch)
+            if target_branch is not None and not detached:
+                orig_branch = active_branch
                 target_branch_ = target_branch
                 list(self.switch_branch(target_branch_)(data))
             else:
                 orig_branch = None
-                target_branch_ = self.repo.get_active_branch()
+                target_branch_ = target_branch or active_branch
 
-            if self.repo.dirty:
+            if not detached and self.repo.dirty:
                 raise RuntimeError("Requested to merge another branch while current state is dirty")
 
             last_merged_checksum = self.repo.get_merge_base([target_branch_, branch])
@@ -679,6 +684,20 @@ class Annexificator(object):
             options = ['--no-commit'] if not commit else []
 
             for to_merge in all_to_merge:
+                if detached:
+                    msg = branch if (nmerges == 1) else ("%s (%s)" % (branch, to_merge))
+                    if strategy is None:
+                        msg = "Merge %s into %s" % (msg, target_branch_)
+                    else:
+                        msg = "Merged %s using strategy %s" % (msg, strategy)
+                    if self._merge_detached(to_merge, target_branch_, strategy=strategy, msg=msg):
+                        yield data
+                        continue
+                    lgr.info("Merge of %s into %s needs a worktree, checking it out", to_merge, target_branch_)
+                    orig_branch = active_branch
+                    list(self.switch_branch(target_branch_)(data))
+                    if self.repo.dirty:
+                        raise RuntimeError("Requested to merge another branch while current state is dirty")
                 # we might have switched away to orig_branch
                 if self.repo.get_active_branch() != target_branch_:
                     self.repo.checkout(target_branch_)
@@ -706,6 +725,42 @@ class Annexificator(object):
 
         return merge_branch
 
+    def _merge_detached(self, branch, target_branch, strategy=None, msg=None):
+        """Merge `branch` into `target_branch` using plumbing only
+
+        Neither worktree nor index are touched: the merged tree is prepared in
+        a temporary index, committed with `git commit-tree` and `target_branch`
+        is pointed to the new commit with `git update-ref`.
+
+        Returns
+        -------
+        bool
+          False if merge has conflicts, so it needs to be done in a worktree
+        """
+        repo = self.repo
+        target_sha = repo.get_hexsha(target_branch)
+        branch_sha = repo.cat_file.get_info('%s^{commit}' % branch).sha
+        target_ref = 'refs/heads/%s' % target_branch
+        if strategy == 'theirs':
+            tree = '%s^{tree}' % branch_sha
+        else:
+            base = repo.get_merge_base([target_sha, branch_sha])
+            if base == branch_sha:
+                lgr.debug("%s is already merged into %s", branch, target_branch)
+                return True
+            if base == target_sha:
+                lgr.debug("Fast-forwarding %s to %s", target_branch, branch)
+                repo.update_ref(target_ref, branch_sha, old=target_sha,
+                                msg="merge %s: Fast-forward" % branch)
+                return True
+            tree = repo.merge_trees(base, target_sha, branch_sha) if base else None
+            if tree is None:
+                return False
+        lgr.debug("Committing merge of %s into %s without checking it out", branch, target_branch)
+        merge_sha = repo.commit_tree(tree, [target_sha, branch_sha], msg=msg)
+        repo.update_ref(target_ref, merge_sha, old=target_sha, msg=msg)
+        return True
+
     def _precommit(self):
         self.repo.precommit()  # so that all batched annexes stop
         if self._statusdb:
@@ -746,25 +801,19 @@ class Annexificator(object):
         https://github.com/gitpython-developers/GitPython/issues/379#issuecomment-180101921
         is resolved
         """
-        # out, err = self.repo.cmd_call_wrapper.run(["git", "status", "--porcelain"])
-        out, err = self.repo._git_custom_command([], ["git", "status", "--porcelain"])
-        assert not err
         staged, notstaged, untracked, deleted = [], [], [], []
-        for l in out.split('\n'):
-            if not l:
-                continue
-            act = l[:2]  # first two characters is what is happening to the file
-            fname = l[3:]
+        for record in self.repo.get_status():
             try:
                 {'??': untracked,
-                 'A ': staged,
-                 'M ': staged,
-                 ' M': notstaged,
-                 ' D': deleted,
-                 }[act].append(fname)
+                 'A.': staged,
+                 'M.': staged,
+                 '.M': notstaged,
+                 '.D': deleted,
+                 }[record.status].append(record.path)
                 # for the purpose of this use, we don't even want MM or anything else
             except KeyError:
-                raise RuntimeError("git status %r not yet supported. TODO" % act)
+                raise RuntimeError("git status %r not yet supported. TODO"
+                                   % record.status)
         return staged, notstaged, untracked, deleted
 
     def commit_versions(self,
@@ -10,6 +10,7 @@
 from os import listdir
 from os.path import join as opj, exists, lexists
 from datalad.tests.utils import with_tempfile, eq_, ok_, SkipTest
+from mock import patch
 
 from ..annex import initiate_dataset
 from ..annex import Annexificator
@@ -251,6 +252,41 @@ def test_add_dir_file(repo_path, p, topurl):
     list(annex.finalize()({}))  # so it gets committed
     ok_file_under_git(path1, annexed=True)
 
+@with_tempfile(mkdir=True)
+def test_merge_branch_without_checkout(path):
+    annex = Annexificator(path=path)
+    repo = annex.repo
+
+    def commit_file(branch, name):
+        list(annex.switch_branch(branch)({}))
+        put_file_under_git(path, name, content=name)
+        list(annex.finalize()({}))
+        return repo.get_hexsha()
+
+    commit_file('master', 'base.txt')
+    list(annex.switch_branch('incoming', parent='master')({}))
+    incoming = commit_file('incoming', 'incoming.txt')
+
+    no_checkout = patch.object(repo, 'checkout',
+                               side_effect=AssertionError("must not checkout"))
+    with no_checkout:
+        list(annex.merge_branch('incoming', target_branch='master')({}))
+    eq_(repo.get_active_branch(), 'incoming')
+    # fast-forwarded
+    eq_(repo.get_hexsha('master'), incoming)
+
+    commit_file('master', 'master.txt')
+    incoming = commit_file('incoming', 'incoming2.txt')
+    with no_checkout:
+        list(annex.merge_branch('incoming', target_branch='master',
+                                strategy='theirs')({}))
+    eq_(repo.get_active_branch(), 'incoming')
+    assert_false(lexists(opj(path, 'master.txt')))
+    assert_false(repo.dirty)
+    eq_(sorted(repo.get_files('master')), sorted(repo.get_files('incoming')))
+    eq_(repo.get_merge_base(['master', 'incoming']), incoming)
+
+
 def test_commit_versions():
     raise SkipTest("TODO: is tested only as a part of test_openfmri.py")
 
@@ -197,7 +197,7 @@ class AnnexCustomRemote(object):
 
         self.repo = get_repo_instance(class_=AnnexRepo) \
             if not path \
-            else AnnexRepo(path, create=False, init=False)
+            else AnnexRepo(path, create=False, init=False, lazy=True)
 
         self.path = self.repo.path
 
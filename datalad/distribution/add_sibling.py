@@ -18,7 +18,6 @@ from os.path import join as opj, abspath, basename
 from datalad.support.param import Parameter
 from datalad.support.constraints import EnsureStr, EnsureNone
 from datalad.support.gitrepo import GitRepo
-from datalad.cmd import Runner
 from ..interface.base import Interface
 from datalad.distribution.dataset import EnsureDataset, Dataset, datasetmethod
 from datalad.utils import getpwd
@@ -175,24 +174,15 @@ class AddSibling(Interface):
                                " URL for {1} dataset(s). {2}".format(
                                    name, len(conflicting), conflicting))
 
-        runner = Runner()
         successfully_added = list()
         for repo in repos:
-            if repo in already_existing:
-                if repo not in conflicting:
-                    lgr.debug("Skipping {0}. Nothing to do.".format(repo))
-                    continue
-                # rewrite url
-                cmd = ["git", "remote", "set-url", name, repos[repo]['url']]
-                runner.run(cmd, cwd=repos[repo]['repo'].path)
-            else:
-                # add the remote
-                cmd = ["git", "remote", "add", name, repos[repo]['url']]
-                runner.run(cmd, cwd=repos[repo]['repo'].path)
-            if pushurl:
-                cmd = ["git", "remote", "set-url", "--push", name,
-                       repos[repo]['pushurl']]
-                runner.run(cmd, cwd=repos[repo]['repo'].path)
+            if repo in already_existing and repo not in conflicting:
+                lgr.debug("Skipping {0}. Nothing to do.".format(repo))
+                continue
+            # add the remote or rewrite its url(s) with a single config write
+            repos[repo]['repo'].configure_remote(
+                name, repos[repo]['url'],
+                pushurl=repos[repo]['pushurl'] if pushurl else None)
             successfully_added.append(repo)
 
         return successfully_added
@@ -10,7 +10,7 @@
 """
 
 import logging
-from os.path import abspath, join as opj, normpath
+from os.path import abspath, join as opj, normpath, lexists
 from six import string_types, PY2
 from functools import wraps
 
@@ -81,9 +81,13 @@ class Dataset(object):
         GitRepo
         """
         if self._repo is None:
+            if not lexists(opj(self._path, '.git')):
+                # there could be no repository, so do not even try
+                return None
             with swallow_logs():
                 try:
-                    self._repo = AnnexRepo(self._path, create=False, init=False)
+                    self._repo = AnnexRepo(self._path, create=False, init=False,
+                                           lazy=True)
                 except (InvalidGitRepositoryError, NoSuchPathError, RuntimeError):
                     try:
                         self._repo = GitRepo(self._path, create=False)
@@ -94,7 +98,8 @@ class Dataset(object):
             # at a later moment, so check if it didn't happen
             if 'git-annex' in self._repo.get_branches():
                 # we acquired git-annex branch
-                self._repo = AnnexRepo(self._repo.path, create=False)
+                self._repo = AnnexRepo(self._repo.path, create=False,
+                                       lazy=True)
         return self._repo
 
     def register_sibling(self, name, url, publish_url=None, verify=None):
@@ -123,13 +128,7 @@ class Dataset(object):
 
         if name not in repo.get_remotes():
             # Add remote
-            repo.add_remote(name, url)
-            if publish_url is not None:
-                # set push url:
-                repo._git_custom_command('', ["git", "remote",
-                                              "set-url",
-                                              "--push", name,
-                                              publish_url])
+            repo.configure_remote(name, url, pushurl=publish_url)
             lgr.info("Added remote '%s':\n %s (pull)\n%s (push)." %
                      (name, url, publish_url if publish_url else url))
         else:
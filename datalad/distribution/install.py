@@ -431,7 +431,7 @@ class Install(Interface):
                 # below
                 if not exists(path):
                     raise IOError("path doesn't exist yet, might need special handling")
-                elif relativepath in vcs.get_indexed_files():
+                elif relativepath in vcs.index:
                     # relativepath is in git
                     raise FileInGitError("We need to handle it as known to git")
                 else:
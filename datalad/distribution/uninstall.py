@@ -338,7 +338,7 @@ class Uninstall(Interface):
 
         else:
             # plain git repo
-            if relativepath in ds.repo.get_indexed_files():
+            if relativepath in ds.repo.index:
                 # file directly in git
                 _file_in_git = True
             else:
@@ -176,7 +176,8 @@ class DsModel(object):
     @property
     def info(self):
         if self._info is None and isinstance(self.repo, AnnexRepo):
-            self._info = self.repo.repo_info()
+            # maintained incrementally, so cheap for unchanged datasets
+            self._info = self.repo.get_content_index().totals
         return self._info
 
     @property
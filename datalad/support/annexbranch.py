@@ -0,0 +1,257 @@
+# emacs: -*- mode: python; py-indent-offset: 4; tab-width: 4; indent-tabs-mode: nil -*-
+# ex: set sts=4 ts=4 sw=4 noet:
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+#
+#   See COPYING file distributed along with the datalad package for the
+#   copyright and license terms.
+#
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+"""Reader of the information git-annex keeps in its git-annex branch
+
+git-annex records which repositories (UUIDs) have content of a key in a
+location log `<hashdir>/<key>.log` within its branch.  Reading those logs
+directly (via a persistent `git cat-file --batch`) is way faster than
+asking `git annex whereis` about many keys.
+
+Changes which git-annex did not commit to the branch yet (the journal) are
+taken into account, but unmerged git-annex branches of remotes are not.
+"""
+
+import logging
+import os
+import re
+from hashlib import md5
+from os.path import join as opj
+
+from .catfile import GitCatFile
+from .gitconfig import get_git_dir
+
+lgr = logging.getLogger('datalad.annex.branch')
+
+BRANCH = 'git-annex'
+
+# chunk fields are not part of the key for the location logs
+_CHUNK_FIELDS_REGEX = re.compile(r'-[SC]\d+(?=(-[smSC]\d+)*--)')
+
+
+def _get_non_chunk_key(key):
+    fields, sep, name = key.partition('--')
+    return _CHUNK_FIELDS_REGEX.sub('', fields + sep) + name
+
+
+def _key2file(key):
+    """Escape key to be used as a file name, as git-annex does"""
+    return key.replace('&', '&a').replace('%', '&s')\
+        .replace(':', '&c').replace('/', '%')
+
+
+def _file2key(filename):
+    """Reverse of _key2file"""
+    return filename.replace('%', '/').replace('&c', ':')\
+        .replace('&s', '%').replace('&a', '&')
+
+
+def get_key_from_location_log_path(path):
+    """Return key for a path of a location log within git-annex branch
+
+    Returns None if path is not of a location log
+    """
+    filename = path.rpartition('/')[2]
+    if path.count('/') != 2 or not filename.endswith('.log'):
+        return None
+    return _file2key(filename[:-4])
+
+
+def get_hashdir_lower(key):
+    """Return hash directory (e.g. 'a1b/2c3') for a key within git-annex branch"""
+    digest = md5(_get_non_chunk_key(key).encode('utf-8')).hexdigest()
+    return '%s/%s' % (digest[:3], digest[3:6])
+
+
+def get_location_log_path(key):
+    """Return path of the location log of a key within git-annex branch"""
+    return '%s/%s.log' % (get_hashdir_lower(key), _key2file(key))
+
+
+def _journal_file(path):
+    """Name of a file in the journal corresponding to path in the branch"""
+    return path.replace('_', '__').replace('/', '_')
+
+
+def _split_timestamp(timestamp):
+    try:
+        return float(timestamp.rstrip('s'))
+    except ValueError:
+        return 0.
+
+
+def parse_location_log(content):
+    """Return UUIDs of repositories which have the content according to the log
+
+    Parameters
+    ----------
+    content: str
+      content of a location log, with lines such as
+      '1287290776.765152s 1 e605dca6-446a-11e0-8b2a-002170d25c55'.
+      For every UUID the most recent record wins
+
+    Returns
+    -------
+    list of str
+      in the order of their first appearance in the log
+    """
+    latest = {}
+    order = []
+    for line in content.splitlines():
+        fields = line.split()
+        if len(fields) != 3:
+            continue
+        timestamp, status, uuid = fields
+        timestamp = _split_timestamp(timestamp)
+        if uuid not in latest:
+            order.append(uuid)
+        elif latest[uuid][0] > timestamp:
+            continue
+        latest[uuid] = (timestamp, status)
+    return [uuid for uuid in order if latest[uuid][1] == '1']
+
+
+def parse_uuid_log(content):
+    """Return {uuid: description} from the content of uuid.log"""
+    latest = {}
+    for line in content.splitlines():
+        uuid, _, description = line.partition(' ')
+        if not uuid:
+            continue
+        timestamp = 0.
+        head, _, tail = description.rpartition(' ')
+        if tail.startswith('timestamp='):
+            description = head
+            timestamp = _split_timestamp(tail[10:])
+        if uuid not in latest or latest[uuid][0] <= timestamp:
+            latest[uuid] = (timestamp, description)
+    return {uuid: description for uuid, (_, description) in latest.items()}
+
+
+class AnnexBranch(object):
+    """Access to the location information in the git-annex branch
+
+    Information is cached until the git-annex branch moves (i.e. gets a new
+    commit), so repeated queries cost only a single check of the branch.
+    """
+
+    def __init__(self, path, catfile=None):
+        """
+        Parameters
+        ----------
+        path: str
+          top directory of the repository
+        catfile: GitCatFile, optional
+          to be used to read the branch, e.g. to share it with the repository
+        """
+        self.path = path
+        self._catfile = catfile or GitCatFile(path)
+        self._journal_dir = opj(get_git_dir(path), 'annex', 'journal')
+        self._sha = None
+        self._locations = {}
+        self._uuids = None
+
+    def __repr__(self):
+        return "<AnnexBranch path=%s sha=%s>" % (self.path, self._sha)
+
+    @property
+    def sha(self):
+        """Current commit of the git-annex branch (None if there is no branch)
+
+        Caches are dropped if the branch has moved since the last check
+        """
+        obj = self._catfile.get_info('refs/heads/%s' % BRANCH)
+        sha = obj.sha if obj is not None else None
+        if sha != self._sha:
+            lgr.log(5, "%s branch moved to %s", BRANCH, sha)
+            self._sha = sha
+            self._locations = {}
+            self._uuids = None
+        return sha
+
+    def _get_journal(self):
+        try:
+            return set(os.listdir(self._journal_dir))
+        except OSError:
+            return set()
+
+    def _read_files(self, paths, journal):
+        """Return content (str or None if absent) of files within the branch
+
+        Files in the `journal` (not yet committed to the branch) are read
+        from there
+        """
+        out = {}
+        from_branch = []
+        for path in paths:
+            journal_file = _journal_file(path)
+            if journal_file in journal:
+                with open(opj(self._journal_dir, journal_file), 'rb') as f:
+                    out[path] = f.read().decode('utf-8')
+            else:
+                from_branch.append(path)
+        if from_branch and self._sha is not None:
+            objs = self._catfile.get_many(
+                ['%s:%s' % (self._sha, path) for path in from_branch])
+            for path, obj in zip(from_branch, objs):
+                out[path] = obj.content.decode('utf-8') if obj is not None else None
+        else:
+            out.update((path, None) for path in from_branch)
+        return out
+
+    def get_uuids(self):
+        """Return {uuid: description} of all known repositories"""
+        self.sha  # check for changes
+        journal = self._get_journal()
+        if self._uuids is not None and _journal_file('uuid.log') not in journal:
+            return self._uuids
+        content = self._read_files(['uuid.log'], journal)['uuid.log']
+        uuids = parse_uuid_log(content or '')
+        if _journal_file('uuid.log') not in journal:
+            self._uuids = uuids
+        return uuids
+
+    def get_locations(self, keys):
+        """Return UUIDs of repositories which have content of the keys
+
+        Parameters
+        ----------
+        keys: list of str
+
+        Returns
+        -------
+        dict
+          {key: [uuid, ...]}.  Keys which are not known have an empty list
+        """
+        self.sha  # check for changes
+        journal = self._get_journal()
+        out = {}
+        paths = {}
+        for key in keys:
+            if key in out:
+                continue
+            if key in self._locations and not journal:
+                out[key] = self._locations[key]
+                continue
+            path = get_location_log_path(key)
+            if key in self._locations and _journal_file(path) not in journal:
+                out[key] = self._locations[key]
+            else:
+                paths[path] = key
+                out[key] = None
+        if paths:
+            lgr.debug("Reading %d location logs from %s branch of %s",
+                      len(paths), BRANCH, self.path)
+            contents = self._read_files(list(paths), journal)
+            for path, content in contents.items():
+                key = paths[path]
+                uuids = parse_location_log(content) if content else []
+                out[key] = uuids
+                if _journal_file(path) not in journal:
+                    self._locations[key] = uuids
+        return out
@@ -0,0 +1,224 @@
+# emacs: -*- mode: python; py-indent-offset: 4; tab-width: 4; indent-tabs-mode: nil -*-
+# ex: set sts=4 ts=4 sw=4 noet:
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+#
+#   See COPYING file distributed along with the datalad package for the
+#   copyright and license terms.
+#
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+"""Information about annex keys and annexed files obtained without git-annex
+
+In indirect mode annexed files are symlinks into the annex object store
+(.git/annex/objects/Xx/Yy/KEY/KEY), so the key of a file is the name of the
+symlink's target and the content is present if the target exists.  Keys
+themselves carry the backend and (typically) the size of the content.
+
+"""
+
+import logging
+import os
+import re
+from collections import namedtuple
+from os.path import join as opj
+from os.path import exists
+from os.path import basename
+from os.path import dirname
+
+try:
+    from os import scandir
+except ImportError:  # pragma: no cover
+    # PY2
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+lgr = logging.getLogger('datalad.annex.keys')
+
+# BACKEND[-sSIZE][-mMTIME][-SCHUNKSIZE-CCHUNKNUMBER]--NAME
+_KEY_REGEX = re.compile(
+    r'^(?P<backend>[A-Za-z0-9_]+)(?P<fields>(-[smSC]\d+)*)--(?P<name>.*)$')
+
+_KEY_FIELDS = {'s': 'size', 'm': 'mtime', 'S': 'chunksize', 'C': 'chunknum'}
+
+AnnexKeyInfo = namedtuple('AnnexKeyInfo', ['key', 'backend', 'size', 'present'])
+
+
+def split_annex_key(key):
+    """Split annex key into its fields
+
+    Parameters
+    ----------
+    key: str
+
+    Returns
+    -------
+    dict
+      with 'backend' and 'name', and 'size', 'mtime', 'chunksize',
+      'chunknum' as int (or None if key has no such field)
+
+    Raises
+    ------
+    ValueError
+      if `key` doesn't look like an annex key
+    """
+    res = _KEY_REGEX.match(key)
+    if not res:
+        raise ValueError("%r is not an annex key" % key)
+    out = dict.fromkeys(_KEY_FIELDS.values())
+    out['backend'] = res.group('backend')
+    out['name'] = res.group('name')
+    for field in res.group('fields').split('-')[1:]:
+        out[_KEY_FIELDS[field[0]]] = int(field[1:])
+    return out
+
+
+def get_key_size(key):
+    """Return size of the content as recorded in the key, or None if unknown"""
+    try:
+        return split_annex_key(key)['size']
+    except ValueError:
+        return None
+
+
+def get_key_from_link_target(target):
+    """Return annex key if symlink `target` points into annex object store
+
+    Returns None otherwise
+    """
+    key = basename(target)
+    keydir = dirname(target)
+    # use / since that is what annex uses for its symlinks
+    if '/annex/objects/' not in target or basename(keydir) != key:
+        return None
+    return key
+
+
+class AnnexWorktreeIndex(object):
+    """Information about annexed files collected from the worktree
+
+    No git-annex process is started.  Works only in indirect mode.  Files
+    which are not symlinks into the annex object store (e.g. files in git,
+    untracked files, files in direct mode) are reported as None.
+
+    Information about specific files is obtained on request (`get`,
+    `lookup`), unless `scan` was called to collect information about all
+    files in the worktree in a single pass.
+    """
+
+    def __init__(self, path):
+        """
+        Parameters
+        ----------
+        path: str
+          top directory of the repository
+        """
+        self.path = path
+        self._entries = None
+
+    def __repr__(self):
+        return "<AnnexWorktreeIndex path=%s%s>" % (
+            self.path,
+            '' if self._entries is None else ' entries=%d' % len(self._entries))
+
+    @staticmethod
+    def _get_info(key, filepath):
+        try:
+            fields = split_annex_key(key)
+        except ValueError:
+            return None
+        return AnnexKeyInfo(key, fields['backend'], fields['size'],
+                            exists(filepath))
+
+    def _lookup(self, relpath):
+        filepath = opj(self.path, relpath)
+        try:
+            target = os.readlink(filepath)
+        except OSError:
+            # doesn't exist or not a symlink
+            return None
+        key = get_key_from_link_target(target)
+        return self._get_info(key, filepath) if key else None
+
+    def _iter_symlinks(self):
+        """Yield (relpath, target) for all symlinks in the worktree
+
+        As git does, directories containing .git (e.g. installed
+        subdatasets) are not descended into.
+        """
+        if scandir is None:
+            for root, dirs, files in os.walk(self.path):
+                if root == self.path:
+                    if '.git' in dirs:
+                        dirs.remove('.git')
+                elif '.git' in dirs or '.git' in files:
+                    # another repository
+                    del dirs[:]
+                    continue
+                relroot = os.path.relpath(root, self.path)
+                for f in files:
+                    filepath = opj(root, f)
+                    if os.path.islink(filepath):
+                        yield (f if relroot == os.curdir else opj(relroot, f),
+                               os.readlink(filepath))
+            return
+
+        dirs = [('', self.path)]
+        while dirs:
+            reldir, dir_ = dirs.pop()
+            entries = list(scandir(dir_))
+            if reldir and any(entry.name == '.git' for entry in entries):
+                # another repository
+                continue
+            for entry in entries:
+                if entry.name == '.git':
+                    continue
+                relpath = opj(reldir, entry.name) if reldir else entry.name
+                if entry.is_symlink():
+                    yield relpath, os.readlink(entry.path)
+                elif entry.is_dir():
+                    dirs.append((relpath, entry.path))
+
+    def scan(self):
+        """Walk the worktree once and collect information about all annexed files
+
+        Returns
+        -------
+        AnnexWorktreeIndex
+          self, for chaining
+        """
+        entries = {}
+        for relpath, target in self._iter_symlinks():
+            key = get_key_from_link_target(target)
+            if key:
+                info = self._get_info(key, opj(self.path, relpath))
+                if info:
+                    entries[relpath] = info
+        lgr.debug("Found %d annexed files under %s", len(entries), self.path)
+        self._entries = entries
+        return self
+
+    @property
+    def scanned(self):
+        return self._entries is not None
+
+    def get(self, relpath, default=None):
+        """Return AnnexKeyInfo for a file (path relative to the top directory)"""
+        if self._entries is not None:
+            return self._entries.get(relpath, default)
+        info = self._lookup(relpath)
+        return default if info is None else info
+
+    def lookup(self, files):
+        """Return list of AnnexKeyInfo (or None) per each of the files"""
+        return [self.get(f) for f in files]
+
+    def __iter__(self):
+        if self._entries is None:
+            raise RuntimeError("Worktree was not scanned yet, use scan()")
+        return iter(self._entries)
+
+    def __len__(self):
+        if self._entries is None:
+            raise RuntimeError("Worktree was not scanned yet, use scan()")
+        return len(self._entries)
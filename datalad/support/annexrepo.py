@@ -16,6 +16,7 @@ import json
 import logging
 import re
 import shlex
+import zlib
 from os import linesep
 from os import unlink
 from os.path import join as opj
@@ -24,18 +25,27 @@ from os.path import islink
 from os.path import realpath
 from os.path import lexists
 from os.path import isdir
+from os.path import basename
 from subprocess import Popen, PIPE
+from functools import partial
 from functools import wraps
+from threading import Event
+from threading import Lock
+from threading import RLock
+from threading import Thread
+from threading import BoundedSemaphore
 
 from six import string_types
 from six.moves import filter
-from six.moves.configparser import NoOptionError
+from six.moves import queue
 
+from datalad import cfg
 from datalad import ssh_manager
 from datalad.dochelpers import exc_str
 from datalad.utils import auto_repr
 from datalad.utils import on_windows
 from datalad.cmd import GitRunner
+from datalad.cmd import get_cmdline_chunks
 
 # imports from same module:
 from .gitrepo import GitRepo
@@ -49,6 +59,14 @@ from .exceptions import FileInGitError
 from .exceptions import AnnexBatchCommandError
 from .exceptions import InsufficientArgumentsError
 from .network import is_ssh
+from .annexkeys import AnnexWorktreeIndex
+from .annexbranch import AnnexBranch
+from .whereis import WhereisResult
+from .whereis import WEB_UUID
+from .contentindex import AnnexContentIndex
+from .transfer import AnnexTransfer
+from .fsck import AnnexFsck
+from .protocol import NullProtocol
 
 lgr = logging.getLogger('datalad.annex')
 
@@ -88,17 +106,36 @@ class AnnexRepo(GitRepo):
     (`self.path`). If PWD is outside of the repository, relative paths
     will be interpreted as relative to `self.path`. Absolute paths will be
     accepted either way.
+
+    An instance could be used from multiple threads to query annex (e.g.
+    `info`, `whereis`, `get_file_key`) and to add urls, since batched annex
+    processes serialize requests (see BatchedAnnex) and setup postponed by
+    `lazy` construction is completed only once.  Operations which modify
+    git index (e.g. `add`, `commit`) should still not be ran concurrently.
     """
 
-    __slots__ = GitRepo.__slots__ + ['always_commit', '_batched', '_direct_mode']
+    __slots__ = GitRepo.__slots__ + ['always_commit', '_batched', '_direct_mode',
+                                     '_ssh_pending', '_init_pending',
+                                     '_annex_branch', '_content_index',
+                                     '_lock']
 
     # Web remote has a hard-coded UUID we might (ab)use
-    WEB_UUID = "00000000-0000-0000-0000-000000000001"
+    WEB_UUID = WEB_UUID
+
+    # annex commands which do not modify the repository, so could be ran
+    # in parallel on chunks of a long list of files
+    _PARALLEL_SAFE_COMMANDS = {'find', 'info', 'whereis', 'lookupkey',
+                               'contentlocation'}
+
+    # annex commands which might need to talk to (ssh) remotes
+    _NETWORK_COMMANDS = {'get', 'copy', 'move', 'drop', 'sync', 'fsck',
+                         'initremote', 'enableremote', 'testremote'}
 
     # TODO: pass description
     def __init__(self, path, url=None, runner=None,
                  direct=False, backend=None, always_commit=True, create=True, init=False,
-                 batch_size=None, version=None, description=None):
+                 batch_size=None, version=None, description=None,
+                 batch_window=None, batch_workers=None, lazy=False):
         """Creates representation of git-annex repository at `path`.
 
         AnnexRepo is initialized by giving a path to the annex.
@@ -140,6 +177,24 @@ class AnnexRepo(GitRepo):
         description: str, optional
           short description that humans can use to identify the
           repository/location, e.g. "Precious data on my laptop"
+        batch_window: int, optional
+          how many requests to keep in flight to each batched annex process
+          (see BatchedAnnex).  If not specified, taken from 'annex.batch window'
+          datalad configuration, which defaults to 1 (no pipelining)
+        batch_workers: int, optional
+          how many batched annex processes to run in parallel for read-only
+          commands, such as 'info' or 'contentlocation' (see BatchedAnnexPool).
+          If not specified, taken from 'annex.batch workers' datalad
+          configuration, which defaults to 1
+        lazy: bool, optional
+          postpone expensive setup: annex-ssh-options for ssh remotes are
+          configured right before the first annex command which might talk
+          to remotes (e.g. get or copy), and detection of (and switching to
+          direct mode in) a not yet initialized annex -- right before the
+          first annex command.  Useful to create instances just to ask cheap
+          questions, e.g. for many subdatasets.  Note that with
+          `create=False, init=False` it is still checked right away that the
+          repository is an annex
         """
         fix_it = False
         try:
@@ -153,52 +208,93 @@ class AnnexRepo(GitRepo):
             else:
                 raise e
 
+        # guards setup postponed by lazy construction
+        self._lock = RLock()
+
         # Note: set ssh options before any possible invocation of git-annex
-        # Temporary approach to ssh connection sharing:
-        # Register every ssh remote with the corresponding control master.
+        self._ssh_pending = True
+        if not lazy:
+            self._set_ssh_options_for_remotes()
+
+        self.always_commit = always_commit
+        self._annex_branch = None
+        self._content_index = None
+        self._direct_mode = None  # we don't know yet
+        self._init_pending = None
+        if fix_it:
+            self._init(version=version, description=description)
+            self.fsck()
+
+        init_kwargs = dict(direct=direct, create=create, init=init,
+                           version=version, description=description)
+        # Check whether an annex already exists at destination
+        # XXX this doesn't work for a submodule!
+        if lazy and (create or init) \
+                and not exists(opj(self.path, '.git', 'annex')):
+            # it is either not an annex yet (and we are allowed to create it)
+            # or just not yet initialized one -- figure out upon first use
+            self._init_pending = init_kwargs
+        else:
+            self._check_initialized(**init_kwargs)
+
+        # set default backend for future annex commands:
+        # TODO: Should the backend option of __init__() also migrate
+        # the annex, in case there are annexed files already?
+        if backend:
+            lgr.debug("Setting annex backend to %s", backend)
+            with self.get_config_writer() as writer:
+                writer.set_value("annex", "backends", backend)
+
+        self._batched = BatchedAnnexes(batch_size=batch_size,
+                                       window=batch_window,
+                                       workers=batch_workers,
+                                       protocol=self.cmd_call_wrapper.protocol)
+
+    def _set_ssh_options_for_remotes(self):
+        """Register every ssh remote with the corresponding control master"""
+        # Temporary approach to ssh connection sharing.
         # Issues:
         # - currently overwrites existing ssh config of the remote
         # - request SSHConnection instance and write config even if no
         #   connection needed (but: connection is not actually created/opened)
         # - no solution for a ssh url of a file (annex addurl)
+        self._ssh_pending = False
+        config_writer = self.get_config_writer()
         for r in self.get_remotes():
-            for url in [self.get_remote_url(r),
-                        self.get_remote_url(r, push=True)]:
+            sct = "remote \"%s\"" % r
+            for url in [self.config.get_value(sct, 'url', default=None),
+                        self.config.get_value(sct, 'pushurl', default=None)]:
                 if url is not None:
                     if is_ssh(url):
                         c = ssh_manager.get_connection(url)
                         cfg_string = "-o ControlMaster=auto -S %s" % c.ctrl_path
-                        sct = "remote \"%s\"" % r
                         opt = "annex-ssh-options"
-                        reader = self.repo.config_reader()
 
                         # we write only, if there's nothing already
-                        write = False
-                        try:
-                            cfg_string_old = reader.get_value(section=sct,
-                                                              option=opt)
-                        except NoOptionError:
-                            write = True
-                            cfg_string_old = None
+                        cfg_string_old = self.config.get_value(
+                            sct, opt, default=None)
                         if cfg_string_old and cfg_string_old != cfg_string:
                             lgr.warning("Found conflicting annex-ssh-options "
                                         "for remote '{0}':\n{1}\n"
                                         "Did not touch it.".format(
                                             r, cfg_string_old))
                             continue
-                        if write:
-                            writer = self.repo.config_writer()
-                            writer.set_value(section=sct, option=opt,
-                                             value=cfg_string)
-                            writer.release()
+                        if cfg_string_old is None:
+                            config_writer.set_value(section=sct, option=opt,
+                                                    value=cfg_string)
+                            # the same url could be both url and pushurl
+                            break
+        config_writer.write()
 
-        self.always_commit = always_commit
-        if fix_it:
-            self._init(version=version, description=description)
-            self.fsck()
+    def _check_initialized(self, direct=False, create=True, init=False,
+                           version=None, description=None):
+        """Initialize annex if needed and allowed, and switch to direct mode
 
-        # Check whether an annex already exists at destination
-        # XXX this doesn't work for a submodule!
+        Raises
+        ------
+        RuntimeError
+          if there is no annex and it may not be created
+        """
         if not exists(opj(self.path, '.git', 'annex')):
             # so either it is not annex at all or just was not yet initialized
             # TODO: unify/reuse code somewhere else on detecting being annex
@@ -216,42 +312,61 @@ class AnnexRepo(GitRepo):
                 raise RuntimeError("No annex found at %s." % self.path)
 
         # only force direct mode; don't force indirect mode
-        self._direct_mode = None  # we don't know yet
         if direct and not self.is_direct_mode():
             self.set_direct_mode()
 
-        # set default backend for future annex commands:
-        # TODO: Should the backend option of __init__() also migrate
-        # the annex, in case there are annexed files already?
-        if backend:
-            lgr.debug("Setting annex backend to %s", backend)
-            # Must be done with explicit release, otherwise on Python3 would end up
-            # with .git/config wiped out
-            # see https://github.com/gitpython-developers/GitPython/issues/333#issuecomment-126633757
-            writer = self.repo.config_writer()
-            writer.set_value("annex", "backends", backend)
-            writer.release()
+    def _prepare_annex_command(self, annex_cmd=None):
+        """Complete setup postponed by `lazy` construction before running annex
 
-        self._batched = BatchedAnnexes(batch_size=batch_size)
+        Parameters
+        ----------
+        annex_cmd: str, optional
+          annex command to be ran.  If not known (e.g. for batched
+          commands), only initialization is completed
+        """
+        # other threads must wait for the setup to be completed
+        with self._lock:
+            if self._init_pending is not None and annex_cmd != 'init':
+                init_kwargs, self._init_pending = self._init_pending, None
+                self._check_initialized(**init_kwargs)
+            if self._ssh_pending and annex_cmd in self._NETWORK_COMMANDS:
+                self._set_ssh_options_for_remotes()
+
+    def _get_batched(self, codename, **kwargs):
+        """Return batched annex process from the pool (see BatchedAnnexes.get)"""
+        self._prepare_annex_command()
+        return self._batched.get(codename, **kwargs)
 
     def add_remote(self, name, url, options=''):
         """Overrides method from GitRepo in order to set
         remote.<name>.annex-ssh-options in case of a SSH remote."""
         super(AnnexRepo, self).add_remote(name, url, options)
         if is_ssh(url):
-            c = ssh_manager.get_connection(url)
-            writer = self.repo.config_writer()
-            writer.set_value("remote \"%s\"" % name,
-                             "annex-ssh-options",
-                             "-o ControlMaster=auto"
-                             " -S %s" % c.ctrl_path)
-            writer.release()
+            with self.get_config_writer() as writer:
+                self._set_ssh_options(writer, name, url)
+
+    def _set_remote_config(self, writer, name, url, pushurl=None):
+        """Overrides method from GitRepo in order to also schedule
+        remote.<name>.annex-ssh-options in case of a SSH remote."""
+        super(AnnexRepo, self)._set_remote_config(writer, name, url, pushurl)
+        for url_ in (url, pushurl):
+            if url_ is not None and is_ssh(url_):
+                self._set_ssh_options(writer, name, url_)
+                break
+
+    @staticmethod
+    def _set_ssh_options(writer, name, url):
+        c = ssh_manager.get_connection(url)
+        writer.set_value("remote \"%s\"" % name,
+                         "annex-ssh-options",
+                         "-o ControlMaster=auto"
+                         " -S %s" % c.ctrl_path)
 
     def __repr__(self):
         return "<AnnexRepo path=%s (%s)>" % (self.path, type(self))
 
     def _run_annex_command(self, annex_cmd, git_options=None, annex_options=None,
-                           backend=None, **kwargs):
+                           backend=None, files=None, **kwargs):
         """Helper to run actual git-annex calls
 
         Unifies annex command calls.
@@ -268,6 +383,10 @@ class AnnexRepo(GitRepo):
             backend to be used by this command; Currently this can also be
             achieved by having an item '--backend=XXX' in annex_options.
             This may change.
+        files: list of str, optional
+            files to be passed to the command after annex_options.  If there
+            are too many for a single command line, the command is ran
+            multiple times (in parallel if it is safe to do)
         **kwargs
             these are passed as additional kwargs to datalad.cmd.Runner.run()
 
@@ -277,6 +396,26 @@ class AnnexRepo(GitRepo):
             if an annex command call returns "unknown command"
         """
 
+        self._prepare_annex_command(annex_cmd)
+        cmd_list = self._get_annex_cmd_list(annex_cmd, git_options=git_options,
+                                            annex_options=annex_options,
+                                            backend=backend)
+        try:
+            if files is None:
+                return self.cmd_call_wrapper.run(cmd_list, **kwargs)
+            return self.cmd_call_wrapper.run_chunked(
+                cmd_list, files,
+                parallel=annex_cmd in self._PARALLEL_SAFE_COMMANDS,
+                **kwargs)
+        except CommandError as e:
+            raise self._get_annex_command_error(annex_cmd, cmd_list, e)
+
+    def _get_annex_cmd_list(self, annex_cmd, git_options=None,
+                            annex_options=None, backend=None):
+        """Helper to compose the command line for a git-annex call
+
+        See _run_annex_command for the description of the parameters
+        """
         debug = ['--debug'] if lgr.getEffectiveLevel() <= logging.DEBUG else []
         backend = ['--backend=%s' % backend] if backend else []
 
@@ -291,34 +430,29 @@ class AnnexRepo(GitRepo):
         else:
             cmd_list = ['git-annex']
         cmd_list += [annex_cmd] + backend + debug + annex_options
-
-        try:
-            return self.cmd_call_wrapper.run(cmd_list, **kwargs)
-        except CommandError as e:
-            if e.stderr and "git-annex: Unknown command '%s'" % annex_cmd in e.stderr:
-                raise CommandNotAvailableError(str(cmd_list),
-                                               "Unknown command:"
-                                               " 'git-annex %s'" % annex_cmd,
-                                               e.code, e.stdout, e.stderr)
-            else:
-                raise e
+        return cmd_list
+
+    @staticmethod
+    def _get_annex_command_error(annex_cmd, cmd_list, e):
+        """Return more specific exception for a CommandError if there is one"""
+        if e.stderr and "git-annex: Unknown command '%s'" % annex_cmd in e.stderr:
+            return CommandNotAvailableError(str(cmd_list),
+                                            "Unknown command:"
+                                            " 'git-annex %s'" % annex_cmd,
+                                            e.code, e.stdout, e.stderr)
+        else:
+            return e
 
     def _is_direct_mode_from_config(self):
         """Figure out if in direct mode from the git config.
 
-        Since relies on reading config, expensive to be used often
-
         Returns
         -------
         True if in direct mode, False otherwise.
         """
-
-        try:
-            return self.repo.config_reader().get_value("annex", "direct")
-        except NoOptionError as e:
-            # If .git/config lacks an entry "direct",
-            # it's actually indirect mode.
-            return False
+        # If .git/config lacks an entry "direct",
+        # it's actually indirect mode.
+        return self.config.get_value("annex", "direct", default=False)
 
     def is_direct_mode(self):
         """Indicates whether or not annex is in direct mode
@@ -340,13 +474,10 @@ class AnnexRepo(GitRepo):
         True if on crippled filesystem, False otherwise
         """
 
-        try:
-            return self.repo.config_reader().get_value("annex",
-                                                       "crippledfilesystem")
-        except NoOptionError as e:
-            # If .git/config lacks an entry "crippledfilesystem",
-            # it's actually not crippled.
-            return False
+        # If .git/config lacks an entry "crippledfilesystem",
+        # it's actually not crippled.
+        return self.config.get_value("annex", "crippledfilesystem",
+                                     default=False)
 
     def set_direct_mode(self, enable_direct_mode=True):
         """Switch to direct or indirect mode
@@ -395,30 +526,40 @@ class AnnexRepo(GitRepo):
         # TODO: When to expect stderr?
         # on crippled filesystem for example (think so)?
 
-    @normalize_paths
-    def get(self, files, log_online=True, options=None):
+    @normalize_paths(match_return_type=False)  # get a list even in case of a single item
+    def get(self, files, log_online=True, options=None, jobs=None,
+            progress=None):
         """Get the actual content of files
 
         Parameters
         ----------
         files: list of str
             list of paths to get
+        options: list of str, optional
+            options for the git annex get command.
+            For example `['--from=myremote']`.
+        jobs: int, optional
+            number of parallel transfers (see AnnexTransfer)
+        progress: callable, optional
+            to be called with progress records reported by annex
 
-        kwargs: options for the git annex get command.
-            For example `from='myremote'` translates to
-            annex option "--from=myremote".
+        Returns
+        -------
+        list of dict
+            records reported by `git annex get --json` (with 'file' and
+            'success' among others) for every file which did not have its
+            content yet, including files within directories given in `files`,
+            in the order of `files`.  Files which already had their content
+            are not reported.  A list is returned even for a single path
         """
-        options = options[:] if options else []
-
-        # don't capture stderr, since it provides progress display
-        # but if no online logging, then log it
-        self._run_annex_command('get', annex_options=options + files,
-                                log_stdout=True, log_stderr=not log_online,
-                                log_online=log_online, expect_stderr=True)
+        # stderr is not captured if online logging, otherwise logged
+        return AnnexTransfer(self, jobs=jobs, progress=progress).get(
+            files, options=options,
+            log_stderr=not log_online, expect_stderr=True)
 
     @normalize_paths
     def add(self, files, git=False, backend=None, options=None, commit=False,
-            msg=None):
+            msg=None, batch=False):
         """Add file(s) to the repository.
 
         Parameters
@@ -434,10 +575,18 @@ class AnnexRepo(GitRepo):
           the list of files that were added, is created by default.
         backend:
         options:
+        batch: bool, optional
+          initiate or continue with a batched run of annex add, instead of
+          just calling a single git annex add command.  As without batching,
+          annex.largefiles decides either a file goes to annex or git.  Note
+          that annex stages added files only upon `precommit()` (which is
+          done by `commit()`).  Directories can not be added in batch mode
 
         Returns
         -------
         list of dict
+          records reported by annex per each added file.  Files which annex
+          skipped (e.g. unchanged ones) are not reported
         """
         # Note: As long as we support direct mode, one should not call
         # super().add() directly. Once direct mode is gone, we might remove
@@ -446,8 +595,9 @@ class AnnexRepo(GitRepo):
             # add to git instead of annex
             # TODO: `options` currently unused in case of git
             if self.is_direct_mode():
-                cmd_list = ['git', '-c', 'core.bare=false', 'add'] + files
-                self.cmd_call_wrapper.run(cmd_list, expect_stderr=True)
+                cmd_list = ['git', '-c', 'core.bare=false', 'add']
+                self.cmd_call_wrapper.run_chunked(cmd_list, files,
+                                                  expect_stderr=True)
                 # TODO: use options with git_add instead!
             else:
                 super(AnnexRepo, self).add(files)
@@ -457,11 +607,14 @@ class AnnexRepo(GitRepo):
             # for all files:
             return_list = [{u'file': f, u'success': True} for f in files]
 
+        elif batch:
+            return_list = self._add_batched(files, backend=backend,
+                                            options=options)
         else:
             options = options[:] if options else []
 
             return_list = list(self._run_annex_command_json(
-                'add', args=options + files, backend=backend))
+                'add', args=options, files=files, backend=backend))
 
         if commit:
             if msg is None:
@@ -478,6 +631,36 @@ class AnnexRepo(GitRepo):
             self.commit(msg)  # TODO: For consisteny: Also json return value (success)?
         return return_list
 
+    def _add_batched(self, files, backend=None, options=None):
+        """Add files to annex via a batched `git annex add --batch --json`"""
+        options = options[:] if options else []
+        if backend:
+            options += ['--backend=%s' % backend]
+        bcmd = self._get_batched(
+            # there should be a process per distinct set of options
+            'add:%s' % ' '.join(options),
+            annex_cmd='add',
+            annex_options=options,
+            path=self.path,
+            json=True,
+            output_proc=readline_json_or_none
+        )
+        try:
+            out_jsons = bcmd(list(files))
+        except Exception as exc:
+            raise AnnexBatchCommandError(
+                cmd="add",
+                msg="Adding files %s failed due to %s" % (files, exc_str(exc)))
+        return_list = []
+        for f, out_json in zip(files, out_jsons):
+            if out_json is None:
+                # annex replies with an empty line for files it skipped
+                lgr.debug("annex add skipped %s", f)
+                continue
+            assert(out_json['command'] == 'add')
+            return_list.append(out_json)
+        return return_list
+
     def proxy(self, git_cmd, **kwargs):
         """Use git-annex as a proxy to git
 
@@ -516,13 +699,19 @@ class AnnexRepo(GitRepo):
                                        **kwargs)
 
     @normalize_path
-    def get_file_key(self, file_):
+    def get_file_key(self, file_, batch=False):
         """Get key of an annexed file.
 
+        In indirect mode the key is obtained from the symlink without calling
+        git-annex.
+
         Parameters
         ----------
         file_: str
             file to look up
+        batch: bool, optional
+            initiate or continue with a batched run of annex lookupkey in case
+            git-annex needs to be asked
 
         Returns
         -------
@@ -530,29 +719,28 @@ class AnnexRepo(GitRepo):
             keys used by git-annex for each of the files
         """
 
+        if not self.is_direct_mode():
+            info = AnnexWorktreeIndex(self.path).get(file_)
+            if info is not None:
+                return info.key
+            # otherwise could be e.g. an unlocked file, so ask annex
+
         cmd_str = 'git annex lookupkey %s' % file_  # have a string for messages
 
+        if batch:
+            entries = [self._get_batched('lookupkey', path=self.path)(file_)]
+            entries = [e for e in entries if e]
+            if not entries:
+                self._raise_not_in_annex(file_, cmd_str, 1)
+            return entries[0]
+
         try:
             out, err = self._run_annex_command('lookupkey',
                                                annex_options=[file_],
                                                expect_fail=True)
         except CommandError as e:
             if e.code == 1:
-                if not exists(opj(self.path, file_)):
-                    raise IOError(e.code, "File not found.", file_)
-                # XXX you don't like me because I can be real slow!
-                elif file_ in self.get_indexed_files():
-                    # if we got here, the file is present and in git,
-                    # but not in the annex
-                    raise FileInGitError(cmd=cmd_str,
-                                         msg="File not in annex, but git: %s"
-                                             % file_,
-                                         filename=file_)
-                else:
-                    raise FileNotInAnnexError(cmd=cmd_str,
-                                              msg="File not in annex: %s"
-                                                  % file_,
-                                              filename=file_)
+                self._raise_not_in_annex(file_, cmd_str, e.code)
             else:
                 # Not sure, whether or not this can actually happen
                 raise e
@@ -567,10 +755,30 @@ class AnnexRepo(GitRepo):
             raise FileNotInAnnexError("Could not get a key for a file %s -- empty output" % file_)
         return entries[0]
 
+    def _raise_not_in_annex(self, file_, cmd_str, code):
+        """Raise the most specific exception for a file annex has no key for"""
+        if not exists(opj(self.path, file_)):
+            raise IOError(code, "File not found.", file_)
+        elif file_ in self.index:
+            # if we got here, the file is present and in git,
+            # but not in the annex
+            raise FileInGitError(cmd=cmd_str,
+                                 msg="File not in annex, but git: %s"
+                                     % file_,
+                                 filename=file_)
+        else:
+            raise FileNotInAnnexError(cmd=cmd_str,
+                                      msg="File not in annex: %s"
+                                          % file_,
+                                      filename=file_)
+
     @normalize_paths
     def file_has_content(self, files):
         """Check whether files have their content present under annex.
 
+        In indirect mode it is decided from the symlinks without calling
+        git-annex, unless some files are not symlinks into annex.
+
         Parameters
         ----------
         files: list of str
@@ -583,18 +791,41 @@ class AnnexRepo(GitRepo):
         """
         # TODO: Also provide option to look for key instead of path
 
+        if self.is_direct_mode():
+            return self._file_has_content_annex(files)
+
+        out = []
+        to_ask = []  # existing files which are not symlinks into annex
+        for f, info in zip(files, AnnexWorktreeIndex(self.path).lookup(files)):
+            if info is None and lexists(opj(self.path, f)) \
+                    and not islink(opj(self.path, f)):
+                # might be e.g. an unlocked file
+                to_ask.append(f)
+            out.append(bool(info and info.present))
+        if to_ask:
+            asked = dict(zip(to_ask, self._file_has_content_annex(to_ask)))
+            out = [asked.get(f, o) for f, o in zip(files, out)]
+        return out
+
+    def _file_has_content_annex(self, files):
+        """Ask git-annex either files have their content present"""
+        # annex pukes on non existent files
+        existing = [f for f in files if lexists(opj(self.path, f))]
+        if not existing:
+            return [False] * len(files)
         try:
-            out, err = self._run_annex_command('find', annex_options=files,
+            out, err = self._run_annex_command('find', files=existing,
                                                expect_fail=True)
         except CommandError as e:
             if e.code == 1 and "not found" in e.stderr:
-                if len(files) > 1:
+                if len(existing) > 1:
                     lgr.debug("One of the files was not found, so performing "
                               "'find' operation per each file")
                     # we need to go file by file since one of them is non
                     # existent and annex pukes on it
-                    return [self.file_has_content(file_) for file_ in files]
-                return [False]
+                    return [self._file_has_content_annex([file_])[0]
+                            for file_ in files]
+                return [False] * len(files)
             else:
                 raise
 
@@ -632,14 +863,8 @@ class AnnexRepo(GitRepo):
             # info is a dict... khe khe -- "thanks" Yarik! ;)
             return [bool(info[f]) for f in files]
         else:  # ad-hoc check which should be faster than call into annex
-            out = []
-            for f in files:
-                filepath = opj(self.path, f)
-                # todo checks for being not outside of this repository
-                out.append(
-                    islink(filepath) and '.git/annex/objects' in realpath(filepath)
-                )
-            return out
+            return [info is not None
+                    for info in AnnexWorktreeIndex(self.path).lookup(files)]
 
     def init_remote(self, name, options):
         """Creates a new special remote
@@ -709,7 +934,7 @@ class AnnexRepo(GitRepo):
             if backend:
                 options += ['--backend=%s' % backend]
             # Initializes (if necessary) and obtains the batch process
-            bcmd = self._batched.get(
+            bcmd = self._get_batched(
                 # Since backend will be critical for non-existing files
                 'addurl_to_file_backend:%s' % backend,
                 annex_cmd='addurl',
@@ -769,7 +994,7 @@ class AnnexRepo(GitRepo):
         self._run_annex_command('rmurl', annex_options=[file_] + [url])
 
     @normalize_paths
-    def drop(self, files, options=None, key=False):
+    def drop(self, files, options=None, key=False, jobs=None):
         """Drops the content of annexed files from this repository.
 
         Drops only if possible with respect to required minimal number of
@@ -778,6 +1003,13 @@ class AnnexRepo(GitRepo):
         Parameters
         ----------
         files: list of str
+        jobs: int, optional
+            number of parallel drops (see AnnexTransfer)
+
+        Returns
+        -------
+        list of str
+            files (or keys if `key`) which were dropped
         """
 
         # annex drop takes either files or options
@@ -791,25 +1023,11 @@ class AnnexRepo(GitRepo):
             raise InsufficientArgumentsError("drop() requires at least to "
                                              "specify 'files' or 'options'")
 
-        options = options[:] if options else []
         files = files[:] if files else []
-
-        output_lines = []
-        if key:
-            # we can't drop multiple in 1 line, and there is no --batch yet, so
-            # one at a time
-            options = options + ['--key']
-            for k in files:
-                std_out, std_err = \
-                    self._run_annex_command('drop', annex_options=options + [k])
-                output_lines.extend(std_out.splitlines())
-        else:
-            std_out, std_err = \
-                self._run_annex_command('drop', annex_options=options + files)
-            output_lines.extend(std_out.splitlines())
-
-        return [line.split()[1] for line in output_lines
-                if line.startswith('drop') and line.endswith('ok')]
+        results = AnnexTransfer(self, jobs=jobs).drop(files, options=options,
+                                                      key=key)
+        return [r.get('key') if key and 'key' in r else r.get('file')
+                for r in results if r.get('success')]
 
     def drop_key(self, keys, options=None, batch=False):
         """Drops the content of annexed files from this repository referenced by keys
@@ -830,43 +1048,50 @@ class AnnexRepo(GitRepo):
         options = options[:] if options else []
         options += ['--force']
         if not batch:
-            json_objects = self._run_annex_command_json('dropkey', args=options + keys, expect_stderr=True)
+            json_objects = self._run_annex_command_json('dropkey', args=options, files=keys, expect_stderr=True)
         else:
-            json_objects = self._batched.get('dropkey', annex_options=options, json=True, path=self.path)(keys)
+            json_objects = self._get_batched('dropkey', annex_options=options, json=True, path=self.path)(keys)
         for j in json_objects:
             assert j.get('success', True)
 
-    # TODO: a dedicated unit-test
-    def _whereis_json_to_dict(self, j):
-        """Convert json record returned by annex whereis --json to our dict representation for it
-        """
-        assert (j.get('success', True) is True)
-        # process 'whereis' containing list of remotes
-        remotes = {remote['uuid']: {x: remote.get(x, None) for x in ('description', 'here', 'urls')}
-                   for remote in j.get('whereis')}
-        if self.WEB_UUID in remotes:
-            assert(remotes[self.WEB_UUID]['description'] == 'web')
-        return remotes
-
-    def _run_annex_command_json(self, command, args=[], **kwargs):
-        """Run an annex command with --json and load output results into a tuple of dicts
+    def _run_annex_command_json(self, command, args=[], files=None,
+                                backend=None, **kwargs):
+        """Run an annex command with --json and yield records as they come
+
+        Records are parsed while annex is still running, so neither the
+        output nor all the records are ever held in memory.  Note that the
+        command is started only as soon as the first record is requested.
+
+        Parameters
+        ----------
+        command: str
+        args: list of str
+          options and arguments for the annex command
+        files: list of str, optional
+          files to be passed after `args`.  If there are too many for a single
+          command line, the command is ran multiple times, one after another
+        backend: str, optional
+        **kwargs
+          passed to datalad.cmd.Runner.run_gen()
         """
-        try:
-            # TODO: refactor to account for possible --batch ones
-            out, err = self._run_annex_command(
-                    command,
-                    annex_options=['--json'] + args,
-                    **kwargs)
-        except CommandError as e:
-            # if multiple files, whereis may technically fail,
-            # but still returns correct response
-            if command == 'whereis' and e.code == 1 and e.stdout.startswith('{'):
-                out = e.stdout
-            else:
-                raise e
-        json_objects = (json.loads(line)
-                        for line in out.splitlines() if line.startswith('{'))
-        return json_objects
+        self._prepare_annex_command(command)
+        cmd_list = self._get_annex_cmd_list(command,
+                                            annex_options=['--json'] + args,
+                                            backend=backend)
+        for chunk in get_cmdline_chunks(files or [], base_cmd=cmd_list):
+            got_records = False
+            try:
+                for line in self.cmd_call_wrapper.run_gen(cmd_list + chunk,
+                                                          **kwargs):
+                    if line.startswith('{'):
+                        got_records = True
+                        yield json.loads(line)
+            except CommandError as e:
+                # if multiple files, whereis may technically fail,
+                # but still returns correct response
+                if command == 'whereis' and e.code == 1 and got_records:
+                    continue
+                raise self._get_annex_command_error(command, cmd_list, e)
 
     # TODO: reconsider having any magic at all and maybe just return a list/dict always
     @normalize_paths
@@ -896,8 +1121,8 @@ class AnnexRepo(GitRepo):
                 u'me@mycomputer:~/some/other/clone'
 
             if output == 'uuids', returns a list of uuids.
-            if output == 'full', returns a dictionary with filenames as keys
-            and values a detailed record, e.g.::
+            if output == 'full', returns a WhereisResult, a mapping with
+            filenames as keys and values a detailed record, e.g.::
 
                 {'00000000-0000-0000-0000-000000000001': {
                   'description': 'web',
@@ -907,7 +1132,8 @@ class AnnexRepo(GitRepo):
         """
         options = ["--key"] if key else []
 
-        json_objects = self._run_annex_command_json('whereis', args=options + files)
+        json_objects = self._run_annex_command_json('whereis', args=options,
+                                                    files=files)
 
         if output in {'descriptions', 'uuids'}:
             return [
@@ -915,13 +1141,58 @@ class AnnexRepo(GitRepo):
                 if j.get('success') else []
                 for j in json_objects]
         elif output == 'full':
-            # TODO: we might want to optimize storage since many remotes entries will be the
-            # same so we could just reuse them instead of brewing copies
-            return {j['key' if key else 'file']: self._whereis_json_to_dict(j)
-                    for j in json_objects}
+            # remotes are interned, so records are not copied per each file
+            result = WhereisResult()
+            for j in json_objects:
+                assert (j.get('success', True) is True)
+                result.add(j['key' if key else 'file'], j.get('whereis'))
+            return result
         else:
             raise ValueError("Unknown value output=%r. Known are remotes and full" % output)
 
+    @property
+    def annex_branch(self):
+        """AnnexBranch to read location information directly from git-annex branch"""
+        with self._lock:
+            if self._annex_branch is None:
+                self._annex_branch = AnnexBranch(self.path,
+                                                 catfile=self.cat_file)
+        return self._annex_branch
+
+    @normalize_paths
+    def whereis_from_branch(self, files, key=False):
+        """Lists repositories that have actual content of file(s).
+
+        Similar to `whereis(output='uuids')` but without running git-annex:
+        location logs are read directly from the git-annex branch for all
+        the files at once, and cached until the branch moves.  Unlike
+        `git annex whereis`, dead repositories are not excluded.
+
+        Parameters
+        ----------
+        files: list of str
+            files to look for
+        key: bool, optional
+            Either provided files are actually annex keys
+
+        Returns
+        -------
+        list of list of str
+            uuids of repositories per each file.  Empty list for files which
+            are not under annex
+        """
+        if key:
+            keys = files
+        else:
+            keys = []
+            for f in files:
+                try:
+                    keys.append(self.get_file_key(f, batch=True))
+                except (FileInGitError, FileNotInAnnexError):
+                    keys.append(None)
+        locations = self.annex_branch.get_locations([k for k in keys if k])
+        return [locations[k] if k else [] for k in keys]
+
     # TODO:
     #  I think we should make interface cleaner and less ambigious for those annex
     #  commands which could operate on globs, files, and entire repositories, separating
@@ -947,9 +1218,10 @@ class AnnexRepo(GitRepo):
 
         options = ['--bytes']
         if not batch:
-            json_objects = self._run_annex_command_json('info', args=options + files)
+            json_objects = self._run_annex_command_json('info', args=options,
+                                                        files=files)
         else:
-            json_objects = self._batched.get('info', annex_options=options, json=True, path=self.path)(files)
+            json_objects = self._get_batched('info', annex_options=options, json=True, path=self.path)(files)
 
         # Some aggressive checks. ATM info can be requested only per file
         # json_objects is a generator, let's keep it that way
@@ -991,15 +1263,25 @@ class AnnexRepo(GitRepo):
         assert(info.pop('command') == 'info')
         return info  # just as is for now
 
+    def get_content_index(self):
+        """Return AnnexContentIndex of annexed files in HEAD, brought up to date
+
+        Unlike `repo_info`, sizes and presence of content are maintained
+        incrementally in an index under .git/datalad/, so it is cheap for
+        unchanged repositories.  Uncommitted changes are not reflected.
+        """
+        with self._lock:
+            if self._content_index is None:
+                self._content_index = AnnexContentIndex(self.path,
+                                                        catfile=self.cat_file)
+            return self._content_index.update()
+
     def get_annexed_files(self):
         """Get a list of files in annex
         """
         # TODO: Review!
-
-        out, err = self._run_annex_command('find',
-                                           annex_options=['--include', "*"])
-        # TODO: JSON
-        return out.splitlines()
+        return [j['file'] for j in self._run_annex_command_json(
+            'find', args=['--include', "*"])]
 
     def precommit(self):
         """Perform pre-commit maintenance tasks, such as closing all batched annexes
@@ -1086,7 +1368,25 @@ class AnnexRepo(GitRepo):
             except CommandError:
                 return ''
         else:
-            return self._batched.get('contentlocation', path=self.path)(key)
+            return self._get_batched('contentlocation', path=self.path)(key)
+
+    @staticmethod
+    def _get_annex_subcommand(cmd):
+        """Return annex command (e.g. 'get') of a command line, if there is any
+
+        Parameters
+        ----------
+        cmd: list of str
+          e.g. ['git', '-c', 'opt=val', 'annex', 'get', '--fast']
+        """
+        args = iter(cmd)
+        for arg in args:
+            if arg == 'annex' or basename(arg) == 'git-annex':
+                break
+        for arg in args:
+            if not arg.startswith('-'):
+                return arg
+        return None
 
     @normalize_paths(match_return_type=False)
     def _annex_custom_command(self, files, cmd_str,
@@ -1108,11 +1408,12 @@ class AnnexRepo(GitRepo):
         -------
         stdout, stderr
         """
-        cmd = shlex.split(cmd_str + " " + " ".join(files), posix=not on_windows) \
+        cmd = shlex.split(cmd_str, posix=not on_windows) \
             if isinstance(cmd_str, string_types) \
-            else cmd_str + files
-        return self.cmd_call_wrapper.run(
-            cmd,
+            else cmd_str[:]
+        self._prepare_annex_command(self._get_annex_subcommand(cmd))
+        return self.cmd_call_wrapper.run_chunked(
+            cmd, files,
             log_stderr=log_stderr, log_stdout=log_stdout, log_online=log_online,
             expect_stderr=expect_stderr,
             cwd=cwd, env=env, shell=shell, expect_fail=expect_fail)
@@ -1140,7 +1441,7 @@ class AnnexRepo(GitRepo):
                 'git-annex migrate',
                 "Command 'migrate' is not available in direct mode.")
         self._run_annex_command('migrate',
-                                annex_options=files,
+                                files=files,
                                 backend=backend)
 
     @normalize_paths
@@ -1162,23 +1463,51 @@ class AnnexRepo(GitRepo):
 
     @property
     def default_backends(self):
-        try:
-            backends = self.repo.config_reader().get_value("annex", "backends")
-            if backends:
-                return backends.split()
-            else:
-                return None
-        except NoOptionError:
+        backends = self.config.get_value("annex", "backends", default=None)
+        if backends:
+            return backends.split()
+        else:
             return None
 
-    def fsck(self):
-        self._run_annex_command('fsck')
+    def fsck(self, incremental=False, files=None, time_limit=None, jobs=None,
+             schedule=None, fast=False):
+        """Verify annexed content
+
+        Parameters
+        ----------
+        incremental: bool, optional
+          if True, continue an incremental fsck, so that only a slice of
+          content is verified per call, but all of it within the `schedule`
+          period.  Outcomes of verification are recorded (see AnnexFsck).
+          Otherwise, all content is verified at once
+        files: list of str, optional
+          to restrict verification to (in incremental mode only)
+        time_limit: int or str, optional
+          stop after this many seconds (or as e.g. '2h').  Incremental mode only
+        jobs: int, optional
+          number of parallel checks.  Incremental mode only
+        schedule: int or str, optional
+          see AnnexFsck
+        fast: bool, optional
+          only check presence, not checksums, of content.  Incremental mode only
+
+        Returns
+        -------
+        list of dict
+          records reported by annex in incremental mode, None otherwise
+        """
+        if not incremental:
+            self._run_annex_command('fsck')
+            return
+        return list(AnnexFsck(self, schedule=schedule, jobs=jobs).run(
+            files=files, time_limit=time_limit, fast=fast))
 
     # TODO: we probably need to override get_file_content, since it returns the
     # symlink's target instead of the actual content.
 
     @normalize_paths(match_return_type=False)  # get a list even in case of a single item
-    def copy_to(self, files, remote, options=None, log_online=True):
+    def copy_to(self, files, remote, options=None, log_online=True, jobs=None,
+                progress=None):
         """Copy the actual content of `files` to `remote`
 
         Parameters
@@ -1189,6 +1518,11 @@ class AnnexRepo(GitRepo):
             name of remote to copy `files` to
         log_online: bool
             see get()
+        jobs: int, optional
+            number of parallel transfers, limited by the one configured for
+            the remote (see AnnexTransfer)
+        progress: callable, optional
+            see get()
 
         Returns
         -------
@@ -1219,32 +1553,48 @@ class AnnexRepo(GitRepo):
         #   but are ignored
         # - in case of multiple items, annex would silently skip those files
 
-        annex_options = files + ['--to=%s' % remote]
-        if options:
-            annex_options.extend(shlex.split(options))
-        # Note:
-        # As of now, there is no --json option for annex copy. Use it once this
-        # changed.
-        std_out, std_err = self._run_annex_command(
-                'copy',
-                annex_options=annex_options,
-                log_stdout=True, log_stderr=not log_online,
-                log_online=log_online, expect_stderr=True)
-
-        return [line.split()[1] for line in std_out.splitlines()
-                if line.startswith('copy ') and line.endswith('ok')]
+        annex_options = shlex.split(options) if options else []
+        results = AnnexTransfer(self, jobs=jobs, progress=progress).copy_to(
+            files, remote, options=annex_options,
+            log_stderr=not log_online, expect_stderr=True)
+        return [r['file'] for r in results if r.get('success')]
 
 
 # TODO: Why was this commented out?
 # @auto_repr
 class BatchedAnnexes(dict):
     """Class to contain the registry of active batch'ed instances of annex for a repository
+
+    `get` is safe to be called from multiple threads: a single instance is
+    started per codename.
     """
-    def __init__(self, batch_size=0):
+
+    # commands which do not modify the repository, so could be served by
+    # multiple processes in parallel
+    READONLY_COMMANDS = {'info', 'contentlocation', 'lookupkey', 'find'}
+
+    def __init__(self, batch_size=0, window=None, workers=None, protocol=None):
         self.batch_size = batch_size
+        self.protocol = protocol
+        if window is None:
+            window = int(cfg.get('annex', 'batch window', default=1))
+        self.window = window
+        if workers is None:
+            workers = int(cfg.get('annex', 'batch workers', default=1))
+        self.workers = workers
+        self._lock = Lock()
         super(BatchedAnnexes, self).__init__()
 
-    def get(self, codename, annex_cmd=None, **kwargs):
+    def get(self, codename, annex_cmd=None, workers=None, **kwargs):
+        """Return batched annex for the `codename`, starting it if needed
+
+        Parameters
+        ----------
+        workers: int, optional
+          How many processes to run in parallel.  Applies only to
+          READONLY_COMMANDS, for which it defaults to the `workers` of this
+          registry
+        """
         if annex_cmd is None:
             annex_cmd = codename
 
@@ -1252,22 +1602,42 @@ class BatchedAnnexes(dict):
         if self.batch_size:
             git_options += ['-c', 'annex.queuesize=%d' % self.batch_size]
 
-        if codename not in self:
-            # Create a new git-annex process we will keep around
-            self[codename] = BatchedAnnex(annex_cmd, git_options=git_options, **kwargs)
-        return self[codename]
+        kwargs.setdefault('window', self.window)
+        kwargs.setdefault('protocol', self.protocol)
+
+        if workers is None:
+            workers = self.workers if annex_cmd in self.READONLY_COMMANDS else 1
+        elif workers > 1 and annex_cmd not in self.READONLY_COMMANDS:
+            raise ValueError(
+                "Cannot run %d parallel processes for annex %s, only for %s"
+                % (workers, annex_cmd, ', '.join(sorted(self.READONLY_COMMANDS))))
+
+        with self._lock:
+            if codename not in self:
+                # Create a new git-annex process we will keep around
+                if workers > 1:
+                    self[codename] = BatchedAnnexPool(
+                        annex_cmd, workers=workers, git_options=git_options,
+                        **kwargs)
+                else:
+                    # a single process has nothing to dispatch among
+                    kwargs.pop('dispatch', None)
+                    self[codename] = BatchedAnnex(
+                        annex_cmd, git_options=git_options, **kwargs)
+            return self[codename]
 
     def clear(self):
         """Override just to make sure we don't rely on __del__ to close all the pipes"""
-        self.close()
-        super(BatchedAnnexes, self).clear()
+        with self._lock:
+            self.close()
+            super(BatchedAnnexes, self).clear()
 
     def close(self):
         """Close communication to all the batched annexes
 
         It does not remove them from the dictionary though
         """
-        for p in self.values():
+        for p in list(self.values()):
             p.close()
 
 
@@ -1298,14 +1668,151 @@ def readline_json(stdout):
     return json.loads(stdout.readline().strip())
 
 
+def readline_json_or_none(stdout):
+    """As readline_json but returns None for an empty line"""
+    line = stdout.readline().strip()
+    return json.loads(line) if line else None
+
+
+class _EOFTrackingStream(object):
+    """Proxy of the output of a process, telling whether it has ended
+
+    Responses might be legitimately empty, so only an exhausted stream
+    tells that the process has terminated before replying
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self.eof = False
+
+    def readline(self, *args):
+        line = self._stream.readline(*args)
+        if not line:
+            self.eof = True
+        return line
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+def _read_output(stdout, output_proc, cmd):
+    """Read a response with `output_proc`, raising if annex has terminated"""
+    try:
+        out = output_proc(stdout) if not stdout.closed else None
+    except Exception:
+        if not stdout.eof:
+            raise
+        # e.g. failed to parse an empty output as JSON
+        out = None
+    if stdout.closed or stdout.eof:
+        raise CommandError(
+            cmd=cmd,
+            msg="Batched annex process has terminated before replying")
+    return out
+
+
+class BatchedAnnexFuture(object):
+    """Placeholder for the response to a request submitted to a BatchedAnnex
+
+    Resolved by the reader thread of the BatchedAnnex as soon as annex
+    replies to the request
+    """
+
+    def __init__(self, cmd):
+        self.cmd = cmd
+        self._done = Event()
+        self._output = None
+        self._exception = None
+
+    def __repr__(self):
+        return "<BatchedAnnexFuture cmd=%r done=%s>" % (self.cmd, self.done())
+
+    def done(self):
+        return self._done.is_set()
+
+    def set_result(self, output):
+        self._output = output
+        self._done.set()
+
+    def set_exception(self, exc):
+        self._exception = exc
+        self._done.set()
+
+    def result(self, timeout=None):
+        """Wait for the response and return it
+
+        Parameters
+        ----------
+        timeout: float, optional
+          How many seconds to wait for the response.  Wait forever if None
+
+        Raises
+        ------
+        RuntimeError
+          if no response was received within `timeout`
+        """
+        if not self._done.wait(timeout):
+            raise RuntimeError("No response for %r within %s sec"
+                               % (self.cmd, timeout))
+        if self._exception is not None:
+            raise self._exception
+        return self._output
+
+
+def _read_batched_responses(stdout, pending, slots, output_proc, record=None):
+    """Resolve pending futures in order with responses read from `stdout`
+
+    Runs in a separate thread, so must not refer to the BatchedAnnex itself
+    (otherwise it would never be garbage collected)
+
+    Parameters
+    ----------
+    record: callable, optional
+      to be called with each request and its response
+    """
+    while True:
+        future = pending.get()
+        if future is None:
+            # we were asked to finish
+            break
+        try:
+            out = _read_output(stdout, output_proc, future.cmd)
+        except Exception as exc:
+            # if annex has terminated, all the futures still pending fail
+            future.set_exception(exc)
+        else:
+            lgr.log(5, "Received output: %r" % (out,))
+            if record is not None:
+                record(BatchedAnnex._get_entry(future.cmd)[:-1], out)
+            future.set_result(out)
+        slots.release()
+
+
 @auto_repr
 class BatchedAnnex(object):
     """Container for an annex process which would allow for persistent communication
+
+    With `window` > 1 requests are pipelined: up to `window` requests are sent
+    to annex without waiting for their responses, which are read by a separate
+    thread and matched back to the requests in the order they were submitted
+    (annex replies to --batch requests in order).  Use `submit()` to obtain a
+    future-like object per request, or `__call__` with a list of requests.
+
+    Instances are thread-safe: requests from different threads are
+    serialized, so every thread gets the response to its own request.
+
+    Responses (as returned by `output_proc`) are recorded by, or replayed
+    from (without starting annex), the `protocol` (see
+    ProtocolInterface.add_exchange).
     """
 
     def __init__(self, annex_cmd, git_options=[], annex_options=[], path=None,
                  json=False,
-                 output_proc=None):
+                 output_proc=None,
+                 window=1,
+                 protocol=None):
+        # guards the process and the order of requests sent to it
+        self._lock = RLock()
         self.annex_cmd = annex_cmd
         self.git_options = git_options
         self.annex_options = annex_options + (['--json'] if json else [])
@@ -1313,12 +1820,28 @@ class BatchedAnnex(object):
         if output_proc is None:
             output_proc = readline_json if json else readline_rstripped
         self.output_proc = output_proc
+        self.window = window
+        self.protocol = protocol if protocol is not None else NullProtocol()
         self._process = None
+        self._stdout = None
+        # pipelining machinery, set up only if window > 1
+        self._slots = BoundedSemaphore(window) if window > 1 else None
+        self._pending = None
+        self._reader = None
+
+    def _get_cmd(self):
+        return ['git'] + AnnexRepo._GIT_COMMON_OPTIONS + self.git_options + \
+               ['annex', self.annex_cmd] + self.annex_options + ['--batch'] # , '--debug']
+
+    def _get_recorder(self):
+        """Return callable to record a request and its response, if needed"""
+        if not self.protocol.records_results:
+            return None
+        return partial(self.protocol.add_exchange, self._get_cmd(), self.path)
 
     def _initialize(self):
         lgr.debug("Initiating a new process for %s" % repr(self))
-        cmd = ['git'] + AnnexRepo._GIT_COMMON_OPTIONS + self.git_options + \
-              ['annex', self.annex_cmd] + self.annex_options + ['--batch'] # , '--debug']
+        cmd = self._get_cmd()
         lgr.log(5, "Command: %s" % cmd)
         # TODO: look into _run_annex_command  to support default options such as --debug
         #
@@ -1333,19 +1856,114 @@ class BatchedAnnex(object):
                               , bufsize=1
                               , universal_newlines=True #**kwargs
                               )
+        self._stdout = _EOFTrackingStream(self._process.stdout)
+        if self._slots is not None:
+            self._pending = queue.Queue()
+            self._reader = Thread(
+                target=_read_batched_responses,
+                args=(self._stdout, self._pending, self._slots,
+                      self.output_proc, self._get_recorder()),
+                name="reader of %s" % self.annex_cmd)
+            self._reader.daemon = True
+            self._reader.start()
 
     def _check_process(self, restart=False):
         """Check if the process was terminated and restart if restart
 
         """
         process = self._process
-        if process and process.poll():
+        # output could end before the process is known to be terminated
+        if process and (process.poll() or self._stdout.eof):
             lgr.warning("Process %s was terminated with returncode %s" % (process, process.returncode))
             self.close()
         if self._process is None and restart:
             lgr.warning("Restarting the process due to previous failure")
             self._initialize()
 
+    @staticmethod
+    def _get_entry(cmd):
+        """Convert a request into the line to be sent to annex"""
+        if not isinstance(cmd, string_types):
+            cmd = ' '.join(cmd)
+        return cmd + '\n'
+
+    def submit(self, cmd):
+        """Send a request without waiting for the response
+
+        If `window` requests are already in flight, blocks until annex
+        replies to the oldest of them.  With `window` <= 1 the request is
+        processed right away (there is no pipelining).
+
+        Parameters
+        ----------
+        cmd : str or tuple
+
+        Returns
+        -------
+        BatchedAnnexFuture
+        """
+        entry = self._get_entry(cmd)
+        future = BatchedAnnexFuture(cmd)
+
+        if self.protocol.replays_ext_commands:
+            future.set_result(self.protocol.replay_exchange(
+                self._get_cmd(), self.path, entry[:-1]))
+            return future
+
+        if self._slots is None:
+            with self._lock:
+                if not self._process:
+                    self._initialize()
+                try:
+                    out = self._communicate(entry)
+                except Exception as exc:
+                    future.set_exception(exc)
+                    return future
+            record = self._get_recorder()
+            if record is not None:
+                record(entry[:-1], out)
+            future.set_result(out)
+            return future
+
+        # wait for a slot without holding the lock, so other threads could
+        # still close the process
+        self._slots.acquire()
+        with self._lock:
+            if not self._process:
+                self._initialize()
+            self._check_process(restart=True)
+            process = self._process  # _check_process might have restarted it
+            lgr.log(5, "Sending %r to batched annex %s" % (entry, self))
+            # the future must be queued before annex could possibly reply,
+            # and in the same order as requests are written
+            self._pending.put(future)
+            process.stdin.write(entry)
+            process.stdin.flush()
+        return future
+
+    def _communicate(self, entry):
+        """Send a single request and wait for the response"""
+        lgr.log(5, "Sending %r to batched annex %s" % (entry, self))
+        # apparently communicate is just a one time show
+        # stdout, stderr = self._process.communicate(entry)
+        # according to the internet wisdom there is no easy way with subprocess
+        self._check_process(restart=True)
+        process = self._process  # _check_process might have restarted it
+        process_stdout = self._stdout
+        process.stdin.write(entry)#.encode())
+        process.stdin.flush()
+        lgr.log(5, "Done sending.")
+        # TODO: somehow do catch stderr which might be there or not
+        #stderr = str(process.stderr) if process.stderr.closed else None
+        self._check_process(restart=False)
+        # We are expecting a single line output
+        # TODO: timeouts etc
+        stdout = _read_output(process_stdout, self.output_proc, entry.rstrip('\n'))
+        #if stderr:
+        #    lgr.warning("Received output in stderr: %r" % stderr)
+        lgr.log(5, "Received output: %r" % stdout)
+        return stdout
+
     def __call__(self, cmds):
         """
 
@@ -1360,40 +1978,14 @@ class BatchedAnnex(object):
         str or list
           Output received from annex.  list in case if cmds was a list
         """
-        # TODO: add checks -- may be process died off and needs to be reinitiated
-        if not self._process:
-            self._initialize()
-
         input_multiple = isinstance(cmds, list)
         if not input_multiple:
             cmds = [cmds]
 
-        output = []
-
-        for entry in cmds:
-            if not isinstance(entry, string_types):
-                entry = ' '.join(entry)
-            entry = entry + '\n'
-            lgr.log(5, "Sending %r to batched annex %s" % (entry, self))
-            # apparently communicate is just a one time show
-            # stdout, stderr = self._process.communicate(entry)
-            # according to the internet wisdom there is no easy way with subprocess
-            self._check_process(restart=True)
-            process = self._process  # _check_process might have restarted it
-            process.stdin.write(entry)#.encode())
-            process.stdin.flush()
-            lgr.log(5, "Done sending.")
-            # TODO: somehow do catch stderr which might be there or not
-            #stderr = str(process.stderr) if process.stderr.closed else None
-            self._check_process(restart=False)
-            # We are expecting a single line output
-            # TODO: timeouts etc
-            #import pdb; pdb.set_trace()
-            stdout = self.output_proc(process.stdout) if not process.stdout.closed else None
-            #if stderr:
-            #    lgr.warning("Received output in stderr: %r" % stderr)
-            lgr.log(5, "Received output: %r" % stdout)
-            output.append(stdout)
+        # submit all of them first, so annex could work on the ones in
+        # flight while we are sending the rest
+        futures = [self.submit(entry) for entry in cmds]
+        output = [future.result() for future in futures]
 
         return output if input_multiple else output[0]
 
@@ -1402,12 +1994,100 @@ class BatchedAnnex(object):
 
     def close(self):
         """Close communication and wait for process to terminate"""
-        if self._process:
-            process = self._process
-            lgr.debug("Closing stdin of %s and waiting process to finish", process)
-            process.stdin.close()
-            process.wait()
-            self._process = None
-            lgr.debug("Process %s has finished", process)
+        with self._lock:
+            if self._process:
+                process = self._process
+                lgr.debug("Closing stdin of %s and waiting process to finish", process)
+                try:
+                    process.stdin.close()
+                except (IOError, OSError) as exc:
+                    # it has terminated already
+                    lgr.debug("Failed to close stdin of %s: %s", process, exc_str(exc))
+                if self._reader is not None:
+                    # annex replies to all requests still in flight before exiting
+                    self._pending.put(None)
+                    self._reader.join()
+                    self._reader = None
+                    self._pending = None
+                process.wait()
+                self._process = None
+                self._stdout = None
+                lgr.debug("Process %s has finished", process)
 
 
+@auto_repr
+class BatchedAnnexPool(object):
+    """Multiple batched annex processes serving the same read-only command
+
+    Requests are dispatched among the processes either in a round-robin
+    fashion or by a hash of the request (so the same request always goes to
+    the same process).  Results are collected in the order of requests.
+    Processes are always pipelined (`window` >= 2), since otherwise they
+    would be waited upon one at a time.
+    """
+
+    def __init__(self, annex_cmd, workers=2, dispatch='round-robin',
+                 window=1, **kwargs):
+        if dispatch not in ('round-robin', 'hash'):
+            raise ValueError("Unknown dispatch=%r. Known are round-robin "
+                             "and hash" % dispatch)
+        self.annex_cmd = annex_cmd
+        self.dispatch = dispatch
+        self.window = max(window, 2)
+        self._workers = [
+            BatchedAnnex(annex_cmd, window=self.window, **kwargs)
+            for i in range(workers)]
+        self._next = 0
+        self._lock = Lock()
+
+    @property
+    def workers(self):
+        return len(self._workers)
+
+    def _get_worker(self, cmd):
+        if self.dispatch == 'hash':
+            entry = BatchedAnnex._get_entry(cmd)
+            if not isinstance(entry, bytes):
+                entry = entry.encode('utf-8')
+            # hash() is randomized in PY3, so use something stable
+            i = zlib.crc32(entry) % len(self._workers)
+        else:
+            with self._lock:
+                i = self._next
+                self._next = (i + 1) % len(self._workers)
+        return self._workers[i]
+
+    def submit(self, cmd):
+        """Send a request to one of the processes without waiting for the response
+
+        Returns
+        -------
+        BatchedAnnexFuture
+        """
+        return self._get_worker(cmd).submit(cmd)
+
+    def __call__(self, cmds):
+        """
+
+        Parameters
+        ----------
+        cmds : str or tuple or list of (str or tuple)
+
+        Returns
+        -------
+        str or list
+          Output received from annex.  list in case if cmds was a list
+        """
+        input_multiple = isinstance(cmds, list)
+        if not input_multiple:
+            cmds = [cmds]
+
+        futures = [self.submit(entry) for entry in cmds]
+        output = [future.result() for future in futures]
+
+        return output if input_multiple else output[0]
+
+    def close(self):
+        """Close communication to all the processes"""
+        for worker in self._workers:
+            worker.close()
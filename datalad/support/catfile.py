@@ -0,0 +1,216 @@
+# emacs: -*- mode: python; py-indent-offset: 4; tab-width: 4; indent-tabs-mode: nil -*-
+# ex: set sts=4 ts=4 sw=4 noet:
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+#
+#   See COPYING file distributed along with the datalad package for the
+#   copyright and license terms.
+#
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+"""Persistent `git cat-file --batch` process to read many git objects
+
+"""
+
+import logging
+from collections import namedtuple
+from io import BytesIO
+from subprocess import Popen, PIPE
+from threading import Lock
+from threading import Thread
+
+from datalad.cmd import GitRunner
+from datalad.utils import auto_repr
+from .protocol import NullProtocol
+
+lgr = logging.getLogger('datalad.gitrepo.catfile')
+
+GitObject = namedtuple('GitObject', ['sha', 'type', 'size', 'content'])
+
+
+@auto_repr
+class GitCatFile(object):
+    """Persistent `git cat-file --batch` and `--batch-check` processes
+
+    Objects are requested by anything `git cat-file` understands, e.g.
+    '<sha>', 'HEAD:README' or 'git-annex:uuid.log'.  Content is returned as
+    bytes, as read from git.  Processes are started upon first request and
+    stay around until `close()`.  If only sha, type or size of objects are
+    needed, `get_info` avoids transferring their content.
+
+    Responses are recorded by, or replayed from (without starting any
+    process), the `protocol` (see ProtocolInterface.add_exchange).
+    """
+
+    def __init__(self, path, protocol=None):
+        """
+        Parameters
+        ----------
+        path: str
+          top directory of the repository
+        protocol: ProtocolInterface, optional
+          e.g. the protocol of the Runner of the repository
+        """
+        self.path = path
+        self.protocol = protocol if protocol is not None else NullProtocol()
+        # per mode ('batch' or 'batch-check')
+        self._processes = {}
+        self._lock = Lock()
+
+    @staticmethod
+    def _get_cmd(mode):
+        return ['git', 'cat-file', '--%s' % mode]
+
+    def _initialize(self, mode):
+        cmd = self._get_cmd(mode)
+        lgr.debug("Initiating a new process for %s", cmd)
+        self._processes[mode] = Popen(
+            cmd, stdin=PIPE, stdout=PIPE,
+            env=GitRunner.get_git_environ_adjusted(), cwd=self.path)
+
+    def _get_process(self, mode):
+        process = self._processes.get(mode)
+        if process is None or process.poll() is not None:
+            self._initialize(mode)
+        return self._processes[mode]
+
+    @staticmethod
+    def _encode_request(ref):
+        if not isinstance(ref, bytes):
+            ref = ref.encode('utf-8')
+        if b'\n' in ref:
+            raise ValueError("Object name %r contains a newline" % ref)
+        return ref + b'\n'
+
+    @staticmethod
+    def _read_response(stdout, with_content=True):
+        header = stdout.readline()
+        if not header:
+            raise RuntimeError("git cat-file has terminated unexpectedly")
+        fields = header.split()
+        if fields[-1] == b'missing' or len(fields) != 3:
+            # 'missing' or 'ambiguous'
+            return None
+        sha, type_, size = fields
+        size = int(size)
+        content = None
+        if with_content:
+            content = stdout.read(size)
+            stdout.read(1)  # trailing newline
+        return GitObject(sha.decode(), type_.decode(), size, content)
+
+    @staticmethod
+    def _format_response(obj):
+        """Return bytes as read from git for GitObject `obj` (or None)"""
+        if obj is None:
+            return b''
+        header = '%s %s %d\n' % (obj.sha, obj.type, obj.size)
+        return header.encode() + (obj.content or b'')
+
+    def _request(self, mode, refs):
+        requests = [self._encode_request(ref) for ref in refs]
+        if not requests:
+            return []
+        with_content = mode == 'batch'
+        protocol = self.protocol
+        if protocol.replays_ext_commands:
+            responses = [
+                protocol.replay_exchange(self._get_cmd(mode), self.path,
+                                         request[:-1].decode('utf-8'))
+                for request in requests]
+            return [self._read_response(BytesIO(response), with_content)
+                    if response else None
+                    for response in responses]
+        objects = self._communicate(mode, requests, with_content)
+        if protocol.records_results:
+            for request, obj in zip(requests, objects):
+                protocol.add_exchange(self._get_cmd(mode), self.path,
+                                      request[:-1].decode('utf-8'),
+                                      self._format_response(obj))
+        return objects
+
+    def _communicate(self, mode, requests, with_content):
+        with self._lock:
+            process = self._get_process(mode)
+            if len(requests) == 1:
+                process.stdin.write(requests[0])
+                process.stdin.flush()
+                try:
+                    return [self._read_response(process.stdout, with_content)]
+                except Exception:
+                    process.kill()
+                    self._processes.pop(mode, None)
+                    raise
+
+            # pipes are of limited size, so requests must be written while
+            # responses are read, or both sides would block
+            def write():
+                try:
+                    for request in requests:
+                        process.stdin.write(request)
+                    process.stdin.flush()
+                except (IOError, OSError) as exc:
+                    lgr.debug("Failed to send requests to git cat-file: %s", exc)
+            writer = Thread(target=write, name="writer to git cat-file")
+            writer.daemon = True
+            writer.start()
+            try:
+                return [self._read_response(process.stdout, with_content)
+                        for _ in requests]
+            except Exception:
+                # responses would be out of sync, so start anew next time
+                process.kill()
+                self._processes.pop(mode, None)
+                raise
+            finally:
+                writer.join()
+
+    def get(self, ref):
+        """Return GitObject for `ref`, or None if there is no such object"""
+        return self.get_many([ref])[0]
+
+    def get_many(self, refs):
+        """Return GitObject (or None if there is none) for each of the refs
+
+        All requests are sent while responses are being read, so there is a
+        single round trip to git for all of them.
+        """
+        return self._request('batch', refs)
+
+    def get_info(self, ref):
+        """Return GitObject without content for `ref`, or None if there is none
+        """
+        return self.get_info_many([ref])[0]
+
+    def get_info_many(self, refs):
+        """Return GitObject without content (or None) for each of the refs"""
+        return self._request('batch-check', refs)
+
+    def read_blobs(self, refs, treeish=None):
+        """Return content of blobs as bytes (None if there is no such blob)
+
+        Parameters
+        ----------
+        refs: list of str
+          shas of blobs, or paths if `treeish` is given
+        treeish: str, optional
+          commit or tree (e.g. a branch) to read paths `refs` from
+        """
+        if treeish is not None:
+            refs = ['%s:%s' % (treeish, ref) for ref in refs]
+        return [obj.content if obj is not None and obj.type == 'blob'
+                else None
+                for obj in self.get_many(refs)]
+
+    def __del__(self):
+        self.close()
+
+    def close(self):
+        """Close communication and wait for processes to terminate"""
+        processes = list(self._processes.values())
+        self._processes.clear()
+        for process in processes:
+            try:
+                process.stdin.close()
+            except (IOError, OSError):  # pragma: no cover
+                pass
+            process.wait()
+            process.stdout.close()
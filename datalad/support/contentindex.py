@@ -0,0 +1,282 @@
+# emacs: -*- mode: python; py-indent-offset: 4; tab-width: 4; indent-tabs-mode: nil -*-
+# ex: set sts=4 ts=4 sw=4 noet:
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+#
+#   See COPYING file distributed along with the datalad package for the
+#   copyright and license terms.
+#
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+"""Persistent index of annexed files, their sizes and presence of content
+
+The index is stored under .git/datalad/ and describes annexed files of the
+HEAD commit.  Upon `update()` it is brought up to date incrementally:
+files are taken from `git diff-tree` between the recorded and the current
+HEAD, and presence of content is re-checked only for keys whose location
+logs changed in the git-annex branch (or its journal) since the last update.
+
+"""
+
+import json
+import logging
+import os
+from os.path import join as opj
+from os.path import dirname
+from os.path import exists
+from os.path import isfile
+from os.path import islink
+from os.path import normpath
+
+from datalad.cmd import GitRunner
+from .annexkeys import AnnexKeyInfo
+from .annexkeys import get_key_from_link_target
+from .annexkeys import split_annex_key
+from .annexbranch import BRANCH
+from .annexbranch import get_key_from_location_log_path
+from .catfile import GitCatFile
+from .exceptions import CommandError
+from .gitconfig import get_git_dir
+
+lgr = logging.getLogger('datalad.annex.contentindex')
+
+# mode of symlinks in git trees
+_SYMLINK_MODE = '120000'
+
+
+class AnnexContentIndex(object):
+    """Index of annexed files in HEAD: path -> (key, size, presence)
+
+    Aggregate totals (`totals`) are named as the corresponding fields
+    reported by `git annex info`.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path, catfile=None):
+        """
+        Parameters
+        ----------
+        path: str
+          top directory of the repository
+        catfile: GitCatFile, optional
+          to be used to read objects, e.g. to share it with the repository
+        """
+        self.path = path
+        self._catfile = catfile or GitCatFile(path)
+        self._git_dir = get_git_dir(path)
+        self._filename = opj(self._git_dir, 'datalad', 'annex-content.json')
+        self._runner = GitRunner(cwd=path)
+        self._head = None
+        self._annex_sha = None
+        # path -> [key, size, present, hashdir]
+        self._entries = None
+
+    def __repr__(self):
+        return "<AnnexContentIndex path=%s head=%s>" % (self.path, self._head)
+
+    def _load(self):
+        self._entries = {}
+        if not exists(self._filename):
+            return
+        try:
+            with open(self._filename) as f:
+                stored = json.load(f)
+            if stored.get('version') != self.VERSION:
+                lgr.debug("Ignoring index of version %s", stored.get('version'))
+                return
+            self._head = stored['head']
+            self._annex_sha = stored['annex']
+            self._entries = stored['entries']
+        except (ValueError, KeyError, IOError) as exc:
+            lgr.warning("Failed to load %s, rebuilding: %s", self._filename, exc)
+            self._head = self._annex_sha = None
+            self._entries = {}
+
+    def _save(self):
+        dir_ = dirname(self._filename)
+        if not exists(dir_):
+            os.makedirs(dir_)
+        tmp = self._filename + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'version': self.VERSION,
+                       'head': self._head,
+                       'annex': self._annex_sha,
+                       'entries': self._entries}, f)
+        # atomic, so a concurrent reader sees either an old or a new index
+        os.rename(tmp, self._filename)
+
+    def _git(self, cmd):
+        out, _ = self._runner.run(['git'] + cmd, expect_stderr=True)
+        return out
+
+    def _get_sha(self, ref):
+        obj = self._catfile.get_info(ref)
+        return obj.sha if obj is not None else None
+
+    def _is_present(self, relpath, key, hashdir):
+        if hashdir and exists(opj(self._git_dir, 'annex', 'objects',
+                                  hashdir, key, key)):
+            return True
+        # direct mode -- content is in the worktree
+        filepath = opj(self.path, relpath)
+        return not islink(filepath) and isfile(filepath)
+
+    def _add_symlinks(self, symlinks):
+        """Add entries for annexed ones among {path: blob sha} of symlinks"""
+        paths = list(symlinks)
+        objs = self._catfile.get_many([symlinks[p] for p in paths])
+        for relpath, obj in zip(paths, objs):
+            self._entries.pop(relpath, None)
+            if obj is None:
+                continue
+            target = obj.content.decode('utf-8')
+            key = get_key_from_link_target(target)
+            if not key:
+                continue
+            try:
+                size = split_annex_key(key)['size']
+            except ValueError:
+                continue
+            # hash directories within annex/objects/
+            objpath = normpath(opj(dirname(relpath), target)).split(os.sep)
+            hashdir = '/'.join(objpath[-4:-2]) \
+                if objpath[-5:-4] == ['objects'] else None
+            self._entries[relpath] = [
+                key, size, self._is_present(relpath, key, hashdir), hashdir]
+
+    def _rebuild(self, head):
+        lgr.debug("Building index of annexed files of %s", self.path)
+        self._entries = {}
+        if head is None:
+            return
+        symlinks = {}
+        for entry in self._git(['ls-tree', '-r', '-z', '--full-tree', head]
+                               ).split('\0'):
+            if not entry:
+                continue
+            info, _, relpath = entry.partition('\t')
+            mode, _, sha = info.split(' ')
+            if mode == _SYMLINK_MODE:
+                symlinks[relpath] = sha
+        self._add_symlinks(symlinks)
+
+    def _update_files(self, old, new):
+        """Update entries from changes between commits `old` and `new`"""
+        out = self._git(['diff-tree', '-r', '-z', '--no-renames', old, new])
+        fields = out.split('\0')
+        symlinks = {}
+        for info, relpath in zip(fields[::2], fields[1::2]):
+            _, newmode, _, newsha, status = info.split(' ')
+            if status == 'D' or newmode != _SYMLINK_MODE:
+                self._entries.pop(relpath, None)
+            else:
+                symlinks[relpath] = newsha
+        lgr.debug("Updating index of %s for %d changed files",
+                  self.path, len(fields) // 2)
+        self._add_symlinks(symlinks)
+
+    def _update_presence(self, keys=None):
+        """Re-check presence of content for the keys (all if None)"""
+        for relpath, entry in self._entries.items():
+            if keys is None or entry[0] in keys:
+                entry[2] = self._is_present(relpath, entry[0], entry[3])
+
+    def _get_changed_keys(self, old, new):
+        """Return keys with location logs changed between commits of git-annex branch"""
+        if old is None or new is None:
+            return None
+        out = self._git(['diff-tree', '-r', '-z', '--name-only', old, new])
+        keys = set(get_key_from_location_log_path(p) for p in out.split('\0'))
+        keys.discard(None)
+        return keys
+
+    def _get_journal_keys(self):
+        try:
+            journal = os.listdir(opj(self._git_dir, 'annex', 'journal'))
+        except OSError:
+            return set()
+        keys = set()
+        for f in journal:
+            # see annexbranch._journal_file
+            path = f.replace('__', '\0').replace('_', '/').replace('\0', '_')
+            key = get_key_from_location_log_path(path)
+            if key:
+                keys.add(key)
+        return keys
+
+    def update(self):
+        """Bring the index up to date with HEAD and local annex
+
+        Returns
+        -------
+        AnnexContentIndex
+          self, for chaining
+        """
+        if self._entries is None:
+            self._load()
+        head = self._get_sha('HEAD')
+        annex_sha = self._get_sha('refs/heads/%s' % BRANCH)
+        changed = False
+        if head != self._head:
+            try:
+                if self._head is None or head is None:
+                    raise CommandError("nothing to compare to")
+                self._update_files(self._head, head)
+            except CommandError as exc:
+                # e.g. the recorded commit is gone
+                lgr.debug("Cannot update index incrementally: %s", exc)
+                self._rebuild(head)
+            self._head = head
+            changed = True
+        if annex_sha != self._annex_sha:
+            try:
+                keys = self._get_changed_keys(self._annex_sha, annex_sha)
+            except CommandError:
+                keys = None
+            self._update_presence(keys)
+            self._annex_sha = annex_sha
+            changed = True
+        # changes not committed to the git-annex branch yet
+        journal_keys = self._get_journal_keys()
+        if journal_keys:
+            self._update_presence(journal_keys)
+        if changed:
+            self._save()
+        return self
+
+    def get(self, relpath, default=None):
+        """Return AnnexKeyInfo for an annexed file (path relative to the top)"""
+        if self._entries is None:
+            self.update()
+        entry = self._entries.get(relpath)
+        if entry is None:
+            return default
+        key, size, present, _ = entry
+        return AnnexKeyInfo(key, key.split('-', 1)[0], size, present)
+
+    def __iter__(self):
+        if self._entries is None:
+            self.update()
+        return iter(self._entries)
+
+    def __len__(self):
+        if self._entries is None:
+            self.update()
+        return len(self._entries)
+
+    @property
+    def totals(self):
+        """Aggregate sizes and counts, named as by `git annex info`"""
+        if self._entries is None:
+            self.update()
+        worktree_size = 0
+        local = {}
+        for key, size, present, _ in self._entries.values():
+            worktree_size += size or 0
+            if present:
+                local[key] = size or 0
+        return {
+            'annexed files in working tree': len(self._entries),
+            'size of annexed files in working tree': worktree_size,
+            'local annex keys': len(local),
+            'local annex size': sum(local.values()),
+        }
@@ -0,0 +1,241 @@
+# emacs: -*- mode: python; py-indent-offset: 4; tab-width: 4; indent-tabs-mode: nil -*-
+# ex: set sts=4 ts=4 sw=4 noet:
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+#
+#   See COPYING file distributed along with the datalad package for the
+#   copyright and license terms.
+#
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+"""Incremental verification of annexed content in bounded slices
+
+`git annex fsck --incremental-schedule` is used, so every run continues the
+incremental fsck started by a previous one (git-annex remembers which keys
+it checked already), until the schedule period passes and a new round
+is started.  With a `time_limit` per run, e.g. a nightly job, only a slice of
+the repository is verified each time, but all of it within the period.
+
+On top of that, the time and the outcome of the last verification of every
+key are recorded under .git/datalad/, so it could be reported what was
+verified (or failed) and when.
+"""
+
+import json
+import logging
+import os
+import time
+from os.path import join as opj
+from os.path import dirname
+from os.path import exists
+
+from datalad import cfg
+from .exceptions import CommandError
+from .gitconfig import get_git_dir
+
+lgr = logging.getLogger('datalad.annex.fsck')
+
+# exit code of `git annex fsck` if it stopped due to --time-limit
+_TIME_LIMIT_EXIT_CODE = 101
+
+_DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 7 * 86400,
+                   'y': 365 * 86400}
+
+
+def get_duration(duration):
+    """Return seconds for a duration as git-annex takes it, e.g. '1d12h'
+
+    Numbers (without units) are taken as seconds already
+    """
+    if isinstance(duration, (int, float)):
+        return duration
+    total = 0
+    number = ''
+    for c in duration.strip():
+        if c.isdigit():
+            number += c
+        elif c in _DURATION_UNITS and number:
+            total += int(number) * _DURATION_UNITS[c]
+            number = ''
+        else:
+            raise ValueError("Invalid duration %r" % duration)
+    if number:
+        # trailing number without unit
+        total += int(number)
+    return total
+
+
+def _format_duration(duration):
+    """Return duration in the form git-annex takes it"""
+    if isinstance(duration, (int, float)):
+        return '%ds' % duration
+    return duration
+
+
+class AnnexFsckState(object):
+    """Persistent record of the last verification of every key
+
+    Stored in <gitdir>/datalad/annex-fsck.json as {key: [timestamp, success]}
+    """
+
+    VERSION = 1
+
+    def __init__(self, path):
+        self._filename = opj(get_git_dir(path), 'datalad', 'annex-fsck.json')
+        self._keys = None
+
+    def _load(self):
+        self._keys = {}
+        if not exists(self._filename):
+            return
+        try:
+            with open(self._filename) as f:
+                stored = json.load(f)
+            if stored.get('version') != self.VERSION:
+                lgr.debug("Ignoring fsck state of version %s",
+                          stored.get('version'))
+                return
+            self._keys = stored['keys']
+        except (ValueError, KeyError, IOError) as exc:
+            lgr.warning("Failed to load %s, starting anew: %s",
+                        self._filename, exc)
+
+    @property
+    def keys(self):
+        if self._keys is None:
+            self._load()
+        return self._keys
+
+    def save(self):
+        dir_ = dirname(self._filename)
+        if not exists(dir_):
+            os.makedirs(dir_)
+        tmp = self._filename + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'version': self.VERSION, 'keys': self.keys}, f)
+        os.rename(tmp, self._filename)
+
+    def record(self, key, success, timestamp=None):
+        self.keys[key] = [timestamp or time.time(), bool(success)]
+
+    def get(self, key):
+        """Return (timestamp, success) of the last verification, or None"""
+        entry = self.keys.get(key)
+        return tuple(entry) if entry is not None else None
+
+    def get_failed(self):
+        """Return keys which failed their last verification"""
+        return sorted(k for k, (_, success) in self.keys.items()
+                      if not success)
+
+    def get_unverified(self, keys, period=None, now=None):
+        """Return those of the keys not (successfully) verified within period
+
+        Parameters
+        ----------
+        keys: iterable of str
+        period: int or str, optional
+          in seconds or as git-annex takes durations (e.g. '30d').  If None,
+          keys which were ever verified successfully are not returned
+        """
+        since = (now or time.time()) - get_duration(period) \
+            if period is not None else None
+        unverified = []
+        for key in keys:
+            entry = self.keys.get(key)
+            if entry is None or not entry[1] \
+                    or (since is not None and entry[0] < since):
+                unverified.append(key)
+        return unverified
+
+
+class AnnexFsck(object):
+    """Incremental and parallel `git annex fsck` of a repository"""
+
+    def __init__(self, repo, schedule=None, jobs=None):
+        """
+        Parameters
+        ----------
+        repo: AnnexRepo
+        schedule: int or str, optional
+          period within which all the content must be verified, in seconds or
+          as git-annex takes durations (e.g. '30d').  If not specified, taken
+          from 'annex.fsck schedule' datalad configuration, which defaults
+          to 30d
+        jobs: int, optional
+          number of parallel checks.  If not specified, taken from
+          'annex.fsck jobs' datalad configuration, which defaults to 1
+        """
+        self.repo = repo
+        if schedule is None:
+            schedule = cfg.get('annex', 'fsck schedule', default='30d')
+        self.schedule = schedule
+        if jobs is None:
+            jobs = int(cfg.get('annex', 'fsck jobs', default=1))
+        self.jobs = max(1, jobs)
+        self.state = AnnexFsckState(repo.path)
+
+    def _get_args(self, time_limit=None, fast=False, from_=None, all_keys=False):
+        args = ['--incremental-schedule=%s' % _format_duration(self.schedule)]
+        if time_limit is not None:
+            args.append('--time-limit=%s' % _format_duration(time_limit))
+        if self.jobs > 1:
+            args.append('-J%d' % self.jobs)
+        if fast:
+            args.append('--fast')
+        if from_:
+            args.append('--from=%s' % from_)
+        if all_keys:
+            args.append('--all')
+        return args
+
+    def run(self, files=None, time_limit=None, fast=False, from_=None,
+            all_keys=False):
+        """Verify next slice of content, yielding records as annex reports them
+
+        State is saved once annex is done (or the generator is closed).
+
+        Parameters
+        ----------
+        files: list of str, optional
+          to restrict verification to.  The entire repository by default
+        time_limit: int or str, optional
+          stop after this many seconds (or a duration as git-annex takes it,
+          e.g. '2h').  Checks in progress are completed
+        fast: bool, optional
+          only check presence, not checksums, of content
+        from_: str, optional
+          name of a remote to check content in instead of the local one
+        all_keys: bool, optional
+          check all known keys, not only those of files in the worktree
+
+        Yields
+        ------
+        dict
+          records as reported by `git annex fsck --json`
+        """
+        args = self._get_args(time_limit=time_limit, fast=fast, from_=from_,
+                              all_keys=all_keys)
+        lgr.debug("Verifying content of %s (%s)", self.repo.path, ' '.join(args))
+        # local verifications are what we keep track of
+        record_state = not (fast or from_)
+        failed = 0
+        try:
+            for record in self.repo._run_annex_command_json(
+                    'fsck', args=args, files=files,
+                    expect_stderr=True, expect_fail=True):
+                if not record.get('success'):
+                    failed += 1
+                if record_state and record.get('key'):
+                    self.state.record(record['key'], record.get('success'))
+                yield record
+        except CommandError as exc:
+            if exc.code == _TIME_LIMIT_EXIT_CODE:
+                lgr.info("Time limit for verification of %s was reached, "
+                         "it will continue next time", self.repo.path)
+            elif not (exc.code == 1 and failed):
+                raise
+        finally:
+            if record_state:
+                self.state.save()
+        if failed:
+            lgr.warning("Verification of %d files in %s failed",
+                        failed, self.repo.path)
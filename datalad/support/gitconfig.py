@@ -0,0 +1,303 @@
+# emacs: -*- mode: python; py-indent-offset: 4; tab-width: 4; indent-tabs-mode: nil -*-
+# ex: set sts=4 ts=4 sw=4 noet:
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+#
+#   See COPYING file distributed along with the datalad package for the
+#   copyright and license terms.
+#
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+"""Cached access to git configuration of a repository
+
+Reading configuration via GitPython parses all the config files every time a
+reader is created.  Here the entire configuration is loaded with a single
+`git config -l -z` call and reused until any of the config files changes.
+
+"""
+
+import logging
+import os
+from collections import OrderedDict
+from threading import Lock
+from os.path import join as opj
+from os.path import isfile
+from os.path import isabs
+from os.path import expanduser
+
+from six.moves.configparser import NoOptionError
+
+from datalad.cmd import GitRunner
+from .exceptions import CommandError
+
+lgr = logging.getLogger('datalad.gitconfig')
+
+# to signal that no default was provided, since None is a valid default
+_NO_DEFAULT = object()
+
+
+def get_git_dir(path):
+    """Return path to the .git directory of a repository at `path`
+
+    Submodules could have .git file pointing to the actual directory
+    """
+    dot_git = opj(path, '.git')
+    if isfile(dot_git):
+        with open(dot_git) as f:
+            line = f.readline()
+        if line.startswith('gitdir:'):
+            git_dir = line[7:].strip()
+            return git_dir if isabs(git_dir) else opj(path, git_dir)
+    return dot_git
+
+
+def _section_to_name(section):
+    """Convert section as used by GitPython ('remote "origin"') into 'remote.origin'
+
+    Only the section itself is case-insensitive, so subsections (e.g. names
+    of remotes or branches) keep their case, as in `git config -l` output
+    """
+    if '"' in section:
+        section, subsection = section.split(' ', 1)
+        subsection = subsection.strip().strip('"')
+    else:
+        section, _, subsection = section.partition('.')
+    return '%s.%s' % (section.lower(), subsection) if subsection \
+        else section.lower()
+
+
+def _string_to_value(value):
+    """Convert config value the same way GitPython does"""
+    if value is None:
+        # a key without any value means true
+        return True
+    for numtype in (int, float):
+        try:
+            val = numtype(value)
+            # truncated value ?
+            if val != float(value):
+                continue
+            return val
+        except (ValueError, TypeError):
+            continue
+    vl = value.lower()
+    if vl in ('false', 'no', 'off'):
+        return False
+    if vl in ('true', 'yes', 'on'):
+        return True
+    return value
+
+
+class GitConfigSnapshot(object):
+    """Snapshot of the git configuration as seen within a repository
+
+    Configuration is (re)loaded upon access whenever any of the config files
+    (repository, user and system wide) has changed since the last load.
+    Use get_config_snapshot() to share the snapshot among all the instances
+    of the repository classes for the same repository.
+    """
+
+    def __init__(self, path):
+        """
+        Parameters
+        ----------
+        path: str
+          top directory of the repository
+        """
+        self.path = path
+        self._files = [
+            opj(get_git_dir(path), 'config'),
+            expanduser(opj('~', '.gitconfig')),
+            opj(os.environ.get('XDG_CONFIG_HOME', expanduser(opj('~', '.config'))),
+                'git', 'config'),
+            '/etc/gitconfig'
+        ]
+        self._signature = None
+        self._store = None
+        # only the repository's own config, loaded if needed
+        self._local_signature = None
+        self._local_store = None
+
+    def __repr__(self):
+        return "<GitConfigSnapshot path=%s>" % self.path
+
+    def _get_signature(self):
+        signature = []
+        for f in self._files:
+            try:
+                st = os.stat(f)
+                signature.append((st.st_ino, st.st_size, st.st_mtime))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def invalidate(self):
+        """Force reload upon next access"""
+        self._store = None
+        self._local_store = None
+
+    def _load(self, local=False):
+        try:
+            out, err = GitRunner().run(['git', 'config'] +
+                                       (['--local'] if local else []) +
+                                       ['-l', '-z'],
+                                       cwd=self.path,
+                                       expect_fail=True, expect_stderr=True)
+        except CommandError as e:
+            # e.g. no configuration at all
+            lgr.debug("Could not load git config under %s: %s", self.path, e)
+            out = ''
+        store = OrderedDict()
+        for entry in out.split('\0'):
+            if not entry:
+                continue
+            name, sep, value = entry.partition('\n')
+            store.setdefault(name, []).append(value if sep else None)
+        return store
+
+    @property
+    def _entries(self):
+        signature = self._get_signature()
+        if self._store is None or signature != self._signature:
+            lgr.log(5, "Loading git config for %s", self.path)
+            self._store = self._load()
+            self._signature = signature
+        return self._store
+
+    @property
+    def _local_entries(self):
+        signature = self._get_signature()
+        if self._local_store is None or signature != self._local_signature:
+            lgr.log(5, "Loading local git config for %s", self.path)
+            self._local_store = self._load(local=True)
+            self._local_signature = signature
+        return self._local_store
+
+    def get_all(self, name):
+        """Return all values (as strings) for a fully qualified `name`, e.g. 'remote.origin.url'"""
+        section, _, option = name.rpartition('.')
+        return self._entries.get(
+            '%s.%s' % (_section_to_name(section), option.lower()), [])
+
+    def get_value(self, section, option, default=_NO_DEFAULT):
+        """Return the (last) value for an option, similarly to GitPython
+
+        Parameters
+        ----------
+        section: str
+          either 'remote "origin"' or 'remote.origin' form
+        option: str
+        default: optional
+          to be returned if there is no such option
+
+        Raises
+        ------
+        NoOptionError
+          if there is no such option and no default was provided
+        """
+        values = self.get_all('%s.%s' % (_section_to_name(section), option))
+        if not values:
+            if default is _NO_DEFAULT:
+                raise NoOptionError(option, section)
+            return default
+        return _string_to_value(values[-1])
+
+    def has_option(self, section, option):
+        return bool(self.get_all('%s.%s' % (_section_to_name(section), option)))
+
+    def get_subsections(self, section, local=False):
+        """Return names of all subsections of a section (e.g. remotes for 'remote')
+
+        In the order of their appearance in the configuration
+
+        Parameters
+        ----------
+        section: str
+        local: bool, optional
+          consider only the configuration of the repository itself, and not
+          user or system wide configuration
+        """
+        prefix = section.lower() + '.'
+        out = []
+        for name in (self._local_entries if local else self._entries):
+            if name.startswith(prefix):
+                subsection = name[len(prefix):].rpartition('.')[0]
+                if subsection and subsection not in out:
+                    out.append(subsection)
+        return out
+
+
+# snapshots shared among all repository instances, of up to that many
+# most recently used repositories
+_SNAPSHOTS_SIZE = 64
+_snapshots = OrderedDict()
+_snapshots_lock = Lock()
+
+
+def get_config_snapshot(path):
+    """Return GitConfigSnapshot for a repository at `path`"""
+    with _snapshots_lock:
+        snapshot = _snapshots.pop(path, None)
+        if snapshot is None:
+            snapshot = GitConfigSnapshot(path)
+        # most recently used goes last
+        _snapshots[path] = snapshot
+        while len(_snapshots) > _SNAPSHOTS_SIZE:
+            _snapshots.popitem(last=False)
+    return snapshot
+
+
+class GitConfigBatchWriter(object):
+    """Collects changes to repository's git config and writes them at once
+
+    All the changes are applied with a single (locked) write of the config
+    file, either upon `write()` or exit from the context if used as a context
+    manager::
+
+        with repo.get_config_writer() as writer:
+            writer.set_value('remote "origin"', 'url', url)
+            writer.set_value('remote "origin"', 'pushurl', pushurl)
+    """
+
+    def __init__(self, repo, snapshot=None):
+        """
+        Parameters
+        ----------
+        repo: git.Repo
+          GitPython's repository instance
+        snapshot: GitConfigSnapshot, optional
+          to be invalidated upon write
+        """
+        self._repo = repo
+        self._snapshot = snapshot
+        self._changes = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.write()
+
+    def set_value(self, section, option, value):
+        """Schedule setting of an option.  Section is in GitPython's form"""
+        self._changes.append((section, option, value))
+        return self
+
+    def write(self):
+        """Write all the scheduled changes"""
+        if not self._changes:
+            return
+        lgr.debug("Writing %d changes to git config of %s",
+                  len(self._changes), self._repo.working_dir)
+        # Must be done with explicit release, otherwise on Python3 would end up
+        # with .git/config wiped out
+        # see https://github.com/gitpython-developers/GitPython/issues/333#issuecomment-126633757
+        writer = self._repo.config_writer()
+        try:
+            for section, option, value in self._changes:
+                writer.set_value(section, option, value)
+        finally:
+            writer.release()
+        self._changes = []
+        if self._snapshot is not None:
+            # mtime resolution might be too coarse to notice the change
+            self._snapshot.invalidate()
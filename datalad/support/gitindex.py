@@ -0,0 +1,267 @@
+# emacs: -*- mode: python; py-indent-offset: 4; tab-width: 4; indent-tabs-mode: nil -*-
+# ex: set sts=4 ts=4 sw=4 noet:
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+#
+#   See COPYING file distributed along with the datalad package for the
+#   copyright and license terms.
+#
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+"""Reader of git's index file (.git/index)
+
+Index of version 2, 3 and 4 is parsed directly into a compact table, which
+is kept until the index file changes.  Split indexes are read via
+`git ls-files` instead.
+
+See Documentation/technical/index-format.txt of git for the format.
+"""
+
+import logging
+import os
+import struct
+from array import array
+from binascii import hexlify
+from binascii import unhexlify
+from bisect import bisect_left
+from collections import namedtuple
+from os.path import join as opj
+
+from six import PY3
+
+from datalad.cmd import GitRunner
+from .gitconfig import get_git_dir
+
+lgr = logging.getLogger('datalad.gitrepo.index')
+
+GitIndexEntry = namedtuple('GitIndexEntry', ['mode', 'sha', 'size', 'mtime'])
+
+# ctime, ctime ns, mtime, mtime ns, dev, ino, mode, uid, gid, size, sha, flags
+_ENTRY = struct.Struct('>10I20sH')
+_HEADER = struct.Struct('>4sII')
+_EXTENDED_FLAG = 0x4000
+_STAGE_MASK = 0x3000
+_NAME_MASK = 0x0fff
+
+# everything known about one version of the index
+_IndexState = namedtuple(
+    '_IndexState',
+    ['signature', 'paths', 'positions', 'conflicts', 'modes', 'sizes',
+     'mtimes', 'shas'])
+_EMPTY_STATE = _IndexState(
+    None, [], {}, frozenset(), array('I'), array('I'), array('d'), b'')
+
+
+def _decode_path(path):
+    return path.decode('utf-8', 'surrogateescape') if PY3 else path
+
+
+def _read_varint(data, pos):
+    """Read offset-encoded varint (as in git's varint.c) at pos"""
+    c = ord(data[pos:pos + 1])
+    pos += 1
+    value = c & 127
+    while c & 128:
+        value += 1
+        c = ord(data[pos:pos + 1])
+        pos += 1
+        value = (value << 7) + (c & 127)
+    return value, pos
+
+
+def _parse_index(data):
+    """Parse index content into (paths, entries, conflicts)
+
+    Returns None if index could not be parsed natively (e.g. split index)
+
+    Returns
+    -------
+    paths: list of str
+      in the order of the index (sorted)
+    entries: list of tuple
+      (mode, sha (bytes), size, mtime (float)) per path
+    conflicts: set of str
+      paths with entries of merge stages > 0
+    """
+    signature, version, count = _HEADER.unpack_from(data, 0)
+    if signature != b'DIRC':
+        raise ValueError("Not a git index (signature %r)" % signature)
+    if version not in (2, 3, 4):
+        lgr.debug("Unsupported index version %d", version)
+        return None
+    pos = _HEADER.size
+    unpack = _ENTRY.unpack_from
+    entry_size = _ENTRY.size
+    paths = []
+    entries = []
+    conflicts = set()
+    previous = b''
+    for _ in range(count):
+        start = pos
+        (_, _, mtime, mtime_ns, _, _, mode, _, _, size, sha, flags) = \
+            unpack(data, pos)
+        pos += entry_size
+        if flags & _EXTENDED_FLAG and version >= 3:
+            pos += 2
+        if version == 4:
+            strip, pos = _read_varint(data, pos)
+            end = data.index(b'\0', pos)
+            path = previous[:len(previous) - strip] + data[pos:end]
+            pos = end + 1
+            previous = path
+        else:
+            length = flags & _NAME_MASK
+            if length == _NAME_MASK:
+                # name is too long to have its length in flags
+                length = data.index(b'\0', pos) - pos
+            path = data[pos:pos + length]
+            # entries are padded with NULs to a multiple of 8 bytes
+            pos = start + ((pos - start + length + 8) & ~7)
+        path = _decode_path(path)
+        if flags & _STAGE_MASK:
+            conflicts.add(path)
+            if paths and paths[-1] == path:
+                # already have an entry for a lower stage
+                continue
+        paths.append(path)
+        entries.append((mode, sha, size, mtime + mtime_ns / 1e9))
+    # extensions: signature, size, data.  Last 20 bytes are the checksum
+    while pos + 8 <= len(data) - 20:
+        ext, ext_size = struct.unpack_from('>4sI', data, pos)
+        if ext == b'link':
+            lgr.debug("Index is split, which is not supported")
+            return None
+        pos += 8 + ext_size
+    return paths, entries, conflicts
+
+
+class GitIndex(object):
+    """Cached content of the index of a repository
+
+    The index is re-read only when its file changes (judging by its stat
+    signature), so queries are cheap otherwise.  Paths are relative to the
+    top of the repository, with '/' as the separator, as git stores them.
+    """
+
+    def __init__(self, path):
+        """
+        Parameters
+        ----------
+        path: str
+          top directory of the repository
+        """
+        self.path = path
+        self._filename = opj(get_git_dir(path), 'index')
+        self._state = _EMPTY_STATE
+
+    def __repr__(self):
+        return "<GitIndex path=%s>" % self.path
+
+    def _get_signature(self):
+        try:
+            st = os.stat(self._filename)
+        except OSError:
+            return None
+        # git writes a new index file and renames it, so inode changes too
+        return (st.st_ino, st.st_size,
+                getattr(st, 'st_mtime_ns', st.st_mtime))
+
+    def _read_ls_files(self):
+        out, _ = GitRunner(cwd=self.path).run(
+            ['git', 'ls-files', '--stage', '-z'], expect_stderr=True)
+        paths = []
+        entries = []
+        conflicts = set()
+        for line in out.split('\0'):
+            if not line:
+                continue
+            info, _, path = line.partition('\t')
+            mode, sha, stage = info.split(' ')
+            if stage != '0':
+                conflicts.add(path)
+                if paths and paths[-1] == path:
+                    continue
+            paths.append(path)
+            # size and mtime are not reported by ls-files
+            entries.append((int(mode, 8), unhexlify(sha), 0, 0.))
+        return paths, entries, conflicts
+
+    def _update(self):
+        """Re-read the index if it has changed, and return its _IndexState
+
+        The state is replaced at once, so threads never see parts of
+        different versions of the index.
+        """
+        state = self._state
+        signature = self._get_signature()
+        if signature == state.signature:
+            return state
+        parsed = None
+        if signature is not None:
+            lgr.debug("Reading index of %s", self.path)
+            with open(self._filename, 'rb') as f:
+                data = f.read()
+            parsed = _parse_index(data)
+            if parsed is None:
+                parsed = self._read_ls_files()
+        paths, entries, conflicts = parsed or ([], [], set())
+        state = self._state = _IndexState(
+            signature=signature,
+            paths=paths,
+            positions=dict(zip(paths, range(len(paths)))),
+            conflicts=frozenset(conflicts),
+            modes=array('I', (e[0] for e in entries)),
+            sizes=array('I', (e[2] for e in entries)),
+            mtimes=array('d', (e[3] for e in entries)),
+            shas=b''.join(e[1] for e in entries))
+        return state
+
+    def __contains__(self, path):
+        return path in self._update().positions
+
+    def __iter__(self):
+        return iter(self._update().paths)
+
+    def __len__(self):
+        return len(self._update().paths)
+
+    @property
+    def paths(self):
+        """All paths in the index, in the order of the index"""
+        return self._update().paths
+
+    @property
+    def conflicts(self):
+        """Paths with unresolved merge conflicts"""
+        return self._update().conflicts
+
+    def get(self, path, default=None):
+        """Return GitIndexEntry for a path"""
+        state = self._update()
+        i = state.positions.get(path)
+        if i is None:
+            return default
+        sha = state.shas[i * 20:(i + 1) * 20]
+        return GitIndexEntry(state.modes[i], hexlify(sha).decode(),
+                             state.sizes[i], state.mtimes[i])
+
+    def get_files_under(self, prefix):
+        """Return paths in the index under directory `prefix`
+
+        All paths are returned for an empty prefix
+        """
+        paths = self._update().paths
+        if not prefix:
+            return list(paths)
+        prefix = prefix.rstrip('/') + '/'
+        # paths are sorted, so those under prefix are all in a row
+        start = bisect_left(paths, prefix)
+        end = start
+        while end < len(paths) and paths[end].startswith(prefix):
+            end += 1
+        return paths[start:end]
+
+    def has_files_under(self, prefix):
+        """Return True if there are any paths in the index under `prefix`"""
+        paths = self._update().paths
+        prefix = prefix.rstrip('/') + '/'
+        i = bisect_left(paths, prefix)
+        return i < len(paths) and paths[i].startswith(prefix)
@@ -15,11 +15,12 @@ For further information on GitPython see http://gitpython.readthedocs.org/
 import logging
 import shlex
 from os import linesep
+from os import getpid
+from os import unlink
 from os.path import join as opj
 from os.path import exists
 from os.path import normpath
 from os.path import isabs
-from os.path import commonprefix
 from os.path import relpath
 from os.path import realpath
 from os.path import abspath
@@ -35,10 +36,10 @@ import git as gitpy
 from git.exc import GitCommandError
 from git.exc import NoSuchPathError
 from git.exc import InvalidGitRepositoryError
-from git.objects.blob import Blob
 
 from datalad import ssh_manager
 from datalad.cmd import Runner, GitRunner
+from datalad.dochelpers import exc_str
 from datalad.utils import optional_args
 from datalad.utils import on_windows
 from datalad.utils import getpwd
@@ -47,6 +48,12 @@ from datalad.utils import swallow_logs
 # imports from same module:
 from .exceptions import CommandError
 from .exceptions import FileNotInRepositoryError
+from .catfile import GitCatFile
+from .gitindex import GitIndex
+from .gitstatus import iter_status
+from .gittree import get_tree_files
+from .gitconfig import get_config_snapshot
+from .gitconfig import GitConfigBatchWriter
 from .network import is_ssh
 
 # shortcuts
@@ -91,41 +98,85 @@ def _normalize_path(base_dir, path):
     str:
         path, that is a relative path with respect to `base_dir`
     """
-    if not path:
-        return path
-
-    base_dir = realpath(base_dir)
-    # path = normpath(path)
-    # Note: disabled normpath, because it may break paths containing symlinks;
-    # But we don't want to realpath relative paths, in case cwd isn't the
-    # correct base.
-
-    if isabs(path):
-        # path might already be a symlink pointing to annex etc,
-        # so realpath only its directory, to get "inline" with
-        # realpath(base_dir) above
-        path = opj(realpath(dirname(path)), basename(path))
-        if commonprefix([path, base_dir]) != base_dir:
-            raise FileNotInRepositoryError(msg="Path outside repository: %s"
-                                               % path, filename=path)
+    return _normalize_paths(base_dir, [path])[0]
+
+
+def _normalize_paths(base_dir, paths):
+    """Normalize a list of paths, as _normalize_path does for a single one
+
+    Realpaths of `base_dir`, PWD and directories of absolute paths are
+    determined only once for all the paths, and only if needed: relative
+    paths (not starting with curdir or pardir) are taken as is without any
+    syscall.
+
+    Parameters
+    ----------
+    base_dir: str
+    paths: list of str
+
+    Returns
+    -------
+    list of str
+    """
+    out = []
+    real_base_dir = None
+    real_pwd = None
+    real_dirs = {}
+    for path in paths:
+        if not path:
+            out.append(path)
+            continue
+
+        # path = normpath(path)
+        # Note: disabled normpath, because it may break paths containing
+        # symlinks; But we don't want to realpath relative paths, in case cwd
+        # isn't the correct base.
+
+        if real_base_dir is None and (
+                isabs(path) or path.startswith(_curdirsep)
+                or path.startswith(_pardirsep)):
+            real_base_dir = realpath(base_dir)
+            base_prefix = real_base_dir if real_base_dir.endswith(sep) \
+                else real_base_dir + sep
+
+        if isabs(path):
+            # path might already be a symlink pointing to annex etc,
+            # so realpath only its directory, to get "inline" with
+            # realpath(base_dir) above
+            dir_, name = dirname(path), basename(path)
+            real_dir = real_dirs.get(dir_)
+            if real_dir is None:
+                real_dir = real_dirs[dir_] = realpath(dir_)
+            path = opj(real_dir, name)
+            if not path.startswith(real_base_dir):
+                raise FileNotInRepositoryError(msg="Path outside repository: %s"
+                                                   % path, filename=path)
+            if path.startswith(base_prefix) and name not in ('', curdir, pardir):
+                # realpath'ed, so there is nothing to normalize
+                out.append(path[len(base_prefix):])
+                continue
+        # Executive decision was made to not do this kind of magic!
+        #
+        # elif commonprefix([realpath(getpwd()), base_dir]) == base_dir:
+        #     # If we are inside repository, rebuilt relative paths.
+        #     path = opj(realpath(getpwd()), path)
+        #
+        # BUT with relative curdir/pardir start it would assume relative to curdir
+        #
+        elif path.startswith(_curdirsep) or path.startswith(_pardirsep):
+            if real_pwd is None:
+                real_pwd = realpath(getpwd())
+            path = opj(real_pwd, path)
         else:
-            pass
-    # Executive decision was made to not do this kind of magic!
-    #
-    # elif commonprefix([realpath(getpwd()), base_dir]) == base_dir:
-    #     # If we are inside repository, rebuilt relative paths.
-    #     path = opj(realpath(getpwd()), path)
-    #
-    # BUT with relative curdir/pardir start it would assume relative to curdir
-    #
-    elif path.startswith(_curdirsep) or path.startswith(_pardirsep):
-         path = opj(realpath(getpwd()), path)
-    else:
-        # We were called from outside the repo. Therefore relative paths
-        # are interpreted as being relative to self.path already.
-        return path
-
-    return relpath(path, start=base_dir)
+            # We were called from outside the repo. Therefore relative paths
+            # are interpreted as being relative to self.path already.
+            out.append(path)
+            continue
+
+        path = normpath(path)
+        out.append(path[len(base_prefix):] if path.startswith(base_prefix)
+                   else relpath(path, start=real_base_dir))
+    return out
 
 
 @optional_args
@@ -190,15 +241,15 @@ def normalize_paths(func, match_return_type=True, map_filenames_back=False):
     @wraps(func)
     def newfunc(self, files, *args, **kwargs):
 
-        normalize = _normalize_path if kwargs.pop('normalize_paths', True) \
-            else lambda rpath, filepath: filepath
+        normalize = _normalize_paths if kwargs.pop('normalize_paths', True) \
+            else lambda rpath, filepaths: list(filepaths)
 
         if files:
             if isinstance(files, string_types) or not files:
-                files_new = [normalize(self.path, files)]
+                files_new = normalize(self.path, [files])
                 single_file = True
             elif isinstance(files, list):
-                files_new = [normalize(self.path, path) for path in files]
+                files_new = normalize(self.path, files)
                 single_file = False
             else:
                 raise ValueError("_files_decorator: Don't know how to handle "
@@ -312,7 +363,7 @@ class GitRepo(object):
     overridden accidentally by AnnexRepo.
 
     """
-    __slots__ = ['path', 'repo', 'cmd_call_wrapper']
+    __slots__ = ['path', 'repo', 'cmd_call_wrapper', '_cat_file', '_index']
 
     # Disable automatic garbage and autopacking
     _GIT_COMMON_OPTIONS = ['-c', 'receive.autogc=0', '-c', 'gc.auto=0']
@@ -344,6 +395,8 @@ class GitRepo(object):
 
         self.path = abspath(normpath(path))
         self.cmd_call_wrapper = runner or GitRunner(cwd=self.path)
+        self._cat_file = None
+        self._index = None
         # TODO: Concept of when to set to "dry".
         #       Includes: What to do in gitrepo class?
         #       Now: setting "dry" means to give a dry-runner to constructor.
@@ -399,6 +452,37 @@ class GitRepo(object):
     def __repr__(self):
         return "<GitRepo path=%s (%s)>" % (self.path, type(self))
 
+    @property
+    def config(self):
+        """GitConfigSnapshot of the configuration of this repository
+
+        Shared among all instances for the same path and reloaded only if
+        any of the config files changed
+        """
+        return get_config_snapshot(self.path)
+
+    @property
+    def cat_file(self):
+        """Persistent GitCatFile process to read objects of this repository"""
+        if self._cat_file is None:
+            self._cat_file = GitCatFile(self.path,
+                                        protocol=self.cmd_call_wrapper.protocol)
+        return self._cat_file
+
+    @property
+    def index(self):
+        """GitIndex with the content of git's index, re-read only if it changed
+
+        Use it for membership (`path in repo.index`) and prefix queries
+        """
+        if self._index is None:
+            self._index = GitIndex(self.path)
+        return self._index
+
+    def get_config_writer(self):
+        """Return GitConfigBatchWriter to apply multiple changes at once"""
+        return GitConfigBatchWriter(self.repo, self.config)
+
     def __eq__(self, obj):
         """Decides whether or not two instances of this class are equal.
 
@@ -578,8 +662,7 @@ class GitRepo(object):
             list of paths rooting in git's base dir
         """
 
-        return [x[0] for x in self.cmd_call_wrapper(
-            self.repo.index.entries.keys)]
+        return list(self.index)
 
     def get_hexsha(self, branch=None):
         """Return a hexsha for a given branch name. If None - of current branch
@@ -676,7 +759,9 @@ class GitRepo(object):
         #         self.repo.git.branch(r=True).splitlines()]
 
     def get_remotes(self):
-        return [remote.name for remote in self.repo.remotes]
+        # only remotes configured for the repository itself, as GitPython
+        # lists them, and not those from user or system wide configuration
+        return self.config.get_subsections('remote', local=True)
 
     def get_files(self, branch=None):
         """Get a list of files in git.
@@ -686,21 +771,30 @@ class GitRepo(object):
         Parameters
         ----------
         branch: str
-          Name of the branch to query. Default: active branch.
+          Name of the branch (or any other commit-ish) to query.
+          Default: active branch.
 
         Returns
         -------
         [str]
           list of files.
+
+        Raises
+        ------
+        ValueError
+          if `branch` could not be resolved
         """
         # TODO: RF codes base and melt get_indexed_files() in
 
         if branch is None:
             # active branch can be queried way faster:
             return self.get_indexed_files()
-        else:
-            return [item.path for item in self.repo.tree(branch).traverse()
-                    if isinstance(item, Blob)]
+        # lists are cached per tree, so resolve it via the running cat-file
+        tree = self.cat_file.get_info('%s^{tree}' % branch)
+        if tree is None:
+            raise ValueError("Cannot resolve %r to a tree in %s"
+                             % (branch, self))
+        return list(get_tree_files(self.cmd_call_wrapper, tree.sha))
 
     def get_file_content(self, file_, branch='HEAD'):
         """
@@ -709,26 +803,28 @@ class GitRepo(object):
         -------
         [str]
           content of file_ as a list of lines.
-        """
-
-        content_str = self.repo.commit(branch).tree[file_].data_stream.read()
 
-        # in python3 a byte string is returned. Need to convert it:
+        Raises
+        ------
+        KeyError
+          if there is no such file in `branch`
+        """
+        content = self.cat_file.read_blobs([file_], treeish=branch)[0]
+        if content is None:
+            raise KeyError("No file %r in %r of %s" % (file_, branch, self))
+        # in python3 a byte string is returned.  Each byte is converted to a
+        # character as before, but in a single pass
         from six import PY3
         if PY3:
-            conv_str = u''
-            for b in bytes(content_str):
-                conv_str += chr(b)
-            return conv_str.splitlines()
-        else:
-            return content_str.splitlines()
+            content = content.decode('latin-1')
+        return content.splitlines()
         # TODO: keep splitlines?
 
     @normalize_paths(match_return_type=False)
     def _git_custom_command(self, files, cmd_str,
                            log_stdout=True, log_stderr=True, log_online=False,
                            expect_stderr=True, cwd=None, env=None,
-                           shell=None, expect_fail=False):
+                           shell=None, expect_fail=False, parallel=False):
         """Allows for calling arbitrary commands.
 
         Helper for developing purposes, i.e. to quickly implement git commands
@@ -740,20 +836,25 @@ class GitRepo(object):
         files: list of files
         cmd_str: str or list
             arbitrary command str. `files` is appended to that string.
+            If there are too many files for a single command line, command
+            is ran multiple times (see Runner.run_chunked).
+        parallel: bool, optional
+            either multiple runs (if needed) could be done in parallel
 
         Returns
         -------
         stdout, stderr
         """
-        cmd = shlex.split(cmd_str + " " + " ".join(files), posix=not on_windows) \
+        cmd = shlex.split(cmd_str, posix=not on_windows) \
             if isinstance(cmd_str, string_types) \
-            else cmd_str + files
+            else cmd_str[:]
         assert(cmd[0] == 'git')
         cmd = cmd[:1] + self._GIT_COMMON_OPTIONS + cmd[1:]
-        return self.cmd_call_wrapper.run(cmd, log_stderr=log_stderr,
-                                  log_stdout=log_stdout, log_online=log_online,
-                                  expect_stderr=expect_stderr, cwd=cwd,
-                                  env=env, shell=shell, expect_fail=expect_fail)
+        return self.cmd_call_wrapper.run_chunked(
+            cmd, files, parallel=parallel,
+            log_stderr=log_stderr, log_stdout=log_stdout, log_online=log_online,
+            expect_stderr=expect_stderr, cwd=cwd,
+            env=env, shell=shell, expect_fail=expect_fail)
 
 # TODO: --------------------------------------------------------------------
 
@@ -761,14 +862,48 @@ class GitRepo(object):
         """
         """
 
-        return self._git_custom_command('', 'git remote add %s %s %s' %
-                                 (options, name, url))
+        try:
+            return self._git_custom_command('', 'git remote add %s %s %s' %
+                                     (options, name, url))
+        finally:
+            self.config.invalidate()
+
+    def configure_remote(self, name, url, pushurl=None):
+        """Add a new remote or change urls of an existing one
+
+        All the settings are written to the config at once, without
+        invoking git.
+
+        Parameters
+        ----------
+        name: str
+          name of the remote
+        url: str
+          (fetch) url of the remote
+        pushurl: str, optional
+          url to push to, if different from `url`
+        """
+        with self.get_config_writer() as writer:
+            self._set_remote_config(writer, name, url, pushurl)
+
+    def _set_remote_config(self, writer, name, url, pushurl=None):
+        """Schedule settings of a remote with the `writer`"""
+        sct = 'remote "%s"' % name
+        writer.set_value(sct, 'url', url)
+        if name not in self.get_remotes():
+            writer.set_value(sct, 'fetch',
+                             '+refs/heads/*:refs/remotes/%s/*' % name)
+        if pushurl is not None:
+            writer.set_value(sct, 'pushurl', pushurl)
 
     def remove_remote(self, name):
         """
         """
 
-        return self._git_custom_command('', 'git remote remove %s' % name)
+        try:
+            return self._git_custom_command('', 'git remote remove %s' % name)
+        finally:
+            self.config.invalidate()
 
     def show_remotes(self, name='', verbose=False):
         """
@@ -964,17 +1099,11 @@ class GitRepo(object):
         push: bool
           if True, get the pushurl instead of the fetch url.
         """
-        cfg_reader = self.repo.remote(name).config_reader
-        if push:
-            if cfg_reader.has_option('pushurl'):
-                return cfg_reader.get('pushurl')
-            else:
-                return None
-        else:
-            if cfg_reader.has_option('url'):
-                return cfg_reader.get('url')
-            else:
-                return None
+        if name not in self.get_remotes():
+            raise ValueError("Remote named '%s' didn't exist" % name)
+        return self.config.get_value('remote.%s' % name,
+                                     'pushurl' if push else 'url',
+                                     default=None)
 
     def get_branch_commits(self, branch, limit=None, stop=None, value=None):
         """Return GitPython's commits for the branch
@@ -1038,6 +1167,81 @@ class GitRepo(object):
         self._git_custom_command('', ['git', 'merge'] + options + [name],
                                  **kwargs)
 
+    def commit_tree(self, tree, parents=None, msg=None):
+        """Create a commit of a `tree` without touching index or worktree
+
+        Parameters
+        ----------
+        tree: str
+          Anything git resolves to a tree, e.g. 'branch^{tree}'
+        parents: list of str, optional
+          Commits to become parents of the new commit
+        msg: str, optional
+
+        Returns
+        -------
+        str
+          hexsha of the new commit
+        """
+        cmd = ['git', 'commit-tree', tree]
+        for parent in parents or []:
+            cmd += ['-p', parent]
+        cmd += ['-m', msg or '']
+        out, _ = self._git_custom_command('', cmd)
+        return out.strip()
+
+    def update_ref(self, ref, hexsha, old=None, msg=None):
+        """Point `ref` (e.g. refs/heads/master) to `hexsha`
+
+        If `old` is provided, ref is updated only if it still points to `old`.
+        Index and worktree are not touched, so `ref` should not be the
+        currently checked out branch.
+        """
+        cmd = ['git', 'update-ref']
+        if msg:
+            cmd += ['-m', msg]
+        cmd += [ref, hexsha]
+        if old:
+            cmd.append(old)
+        self._git_custom_command('', cmd)
+
+    def merge_trees(self, base, ours, theirs):
+        """Merge trees in a temporary index, without touching index or worktree
+
+        Only merges which git resolves on the tree level (i.e. no file was
+        changed differently on both sides) succeed.
+
+        Parameters
+        ----------
+        base, ours, theirs: str
+          Anything git resolves to a tree, e.g. a merge base and two branches
+
+        Returns
+        -------
+        str or None
+          hexsha of the merged tree, or None if there were conflicts
+        """
+        index_file = opj(self.repo.git_dir,
+                         'datalad-merge-index-%d' % getpid())
+        env = GitRunner.get_git_environ_adjusted()
+        env['GIT_INDEX_FILE'] = index_file
+        try:
+            self._git_custom_command(
+                '', ['git', 'read-tree', '-i', '-m', '--aggressive',
+                     base, ours, theirs],
+                env=env)
+            try:
+                out, _ = self._git_custom_command(
+                    '', ['git', 'write-tree'], env=env, expect_fail=True)
+            except CommandError as exc:
+                lgr.debug("Merge of %s into %s has conflicts: %s",
+                          theirs, ours, exc_str(exc))
+                return None
+            return out.strip()
+        finally:
+            if exists(index_file):
+                unlink(index_file)
+
     def remove_branch(self, branch):
         self._git_custom_command('', 'git branch -D %s' % branch)
 
@@ -1047,11 +1251,50 @@ class GitRepo(object):
                                   remote))
         # TODO: Return values?
     
+    def get_status(self, untracked='normal', **kwargs):
+        """Generate GitStatusRecord's for changes in index and worktree
+
+        A single `git status --porcelain=v2 -z` is ran and its output is
+        parsed as it comes, so git is terminated if the generator is closed
+        early.
+
+        Parameters
+        ----------
+        untracked: {'no', 'normal', 'all'}, optional
+          see datalad.support.gitstatus.get_status_cmd
+        **kwargs
+          passed to datalad.support.gitstatus.get_status_cmd, e.g.
+          `untracked_cache` or `paths`
+        """
+        return iter_status(self.cmd_call_wrapper, untracked=untracked,
+                           **kwargs)
+
+    def is_dirty(self, untracked=True, **kwargs):
+        """Return True if there are uncommitted changes (or untracked files)
+
+        Stops at the first change git reports.
+
+        Parameters
+        ----------
+        untracked: bool, optional
+          either untracked files make repository dirty
+        **kwargs
+          passed to get_status
+        """
+        status = self.get_status(untracked='normal' if untracked else 'no',
+                                 renames=False, **kwargs)
+        try:
+            for _ in status:
+                return True
+            return False
+        finally:
+            status.close()
+
     @property
     def dirty(self):
         """Returns true if there are uncommitted changes or files not known to
         index"""
-        return self.repo.is_dirty(untracked_files=True)
+        return self.is_dirty(untracked=True)
 
     def gc(self, allow_background=False, auto=False):
         """Perform house keeping (garbage collection, repacking)"""
@@ -1174,21 +1417,9 @@ class GitRepo(object):
         if branch is None:
             branch = self.get_active_branch()
 
-        cfg_reader = self.repo.config_reader()
-        sct = "branch \"{0}\"".format(branch)
-        track_remote = cfg_reader.get_value(section=sct,
-                                            option="remote",
-                                            default="DATALAD_DEFAULT")
-        if track_remote == "DATALAD_DEFAULT":
-            # we have no "tracking remote"
-            track_remote = None
-        track_branch = cfg_reader.get_value(section=sct,
-                                            option="merge",
-                                            default="DATALAD_DEFAULT")
-        if track_branch == "DATALAD_DEFAULT":
-            # we have no tracking branch
-            track_branch = None
-
+        sct = "branch.{0}".format(branch)
+        track_remote = self.config.get_value(sct, "remote", default=None)
+        track_branch = self.config.get_value(sct, "merge", default=None)
         return track_remote, track_branch
 
 
@@ -0,0 +1,139 @@
+# emacs: -*- mode: python; py-indent-offset: 4; tab-width: 4; indent-tabs-mode: nil -*-
+# ex: set sts=4 ts=4 sw=4 noet:
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+#
+#   See COPYING file distributed along with the datalad package for the
+#   copyright and license terms.
+#
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+"""Status of a worktree from a single `git status --porcelain=v2 -z`
+
+Records are parsed as git outputs them, so e.g. checking either a repository
+is dirty stops (and terminates git) at the first change reported.
+"""
+
+import logging
+from collections import namedtuple
+
+from datalad import cfg
+
+lgr = logging.getLogger('datalad.gitrepo.status')
+
+# status: two characters for the index and the worktree, with '.' for
+#   unmodified, as in `git status --porcelain=v2`.  '??' for untracked,
+#   '!!' for ignored
+# orig_path: path before rename or copy, None otherwise
+# submodule: 'N...' if not a submodule, or 'S<c><m><u>' flags otherwise
+GitStatusRecord = namedtuple('GitStatusRecord',
+                             ['status', 'path', 'orig_path', 'submodule'])
+
+UNTRACKED_MODES = ('no', 'normal', 'all')
+
+
+def get_status_cmd(untracked='normal', ignored=False, renames=True,
+                   untracked_cache=None, fsmonitor=None, paths=None):
+    """Return command line for `git status` as parsed by `iter_status`
+
+    Parameters
+    ----------
+    untracked: {'no', 'normal', 'all'}, optional
+      either to report untracked files, and for 'all' also those within
+      untracked directories (which is expensive)
+    ignored: bool, optional
+      either to report ignored files
+    renames: bool, optional
+      either to detect renames of staged files
+    untracked_cache: bool, optional
+      either to use (and populate) git's cache of untracked files.  If not
+      specified, taken from 'git.status untracked cache' datalad
+      configuration, which defaults to False
+    fsmonitor: bool, optional
+      either to use git's builtin file system monitor (git >= 2.36).  If not
+      specified, taken from 'git.status fsmonitor' datalad configuration,
+      which defaults to False.  A monitor configured via core.fsmonitor is
+      used by git anyway
+    paths: list of str, optional
+      to restrict status to
+    """
+    if untracked not in UNTRACKED_MODES:
+        raise ValueError("Unknown untracked=%r. Known are %s"
+                         % (untracked, ', '.join(UNTRACKED_MODES)))
+    if untracked_cache is None:
+        untracked_cache = cfg.getboolean('git', 'status untracked cache',
+                                         default=False)
+    if fsmonitor is None:
+        fsmonitor = cfg.getboolean('git', 'status fsmonitor', default=False)
+    cmd = ['git']
+    if untracked_cache:
+        cmd += ['-c', 'core.untrackedCache=true']
+    if fsmonitor:
+        cmd += ['-c', 'core.fsmonitor=true']
+    if not renames:
+        cmd += ['-c', 'status.renames=false']
+    cmd += ['status', '--porcelain=v2', '-z',
+            '--untracked-files=%s' % untracked]
+    if ignored:
+        cmd.append('--ignored')
+    if paths:
+        cmd += ['--'] + list(paths)
+    return cmd
+
+
+def parse_status(records):
+    """Generate GitStatusRecord's from NUL-separated records of git status
+
+    Parameters
+    ----------
+    records: iterable of str
+      as output by `git status --porcelain=v2 -z`, split on NUL
+    """
+    records = iter(records)
+    for record in records:
+        if not record:
+            continue
+        kind = record[0]
+        if kind == '1':
+            # 1 XY sub mH mI mW hH hI path
+            fields = record.split(' ', 8)
+            yield GitStatusRecord(fields[1], fields[8], None, fields[2])
+        elif kind == '2':
+            # 2 XY sub mH mI mW hH hI Xscore path, followed by origPath
+            fields = record.split(' ', 9)
+            yield GitStatusRecord(fields[1], fields[9], next(records),
+                                  fields[2])
+        elif kind == 'u':
+            # u XY sub m1 m2 m3 mW h1 h2 h3 path
+            fields = record.split(' ', 10)
+            yield GitStatusRecord(fields[1], fields[10], None, fields[2])
+        elif kind == '?':
+            yield GitStatusRecord('??', record[2:], None, 'N...')
+        elif kind == '!':
+            yield GitStatusRecord('!!', record[2:], None, 'N...')
+        elif kind == '#':
+            # header, e.g. with --branch
+            continue
+        else:
+            raise ValueError("Unknown record in git status output: %r"
+                             % record)
+
+
+def iter_status(runner, **kwargs):
+    """Run `git status` and generate GitStatusRecord's as git reports them
+
+    If the generator is closed before it is exhausted, git is terminated.
+
+    Parameters
+    ----------
+    runner: GitRunner
+      to run git within the repository
+    **kwargs
+      passed to get_status_cmd
+    """
+    cmd = get_status_cmd(**kwargs)
+    records = runner.run_gen(cmd, sep='\0', expect_stderr=True)
+    try:
+        for record in parse_status(records):
+            yield record
+    finally:
+        # terminates git if we did not get all of its output
+        records.close()
@@ -0,0 +1,78 @@
+# emacs: -*- mode: python; py-indent-offset: 4; tab-width: 4; indent-tabs-mode: nil -*-
+# ex: set sts=4 ts=4 sw=4 noet:
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+#
+#   See COPYING file distributed along with the datalad package for the
+#   copyright and license terms.
+#
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+"""Listing of git trees from a streamed `git ls-tree -r -z`
+
+Since tree objects are immutable, lists of files are cached by the sha of the
+tree, so repeated queries for the same commit do not run git at all.
+"""
+
+import logging
+from collections import namedtuple
+from collections import OrderedDict
+from threading import Lock
+
+lgr = logging.getLogger('datalad.gitrepo.tree')
+
+# mode: str, e.g. '100644', '120000' (symlink), '160000' (submodule)
+# type: 'blob', 'commit' (submodule) or 'tree'
+GitTreeEntry = namedtuple('GitTreeEntry', ['mode', 'type', 'sha', 'path'])
+
+# number of trees to keep lists of files for
+_TREE_CACHE_SIZE = 16
+_tree_files = OrderedDict()
+_tree_files_lock = Lock()
+
+
+def iter_tree(runner, treeish):
+    """Generate GitTreeEntry's for all files under `treeish` recursively
+
+    Parameters
+    ----------
+    runner: GitRunner
+      to run git within the repository
+    treeish: str
+      anything git resolves to a tree, e.g. a branch or a commit sha
+    """
+    for record in runner.run_gen(
+            ['git', 'ls-tree', '-r', '-z', '--full-tree', treeish],
+            sep='\0', expect_stderr=True):
+        if not record:
+            continue
+        # <mode> SP <type> SP <object> TAB <file>
+        info, _, path = record.partition('\t')
+        mode, type_, sha = info.split(' ')
+        yield GitTreeEntry(mode, type_, sha, path)
+
+
+def get_tree_files(runner, tree_sha):
+    """Return a tuple of paths of all files (blobs) under a tree
+
+    Submodules are not included.  The result is cached by `tree_sha`.
+
+    Parameters
+    ----------
+    runner: GitRunner
+      to run git within the repository
+    tree_sha: str
+      full sha of a tree object
+    """
+    with _tree_files_lock:
+        files = _tree_files.pop(tree_sha, None)
+        if files is not None:
+            # most recently used goes last
+            _tree_files[tree_sha] = files
+            return files
+    lgr.debug("Listing files of tree %s", tree_sha)
+    files = tuple(entry.path for entry in iter_tree(runner, tree_sha)
+                  if entry.type == 'blob')
+    with _tree_files_lock:
+        _tree_files[tree_sha] = files
+        while len(_tree_files) > _TREE_CACHE_SIZE:
+            _tree_files.popitem(last=False)
+    return files
@@ -10,9 +10,20 @@
 """
 
 from abc import ABCMeta, abstractmethod, abstractproperty
+from collections import deque
+from os import environ
 from os import linesep
+from os import getpid
+from os.path import basename
+from os.path import sep
+import atexit
+import json
 import logging
 import time
+from threading import Lock
+from threading import current_thread
+
+from six import PY3
 
 lgr = logging.getLogger('datalad.protocol')
 
@@ -25,6 +36,10 @@ class ProtocolInterface(object):
     implementation of __str__ has to be overridden otherwise.
 
     ProtocolInterface is iterable as a list of sections.
+
+    Sections could be started from multiple threads (e.g. by a Runner shared
+    among them), so implementations must allocate ids of sections while
+    holding `self._lock`.
     """
 
     __metaclass__ = ABCMeta
@@ -32,6 +47,7 @@ class ProtocolInterface(object):
     def __init__(self):
         self._sections = []
         self._title = ''
+        self._lock = Lock()
 
     def __iter__(self):
         return self._sections.__iter__()
@@ -151,6 +167,105 @@ class ProtocolInterface(object):
         """
         raise NotImplementedError
 
+    @property
+    def records_results(self):
+        """Indicates whether or not results of external commands are to be
+        passed to add_result() once they finished.
+
+        Returns
+        -------
+        bool
+        """
+        return False
+
+    def add_result(self, id_, status, stdout, stderr, cwd=None, env=None,
+                   rusage=None):
+        """Adds results of the finished external command of section `id_`.
+
+        Called only if `records_results`, after end_section().
+
+        Parameters
+        ----------
+        id_: int
+        status: int
+          Exit code of the command, negative if it was killed by a signal
+        stdout, stderr: bytes or None
+          Output of the command, None if it was not captured
+        cwd: str or None
+          Directory the command was ran in
+        env: dict or None
+          Custom environment the command was ran with
+        rusage: resource.struct_rusage or None
+          Resources used by the command, if available (see os.wait4)
+        """
+        pass
+
+    def replay(self, cmd, cwd=None, env=None):
+        """Returns results for an external command which is not executed.
+
+        Called only if not `do_execute_ext_commands`.
+
+        Parameters
+        ----------
+        cmd: list
+        cwd, env:
+          see add_result()
+
+        Returns
+        -------
+        (status, stdout, stderr) or None
+          as would be passed to add_result(), or None for a dry run
+        """
+        return None
+
+    @property
+    def replays_ext_commands(self):
+        """Indicates whether or not responses of persistent processes (e.g.
+        `git cat-file --batch`) are to be served by replay_exchange() instead
+        of starting those processes.
+
+        Returns
+        -------
+        bool
+        """
+        return False
+
+    def add_exchange(self, cmd, cwd, request, response):
+        """Adds a response of a persistent process to a single request.
+
+        Called only if `records_results`.
+
+        Parameters
+        ----------
+        cmd: list
+          Command the process was started with
+        cwd: str or None
+          Directory the process was started in
+        request: str
+          Request sent to the process, without the trailing newline
+        response: bytes or object
+          Response as read from the process, or anything JSON serializable
+          derived from it
+        """
+        pass
+
+    def replay_exchange(self, cmd, cwd, request):
+        """Returns a response of a persistent process which is not started.
+
+        Called only if `replays_ext_commands`.
+
+        Parameters
+        ----------
+        cmd, cwd, request:
+          see add_exchange()
+
+        Returns
+        -------
+        bytes or object
+          as was passed to add_exchange()
+        """
+        raise NotImplementedError
+
     def write_to_file(self, file_):
         """Writes the protocol to file.
 
@@ -217,8 +332,9 @@ class DryRunProtocol(ProtocolInterface):
         self._title = "Dry run protocol:" + linesep
 
     def start_section(self, cmd):
-        id_ = len(self._sections)
-        self._sections.append({'command': cmd})
+        with self._lock:
+            id_ = len(self._sections)
+            self._sections.append({'command': cmd})
         # TODO: it somewhat duplicates how currently all the dry running is
         # reported... but without it I seems to have no dry run logging at
         # all for e.g. "datalad crawl" command
@@ -284,8 +400,9 @@ class ExecutionTimeProtocol(ProtocolInterface):
 
     def start_section(self, cmd):
         t_start = time.time()
-        id_ = len(self._sections)
-        self._sections.append({'command': cmd, 'start': t_start})
+        with self._lock:
+            id_ = len(self._sections)
+            self._sections.append({'command': cmd, 'start': t_start})
         return id_
 
     def end_section(self, id_, exception):
@@ -325,3 +442,406 @@ class ExecutionTimeExternalsProtocol(ExecutionTimeProtocol):
     @property
     def records_callables(self):
         return False
+
+
+# options of git taking a value as a separate argument
+_GIT_OPTIONS_WITH_VALUE = ('-c', '-C', '--git-dir', '--work-tree',
+                           '--namespace')
+
+
+def get_command_kind(cmd):
+    """Return a short description of the kind of command, e.g. 'git annex add'
+
+    Options (and their values) are skipped, so all invocations of the same
+    git or git-annex subcommand are of the same kind.  For other commands it
+    is the name of the executable.
+
+    Parameters
+    ----------
+    cmd: list
+    """
+    if not cmd:
+        return ''
+    kind = [basename(cmd[0])]
+    if kind[0] not in ('git', 'git-annex'):
+        return kind[0]
+    args = iter(cmd[1:])
+    for arg in args:
+        if arg in _GIT_OPTIONS_WITH_VALUE:
+            next(args, None)
+        elif not arg.startswith('-'):
+            kind.append(arg)
+            if arg != 'annex':
+                break
+    return ' '.join(kind)
+
+
+class ResourceUsageProtocol(ExecutionTimeExternalsProtocol):
+    """Protocol to record resources used by external commands.
+
+    Each section contains, in addition to those of ExecutionTimeProtocol,
+    'kind' (see get_command_kind), 'cwd', 'thread', 'status', 'stdout_bytes',
+    'stderr_bytes' and, where os.wait4 is available, 'utime' and 'stime'
+    (CPU seconds), 'maxrss' (as reported by the OS, KiB on Linux), 'inblock'
+    and 'oublock' (block I/O operations).  'end' and 'duration' are those of
+    the entire run of the command.
+
+    The protocol is presented as a table aggregated per kind of command, and
+    could be exported as Chrome trace events (see write_trace()), e.g. to be
+    loaded into chrome://tracing or https://ui.perfetto.dev.
+    """
+
+    _RUSAGE_FIELDS = (('utime', 'ru_utime'), ('stime', 'ru_stime'),
+                      ('maxrss', 'ru_maxrss'), ('inblock', 'ru_inblock'),
+                      ('oublock', 'ru_oublock'))
+
+    def __init__(self):
+        super(ResourceUsageProtocol, self).__init__()
+        self._title = "Resource usage protocol:" + linesep
+
+    def start_section(self, cmd):
+        id_ = super(ResourceUsageProtocol, self).start_section(cmd)
+        self._sections[id_].update(
+            kind=get_command_kind(cmd),
+            thread=current_thread().ident)
+        return id_
+
+    def end_section(self, id_, exception):
+        section = self._sections[id_]
+        section['exception'] = exception
+        if exception is not None:
+            # failed to start, so there will be no results
+            super(ResourceUsageProtocol, self).end_section(id_, exception)
+
+    def add_result(self, id_, status, stdout, stderr, cwd=None, env=None,
+                   rusage=None):
+        section = self._sections[id_]
+        section['end'] = t_end = time.time()
+        section['duration'] = t_end - section['start']
+        section.update(
+            status=status, cwd=cwd,
+            stdout_bytes=len(stdout) if stdout is not None else None,
+            stderr_bytes=len(stderr) if stderr is not None else None)
+        for field, attr in self._RUSAGE_FIELDS:
+            section[field] = getattr(rusage, attr) if rusage else None
+
+    @property
+    def records_results(self):
+        return True
+
+    def get_summary(self):
+        """Return resource usage aggregated per kind of command
+
+        Returns
+        -------
+        list of dict
+          with 'kind', 'count', 'failed', 'duration', 'utime', 'stime',
+          'maxrss' (maximal), 'inblock', 'oublock', 'stdout_bytes' and
+          'stderr_bytes' (totals), sorted by descending duration
+        """
+        summary = {}
+        for section in self._sections:
+            kind = section.get('kind', '')
+            row = summary.get(kind)
+            if row is None:
+                row = summary[kind] = dict(
+                    kind=kind, count=0, failed=0, duration=0., utime=0.,
+                    stime=0., maxrss=0, inblock=0, oublock=0,
+                    stdout_bytes=0, stderr_bytes=0)
+            row['count'] += 1
+            if section.get('exception') is not None \
+                    or section.get('status') not in (0, None):
+                row['failed'] += 1
+            for key in ('duration', 'utime', 'stime', 'inblock', 'oublock',
+                        'stdout_bytes', 'stderr_bytes'):
+                row[key] += section.get(key) or 0
+            row['maxrss'] = max(row['maxrss'], section.get('maxrss') or 0)
+        return sorted(summary.values(), key=lambda r: -r['duration'])
+
+    def __str__(self):
+        columns = (('kind', '%-30s', '%-30s'), ('count', '%6s', '%6d'),
+                   ('failed', '%6s', '%6d'), ('duration', '%10s', '%10.3f'),
+                   ('utime', '%9s', '%9.3f'), ('stime', '%9s', '%9.3f'),
+                   ('maxrss', '%9s', '%9d'), ('inblock', '%9s', '%9d'),
+                   ('oublock', '%9s', '%9d'), ('stdout_bytes', '%12s', '%12d'),
+                   ('stderr_bytes', '%12s', '%12d'))
+        lines = [' '.join(h % name for name, h, _ in columns)]
+        for row in self.get_summary():
+            lines.append(' '.join(f % row[name] for name, _, f in columns))
+        return self._title + linesep.join(lines) + linesep
+
+    def get_trace_events(self):
+        """Return sections as Chrome trace events of complete ('X') type"""
+        pid = getpid()
+        events = []
+        for section in self._sections:
+            if section.get('start') is None or section.get('end') is None:
+                continue
+            args = dict((key, section.get(key)) for key in
+                        ('cwd', 'status', 'stdout_bytes', 'stderr_bytes')
+                        + tuple(f for f, _ in self._RUSAGE_FIELDS))
+            args['command'] = ' '.join(section['command'])
+            if section.get('exception') is not None:
+                args['exception'] = str(section['exception'])
+            kind = section.get('kind', '')
+            events.append({
+                'name': kind,
+                'cat': kind.split(' ')[1] if ' ' in kind else kind,
+                'ph': 'X',
+                # in microseconds
+                'ts': section['start'] * 1e6,
+                'dur': section['duration'] * 1e6,
+                'pid': pid,
+                'tid': section.get('thread') or 0,
+                'args': args})
+        return events
+
+    def write_trace(self, file_):
+        """Writes the protocol as Chrome trace events (JSON) to file"""
+        with open(file_, 'w') as f:
+            json.dump({'traceEvents': self.get_trace_events(),
+                       'displayTimeUnit': 'ms'}, f)
+
+    def write_to_file(self, file_):
+        """Writes the summary to file and trace events to `file_`.json"""
+        super(ResourceUsageProtocol, self).write_to_file(file_)
+        self.write_trace(file_ + '.json')
+
+
+def _decode_output(output):
+    if output is None or not PY3:
+        return output
+    # keeps any bytes, which are escaped by json as needed
+    return output.decode('utf-8', 'surrogateescape')
+
+
+def _encode_output(output):
+    if output is None or not PY3:
+        return output
+    return output.encode('utf-8', 'surrogateescape')
+
+
+class _CassetteProtocol(ProtocolInterface):
+    """Common parts of protocols recording and replaying cassettes.
+
+    A cassette is a JSON file with a list of external commands (`commands`),
+    each with its 'command', 'cwd', 'env' (changes to the environment of the
+    process), 'status', 'stdout', 'stderr' and 'exception' (if it failed to
+    start), and a list of `exchanges` with persistent processes, each with
+    'command', 'cwd', 'request', 'response' and 'binary' (if the response
+    was bytes).  If `root` is given, it is replaced with '{root}' in commands and
+    directories, so a cassette could be replayed for another location.
+    """
+
+    ROOT = '{root}'
+
+    def __init__(self, cassette, root=None):
+        """
+        Parameters
+        ----------
+        cassette: str
+          path to the cassette file
+        root: str, optional
+          directory to record paths relative to
+        """
+        super(_CassetteProtocol, self).__init__()
+        self.cassette = cassette
+        self.root = root.rstrip(sep) if root else None
+
+    def _to_cassette(self, value):
+        if self.root and value and value.startswith(self.root):
+            rest = value[len(self.root):]
+            if not rest or rest.startswith(sep):
+                return self.ROOT + rest
+        return value
+
+    def _from_cassette(self, value):
+        if self.root and value and value.startswith(self.ROOT):
+            return self.root + value[len(self.ROOT):]
+        return value
+
+    def _get_key(self, cmd, cwd):
+        return (tuple(self._to_cassette(arg) for arg in cmd),
+                self._to_cassette(cwd))
+
+    @property
+    def records_callables(self):
+        return False
+
+    @property
+    def do_execute_callables(self):
+        return True
+
+
+class CassetteRecordProtocol(_CassetteProtocol):
+    """Protocol to record results of all external commands into a cassette.
+
+    See _CassetteProtocol for the format.  The cassette is written by
+    write_to_file() (to `cassette` by default).
+    """
+
+    def __init__(self, cassette, root=None):
+        super(CassetteRecordProtocol, self).__init__(cassette, root=root)
+        self._title = "Cassette recording protocol:" + linesep
+        self._exchanges = []
+
+    def start_section(self, cmd):
+        command, _ = self._get_key(cmd, None)
+        with self._lock:
+            id_ = len(self._sections)
+            self._sections.append({'command': list(command)})
+        return id_
+
+    def end_section(self, id_, exception):
+        if exception is not None:
+            self._sections[id_]['exception'] = str(exception)
+
+    def add_section(self, cmd, exception):
+        id_ = self.start_section(cmd)
+        self.end_section(id_, exception)
+
+    def add_result(self, id_, status, stdout, stderr, cwd=None, env=None,
+                   rusage=None):
+        env_delta = None
+        if env is not None:
+            env_delta = dict((k, v) for k, v in env.items()
+                             if environ.get(k) != v)
+            env_delta.update((k, None) for k in environ if k not in env)
+        self._sections[id_].update(
+            cwd=self._to_cassette(cwd), env=env_delta, status=status,
+            stdout=_decode_output(stdout), stderr=_decode_output(stderr))
+
+    def add_exchange(self, cmd, cwd, request, response):
+        command, cwd = self._get_key(cmd, cwd)
+        binary = isinstance(response, bytes)
+        with self._lock:
+            self._exchanges.append({
+                'command': list(command), 'cwd': cwd, 'request': request,
+                'response': _decode_output(response) if binary else response,
+                'binary': binary})
+
+    @property
+    def records_ext_commands(self):
+        return True
+
+    @property
+    def records_results(self):
+        return True
+
+    @property
+    def do_execute_ext_commands(self):
+        return True
+
+    def write_to_file(self, file_=None):
+        """Writes the cassette (to `cassette` if `file_` is not given)"""
+        with open(file_ or self.cassette, 'w') as f:
+            json.dump({'version': 1, 'commands': self._sections,
+                       'exchanges': self._exchanges}, f,
+                      indent=1, sort_keys=True)
+
+
+class CassetteReplayProtocol(_CassetteProtocol):
+    """Protocol serving results of external commands from a cassette.
+
+    Commands are not executed.  Recorded results are matched by command and
+    directory and served in the order they were recorded, so repeated calls
+    of the same command could have different results.  Likewise persistent
+    processes are not started, and their responses are matched by command,
+    directory and request.  Commands or requests not found in the cassette
+    raise RuntimeError.  Replayed commands are recorded as sections.
+    """
+
+    def __init__(self, cassette, root=None):
+        super(CassetteReplayProtocol, self).__init__(cassette, root=root)
+        self._title = "Cassette replaying protocol:" + linesep
+        with open(cassette) as f:
+            recorded = json.load(f)
+        self._results = {}
+        for entry in recorded['commands']:
+            key = (tuple(entry['command']), entry.get('cwd'))
+            self._results.setdefault(key, deque()).append(entry)
+        self._responses = {}
+        for entry in recorded.get('exchanges', []):
+            key = (tuple(entry['command']), entry.get('cwd'), entry['request'])
+            self._responses.setdefault(key, deque()).append(entry)
+
+    def start_section(self, cmd):
+        with self._lock:
+            id_ = len(self._sections)
+            self._sections.append({'command': cmd})
+        return id_
+
+    def end_section(self, id_, exception):
+        self._sections[id_]['exception'] = exception
+
+    def add_section(self, cmd, exception):
+        id_ = self.start_section(cmd)
+        self.end_section(id_, exception)
+
+    def replay(self, cmd, cwd=None, env=None):
+        key = self._get_key(cmd, cwd)
+        with self._lock:
+            results = self._results.get(key)
+            entry = results.popleft() if results else None
+        if entry is None:
+            raise RuntimeError(
+                "No (more) results of %s under %s in cassette %s"
+                % (cmd, cwd, self.cassette))
+        self.add_section(cmd, entry.get('exception'))
+        if entry.get('exception') is not None:
+            # failed to start
+            raise OSError(entry['exception'])
+        return (entry['status'], _encode_output(entry['stdout']),
+                _encode_output(entry['stderr']))
+
+    def replay_exchange(self, cmd, cwd, request):
+        key = self._get_key(cmd, cwd) + (request,)
+        with self._lock:
+            responses = self._responses.get(key)
+            entry = responses.popleft() if responses else None
+        if entry is None:
+            raise RuntimeError(
+                "No (more) responses of %s under %s to %r in cassette %s"
+                % (cmd, cwd, request, self.cassette))
+        return _encode_output(entry['response']) if entry['binary'] \
+            else entry['response']
+
+    @property
+    def records_ext_commands(self):
+        return False
+
+    @property
+    def do_execute_ext_commands(self):
+        return False
+
+    @property
+    def replays_ext_commands(self):
+        return True
+
+
+_cassette_protocols = {}
+
+
+def get_cassette_protocol(mode, cassette, root=None):
+    """Return the protocol recording or replaying `cassette`
+
+    The same instance is returned for the same cassette, so all Runners of
+    the process share it.  A recorded cassette is written at exit.
+
+    Parameters
+    ----------
+    mode: {'record', 'replay'}
+    cassette: str
+    root: str, optional
+    """
+    key = (mode, cassette)
+    if key not in _cassette_protocols:
+        if mode == 'record':
+            protocol = CassetteRecordProtocol(cassette, root=root)
+            atexit.register(protocol.write_to_file)
+        elif mode == 'replay':
+            protocol = CassetteReplayProtocol(cassette, root=root)
+        else:
+            raise ValueError("Unknown mode %r of cassette protocol" % mode)
+        _cassette_protocols[key] = protocol
+    return _cassette_protocols[key]
@@ -0,0 +1,139 @@
+# emacs: -*- mode: python; py-indent-offset: 4; tab-width: 4; indent-tabs-mode: nil -*-
+# ex: set sts=4 ts=4 sw=4 noet:
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+#
+#   See COPYING file distributed along with the datalad package for the
+#   copyright and license terms.
+#
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+"""Test reading of the git-annex branch without git-annex
+
+"""
+
+import os
+from os.path import join as opj
+from os.path import dirname
+
+from mock import patch
+
+from ..gitrepo import GitRepo
+from ..annexbranch import AnnexBranch
+from ..annexbranch import get_location_log_path
+from ..annexbranch import get_hashdir_lower
+from ..annexbranch import parse_location_log
+from ..annexbranch import parse_uuid_log
+from ..annexbranch import _journal_file
+from ...tests.utils import with_tempfile
+from ...tests.utils import eq_, ok_, assert_not_equal
+
+UUID1 = 'e605dca6-446a-11e0-8b2a-002170d25c55'
+UUID2 = '00000000-0000-0000-0000-000000000001'
+KEY1 = 'MD5E-s4--ad0234829205b9033196ba818f7a872b.txt'
+KEY2 = 'SHA256E-s10--' + 'a' * 64 + '.dat'
+
+
+def test_parse_location_log():
+    eq_(parse_location_log(''), [])
+    eq_(parse_location_log(
+        '1287290776.765152s 1 %s\n'
+        '1287290777.1s 1 %s\n'
+        '1287290778.1s 0 %s\n'
+        'garbage\n' % (UUID1, UUID2, UUID1)),
+        [UUID2])
+    # order of lines doesn't matter, timestamps do
+    eq_(parse_location_log(
+        '1287290778.1s 1 %s\n'
+        '1287290776.7s 0 %s\n' % (UUID1, UUID1)),
+        [UUID1])
+
+
+def test_parse_uuid_log():
+    eq_(parse_uuid_log(
+        '%s some description timestamp=1287290778.1s\n'
+        '%s web\n'
+        '%s newer one timestamp=1287290779.1s\n'
+        '%s older one timestamp=1287290777.1s\n' % (UUID1, UUID2, UUID1, UUID1)),
+        {UUID1: 'newer one', UUID2: 'web'})
+
+
+def test_location_log_path():
+    path = get_location_log_path(KEY1)
+    ok_(path.startswith(get_hashdir_lower(KEY1) + '/'))
+    eq_(len(get_hashdir_lower(KEY1)), 7)
+    ok_(path.endswith('/%s.log' % KEY1))
+    # chunks are logged under the key of the entire content
+    eq_(get_hashdir_lower('MD5E-s4-S2-C1--ad0234829205b9033196ba818f7a872b.txt'),
+        get_hashdir_lower(KEY1))
+    ok_(get_location_log_path('URL--http&c%%example.com%a_b').endswith(
+        '/URL--http&ac&s&sexample.com&sa_b.log'))
+    eq_(_journal_file('a_b/c'), 'a__b_c')
+
+
+def _commit_annex_branch(repo, files):
+    """Commit files into git-annex branch, without touching the worktree"""
+    env = dict(os.environ,
+               GIT_INDEX_FILE=opj(repo.path, '.git', 'annex-index'),
+               GIT_AUTHOR_NAME='datalad', GIT_AUTHOR_EMAIL='test@example.com',
+               GIT_COMMITTER_NAME='datalad',
+               GIT_COMMITTER_EMAIL='test@example.com')
+    for path, content in files.items():
+        fullpath = opj(repo.path, '.git', 'tmp-annex', path)
+        if not os.path.exists(dirname(fullpath)):
+            os.makedirs(dirname(fullpath))
+        with open(fullpath, 'w') as f:
+            f.write(content)
+        sha, _ = repo.cmd_call_wrapper.run(
+            ['git', 'hash-object', '-w', fullpath], cwd=repo.path)
+        repo.cmd_call_wrapper.run(
+            ['git', 'update-index', '--add', '--cacheinfo',
+             '100644,%s,%s' % (sha.strip(), path)], cwd=repo.path, env=env)
+    tree, _ = repo.cmd_call_wrapper.run(['git', 'write-tree'],
+                                        cwd=repo.path, env=env)
+    cmd = ['git', 'commit-tree', tree.strip(), '-m', 'update']
+    try:
+        parent = repo.cmd_call_wrapper.run(
+            ['git', 'rev-parse', '--verify', '-q', 'refs/heads/git-annex'],
+            cwd=repo.path, expect_fail=True)[0].strip()
+        cmd += ['-p', parent]
+    except Exception:
+        pass
+    commit, _ = repo.cmd_call_wrapper.run(cmd, cwd=repo.path, env=env)
+    repo.cmd_call_wrapper.run(
+        ['git', 'update-ref', 'refs/heads/git-annex', commit.strip()],
+        cwd=repo.path)
+
+
+@with_tempfile
+def test_AnnexBranch(path):
+    repo = GitRepo(path, create=True)
+    branch = AnnexBranch(repo.path, catfile=repo.cat_file)
+    # no branch yet
+    eq_(branch.sha, None)
+    eq_(branch.get_locations([KEY1]), {KEY1: []})
+    eq_(branch.get_uuids(), {})
+
+    _commit_annex_branch(repo, {
+        'uuid.log': '%s here timestamp=1s\n%s web timestamp=1s\n' % (UUID1, UUID2),
+        get_location_log_path(KEY1): '1s 1 %s\n2s 1 %s\n' % (UUID1, UUID2)})
+    sha = branch.sha
+    ok_(sha)
+    eq_(branch.get_uuids(), {UUID1: 'here', UUID2: 'web'})
+    eq_(branch.get_locations([KEY1, KEY2, KEY1]), {KEY1: [UUID1, UUID2], KEY2: []})
+
+    # repeated queries do not read the logs again
+    with patch.object(branch, '_read_files') as read_files:
+        eq_(branch.get_locations([KEY1, KEY2]), {KEY1: [UUID1, UUID2], KEY2: []})
+        eq_(read_files.call_count, 0)
+
+    # until the branch moves
+    _commit_annex_branch(repo, {
+        get_location_log_path(KEY2): '1s 1 %s\n' % UUID2})
+    assert_not_equal(branch.sha, sha)
+    eq_(branch.get_locations([KEY1, KEY2]), {KEY1: [UUID1, UUID2], KEY2: [UUID2]})
+
+    # or there are changes in the journal
+    journal = opj(repo.path, '.git', 'annex', 'journal')
+    os.makedirs(journal)
+    with open(opj(journal, _journal_file(get_location_log_path(KEY1))), 'w') as f:
+        f.write('1s 1 %s\n2s 1 %s\n3s 0 %s\n' % (UUID1, UUID2, UUID1))
+    eq_(branch.get_locations([KEY1, KEY2]), {KEY1: [UUID2], KEY2: [UUID2]})
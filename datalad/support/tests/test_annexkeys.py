@@ -0,0 +1,101 @@
+# emacs: -*- mode: python; py-indent-offset: 4; tab-width: 4; indent-tabs-mode: nil -*-
+# ex: set sts=4 ts=4 sw=4 noet:
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+#
+#   See COPYING file distributed along with the datalad package for the
+#   copyright and license terms.
+#
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+"""Test helpers to get information about annexed files without git-annex
+
+"""
+
+import os
+from os.path import join as opj
+
+from mock import patch
+
+from ..annexkeys import split_annex_key
+from ..annexkeys import get_key_size
+from ..annexkeys import get_key_from_link_target
+from ..annexkeys import AnnexWorktreeIndex
+from ..annexkeys import AnnexKeyInfo
+from ...tests.utils import with_tree
+from ...tests.utils import eq_, ok_, assert_raises, assert_false
+from ...tests.utils import skip_if_on_windows
+
+KEY = 'MD5E-s4--ad0234829205b9033196ba818f7a872b.txt'
+KEY2 = 'SHA256E-s10-m1456789--' + 'a' * 64 + '.dat'
+
+
+def test_split_annex_key():
+    eq_(split_annex_key(KEY),
+        {'backend': 'MD5E', 'size': 4, 'mtime': None, 'chunksize': None,
+         'chunknum': None, 'name': 'ad0234829205b9033196ba818f7a872b.txt'})
+    eq_(split_annex_key(KEY2)['mtime'], 1456789)
+    eq_(split_annex_key('WORM--some--name')['name'], 'some--name')
+    eq_(split_annex_key('WORM--some--name')['size'], None)
+    eq_(split_annex_key('MD5-s100-S10-C2--abc')['chunknum'], 2)
+    assert_raises(ValueError, split_annex_key, 'whatever.txt')
+
+    eq_(get_key_size(KEY), 4)
+    eq_(get_key_size('WORM--name'), None)
+    eq_(get_key_size('whatever.txt'), None)
+
+
+def test_get_key_from_link_target():
+    target = '../.git/annex/objects/Fq/4M/%s/%s' % (KEY, KEY)
+    eq_(get_key_from_link_target(target), KEY)
+    eq_(get_key_from_link_target('../elsewhere/%s/%s' % (KEY, KEY)), None)
+    eq_(get_key_from_link_target('../.git/annex/objects/Fq/4M/%s' % KEY), None)
+
+
+@skip_if_on_windows
+@with_tree(tree={'.git': {'annex': {'objects': {'Fq': {'4M': {KEY: {KEY: '123\n'}}}}}},
+                 'ingit.txt': 'in git',
+                 'sub': {}})
+def test_AnnexWorktreeIndex(path):
+    objdir = '.git/annex/objects/Fq/4M/%s' % KEY
+    os.symlink('%s/%s' % (objdir, KEY), opj(path, 'present.txt'))
+    os.symlink('../%s/%s' % (objdir, KEY), opj(path, 'sub', 'present.txt'))
+    os.symlink('../.git/annex/objects/Zz/Zz/%s/%s' % (KEY2, KEY2),
+               opj(path, 'sub', 'absent.dat'))
+    os.symlink('ingit.txt', opj(path, 'link.txt'))
+
+    present = AnnexKeyInfo(KEY, 'MD5E', 4, True)
+    absent = AnnexKeyInfo(KEY2, 'SHA256E', 10, False)
+    files = ['present.txt', opj('sub', 'present.txt'), opj('sub', 'absent.dat'),
+             'ingit.txt', 'link.txt', 'nonexistent']
+    target = [present, present, absent, None, None, None]
+
+    index = AnnexWorktreeIndex(path)
+    assert_false(index.scanned)
+    assert_raises(RuntimeError, len, index)
+    eq_(index.lookup(files), target)
+
+    # and the same after a full scan
+    ok_(index.scan() is index)
+    ok_(index.scanned)
+    eq_(len(index), 3)
+    eq_(sorted(index), sorted(files[:3]))
+    eq_(index.lookup(files), target)
+    eq_(index.get('nonexistent', 'default'), 'default')
+
+
+@skip_if_on_windows
+@with_tree(tree={'.git': {'annex': {'objects': {}}},
+                 'subds': {'.git': {'annex': {'objects': {}}},
+                           'deeper': {}},
+                 'subds2': {'.git': 'gitdir: ../.git/modules/subds2'},
+                 'sub': {}})
+def test_AnnexWorktreeIndex_nested_repositories(path):
+    target = '.git/annex/objects/Zz/Zz/%s/%s' % (KEY2, KEY2)
+    os.symlink('../' + target, opj(path, 'sub', 'absent.dat'))
+    os.symlink(target, opj(path, 'subds', 'absent.dat'))
+    os.symlink('../' + target, opj(path, 'subds', 'deeper', 'absent.dat'))
+    os.symlink(target, opj(path, 'subds2', 'absent.dat'))
+
+    eq_(sorted(AnnexWorktreeIndex(path).scan()), [opj('sub', 'absent.dat')])
+    with patch('datalad.support.annexkeys.scandir', None):
+        eq_(sorted(AnnexWorktreeIndex(path).scan()),
+            [opj('sub', 'absent.dat')])
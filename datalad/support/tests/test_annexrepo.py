@@ -13,6 +13,7 @@
 from six.moves.urllib.parse import urljoin
 from six.moves.urllib.parse import urlsplit
 from shutil import copyfile
+from threading import Thread
 from nose.tools import assert_is_instance
 
 from datalad.tests.utils import *
@@ -744,6 +745,53 @@ def test_AnnexRepo_get_contentlocation():
         yield _test_AnnexRepo_get_contentlocation, batch
 
 
+@with_testrepos('basic_annex$', flavors=['clone'])
+def test_BatchedAnnex_pipelined(path):
+    annex = AnnexRepo(path, create=False, init=False)
+    fname = 'test-annex.dat'
+    key = annex.get_file_key(fname)
+    with swallow_outputs():
+        annex.get(fname)
+    location = annex.get_contentlocation(key)
+
+    bcmd = BatchedAnnex('contentlocation', path=annex.path, window=3)
+    # more requests than the window, so submit has to wait for some replies
+    eq_(bcmd([key] * 10), [location] * 10)
+    futures = [bcmd.submit(k) for k in (key, 'MD5E-s1--bogus', key)]
+    eq_([f.result() for f in futures], [location, '', location])
+    ok_(all(f.done() for f in futures))
+    bcmd.close()
+    # and it gets restarted upon next request
+    eq_(bcmd(key), location)
+    bcmd.close()
+
+    # the same via the repository
+    annex2 = AnnexRepo(path, create=False, init=False, batch_window=4)
+    eq_(annex2.get_contentlocation(key, batch=True), location)
+    eq_(annex2._batched['contentlocation'].window, 4)
+    annex2._batched.clear()
+
+
+@with_testrepos('basic_annex$', flavors=['clone'])
+def test_BatchedAnnexPool(path):
+    annex = AnnexRepo(path, create=False, init=False)
+    files = ['test-annex.dat', 'INFO.txt', 'nonexistent'] * 3
+    info = annex.info(files)
+
+    for dispatch in ('round-robin', 'hash'):
+        annex2 = AnnexRepo(path, create=False, init=False, batch_workers=3)
+        annex2._batched.get('info', annex_options=['--bytes'], json=True,
+                            path=annex2.path, dispatch=dispatch)
+        eq_(annex2.info(files, batch=True), info)
+        pool = annex2._batched['info']
+        assert_is_instance(pool, BatchedAnnexPool)
+        eq_(pool.workers, 3)
+        annex2._batched.clear()
+
+    # modifying commands could not be parallelized
+    assert_raises(ValueError, annex._batched.get, 'addurl', workers=2)
+
+
 @with_tree(tree=(('about.txt', 'Lots of abouts'),
                  ('about2.txt', 'more abouts'),
                  ('about2_.txt', 'more abouts_'),
@@ -972,7 +1020,12 @@ def test_annex_drop(src, dst):
     eq_(result[0], testfile)
     eq_(len(result), 1)
 
-    ar.get(testfile)
+    # records are returned for a single file, and only if it was got
+    result = ar.get(testfile)
+    ok_(isinstance(result, list))
+    eq_([r['file'] for r in result], [testfile])
+    ok_(result[0]['success'])
+    eq_(ar.get(testfile), [])
 
     # drop file by key:
     testkey = ar.get_file_key(testfile)
@@ -1022,3 +1075,226 @@ def test_annex_remove(path1, path2):
         assert_not_in("rm-test.dat", repo.get_annexed_files())
         eq_(out[0], "rm-test.dat")
 
+
+
+@with_tempfile
+def test_AnnexRepo_add_batched(path):
+    ar = AnnexRepo(path, create=True)
+    with open(opj(path, '.gitattributes'), 'w') as f:
+        f.write('* annex.largefiles=(largerthan=5b)\n')
+    ar.add('.gitattributes', git=True, commit=True)
+
+    with open(opj(path, 'large.dat'), 'w') as f:
+        f.write('large content')
+    with open(opj(path, 'small.txt'), 'w') as f:
+        f.write('small')
+
+    out = ar.add(['large.dat', 'small.txt'], batch=True)
+    eq_([r['file'] for r in out], ['large.dat', 'small.txt'])
+    ok_(all(r['success'] for r in out))
+    # annex.largefiles is honoured
+    assert_in('key', out[0])
+    assert_not_in('key', out[1])
+    ok_(os.path.islink(opj(path, 'large.dat')))
+    ok_(not os.path.islink(opj(path, 'small.txt')))
+
+    # the same process is reused, and a single file gives a single record
+    out_single = ar.add('large.dat', batch=True)
+    eq_(len(ar._batched), 1)
+    # unchanged file was skipped by annex
+    eq_(out_single, [])
+
+    ar.commit("added both")
+    ok_clean_git(path, annex=True)
+    eq_(ar.get_file_key('large.dat'), out[0]['key'])
+    eq_(set(ar.get_indexed_files()), {'.gitattributes', 'large.dat', 'small.txt'})
+
+
+@with_tempfile
+def test_AnnexRepo_lazy(path):
+    gr = GitRepo(path, create=True)
+    gr.add_remote('origin', 'ssh://example.com/some/path')
+
+    with patch.object(AnnexRepo, '_init') as init:
+        ar = AnnexRepo(path, lazy=True)
+        # nothing was done yet
+        assert_false(init.called)
+        ok_(ar._init_pending)
+        eq_(ar.config.get_value('remote.origin', 'annex-ssh-options',
+                                default=None), None)
+
+        # annex gets initialized right before the first annex command
+        with patch.object(ar.cmd_call_wrapper, 'run',
+                          return_value=('', '')) as run:
+            ar._run_annex_command('find')
+            eq_(init.call_count, 1)
+            eq_(run.call_count, 1)
+            # still no need for ssh
+            eq_(ar.config.get_value('remote.origin', 'annex-ssh-options',
+                                    default=None), None)
+
+            ar._run_annex_command('get')
+            eq_(init.call_count, 1)
+            assert_in('-o ControlMaster=auto',
+                      ar.config.get_value('remote.origin', 'annex-ssh-options'))
+
+    # without create/init it is still known right away if it is not an annex
+    assert_raises(RuntimeError, AnnexRepo, path, create=False, lazy=True)
+
+
+def test_get_annex_subcommand():
+    eq_(AnnexRepo._get_annex_subcommand(['git', 'annex', 'unlock', 'f']),
+        'unlock')
+    eq_(AnnexRepo._get_annex_subcommand(
+        ['git', '-c', 'annex.x=1', 'annex', '--debug', 'get', '--fast']), 'get')
+    eq_(AnnexRepo._get_annex_subcommand(['/usr/bin/git-annex', 'whereis']),
+        'whereis')
+    eq_(AnnexRepo._get_annex_subcommand(['git', 'status']), None)
+
+
+@with_tempfile
+def test_AnnexRepo_lazy_custom_command(path):
+    gr = GitRepo(path, create=True)
+    gr.add_remote('origin', 'ssh://example.com/some/path')
+
+    with patch.object(AnnexRepo, '_init') as init:
+        ar = AnnexRepo(path, lazy=True)
+        with patch.object(ar.cmd_call_wrapper, 'run',
+                          return_value=('', '')) as run:
+            ar._annex_custom_command(['file'], ['git', 'annex', 'copy',
+                                                '--to=origin'])
+            eq_(init.call_count, 1)
+            eq_(run.call_count, 1)
+            assert_in('-o ControlMaster=auto',
+                      ar.config.get_value('remote.origin', 'annex-ssh-options'))
+
+
+@with_tempfile
+def test_AnnexRepo_get_returns_list(path):
+    GitRepo(path, create=True)
+    record = {'command': 'get', 'file': 'file', 'success': True}
+    with patch.object(AnnexRepo, '_init'), \
+            patch('datalad.support.annexrepo.AnnexTransfer') as transfer:
+        transfer.return_value.get.return_value = [record]
+        ar = AnnexRepo(path, lazy=True)
+        # the same for a single path and a list of paths
+        eq_(ar.get('file'), [record])
+        eq_(transfer.return_value.get.call_args[0][0], ['file'])
+        eq_(ar.get(['file']), [record])
+        transfer.return_value.get.return_value = []
+        eq_(ar.get('file'), [])
+
+
+def _run_in_threads(func, n):
+    """Run func(i) in n threads at once, return results in order of i"""
+    results = [None] * n
+    errors = []
+
+    def run(i):
+        try:
+            results[i] = func(i)
+        except Exception as exc:
+            errors.append(exc)
+    threads = [Thread(target=run, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if errors:
+        raise errors[0]
+    return results
+
+
+def _echo_popen(cmd, **kwargs):
+    # instead of annex, a process which replies with the request itself
+    return Popen(['cat'], **kwargs)
+
+
+@skip_if_on_windows
+def test_BatchedAnnex_threads():
+    for window in (1, 4):
+        with patch('datalad.support.annexrepo.Popen', _echo_popen):
+            bcmd = BatchedAnnex('info', window=window)
+
+            def requests(i):
+                return [bcmd('t%d-%d' % (i, j)) for j in range(100)] \
+                    + bcmd(['t%d-l%d' % (i, j) for j in range(10)])
+            results = _run_in_threads(requests, 16)
+            bcmd.close()
+        for i, out in enumerate(results):
+            eq_(out, ['t%d-%d' % (i, j) for j in range(100)]
+                + ['t%d-l%d' % (i, j) for j in range(10)])
+
+
+def _popen(args):
+    # instead of annex, a process which runs args
+    return lambda cmd, **kwargs: Popen(args, **kwargs)
+
+
+@skip_if_on_windows
+def test_BatchedAnnex_terminated():
+    with patch('datalad.support.annexrepo.Popen', _popen(['sleep', '100'])):
+        bcmd = BatchedAnnex('contentlocation', window=4)
+        futures = [bcmd.submit('r%d' % i) for i in range(3)]
+    bcmd._process.kill()
+    # all requests in flight fail
+    for future in futures:
+        assert_raises(CommandError, future.result, 10)
+    # and it gets restarted upon next request
+    with patch('datalad.support.annexrepo.Popen', _echo_popen), \
+            swallow_logs():
+        eq_(bcmd(['r3', 'r4']), ['r3', 'r4'])
+    bcmd.close()
+
+    # without pipelining: terminates after reading a request without replying
+    with patch('datalad.support.annexrepo.Popen', _popen(['sh', '-c', 'read l'])):
+        bcmd = BatchedAnnex('contentlocation', json=True)
+        assert_raises(CommandError, bcmd, 'r0')
+    bcmd.close()
+
+
+def test_BatchedAnnexes_get_threads():
+    batched = BatchedAnnexes(window=2)
+    annexes = _run_in_threads(
+        lambda i: batched.get('info', annex_options=['--bytes'], json=True),
+        16)
+    # a single instance was created
+    ok_(all(a is annexes[0] for a in annexes))
+    eq_(len(batched), 1)
+    batched.clear()
+
+
+def test_BatchedAnnexes_get_dispatch():
+    batched = BatchedAnnexes(workers=2)
+    # dispatch is relevant only for multiple processes
+    ok_(isinstance(batched.get('addurl', dispatch='hash'), BatchedAnnex))
+    ok_(isinstance(batched.get('info', workers=1, dispatch='hash'),
+                   BatchedAnnex))
+    pool = batched.get('find', dispatch='hash')
+    ok_(isinstance(pool, BatchedAnnexPool))
+    eq_(pool.dispatch, 'hash')
+    batched.clear()
+
+
+@with_tree(tree=[('file%d.txt' % i, 'content %d' % i) for i in range(8)])
+@serve_path_via_http()
+@with_tempfile
+def test_AnnexRepo_threads(sitepath, siteurl, dst):
+    ar = AnnexRepo(dst, create=True, batch_window=4)
+    files = ['file%d.txt' % i for i in range(8)]
+    # add urls from multiple threads at once
+    outs = _run_in_threads(
+        lambda i: ar.add_url_to_file(files[i], urljoin(siteurl, files[i]),
+                                     batch=True),
+        len(files))
+    eq_([o['file'] for o in outs], files)
+    ar.commit("added files")
+
+    # and query them from even more threads
+    def info(i):
+        return [ar.info(files[(i + j) % len(files)], batch=True)['size']
+                for j in range(20)]
+    sizes = _run_in_threads(info, 16)
+    for i, s in enumerate(sizes):
+        eq_(s, [len('content %d' % ((i + j) % len(files)))
+                for j in range(20)])
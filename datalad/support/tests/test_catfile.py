@@ -0,0 +1,71 @@
+# emacs: -*- mode: python; py-indent-offset: 4; tab-width: 4; indent-tabs-mode: nil -*-
+# ex: set sts=4 ts=4 sw=4 noet:
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+#
+#   See COPYING file distributed along with the datalad package for the
+#   copyright and license terms.
+#
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+"""Test persistent git cat-file process
+
+"""
+
+from ..gitrepo import GitRepo
+from ..catfile import GitCatFile
+from ...tests.utils import with_tree
+from ...tests.utils import eq_, ok_, assert_raises
+
+
+@with_tree(tree={'file.txt': 'content\n', 'empty': ''})
+def test_GitCatFile(path):
+    repo = GitRepo(path, create=True)
+    repo.add(['file.txt', 'empty'])
+    repo.commit("added")
+
+    catfile = repo.cat_file
+    ok_(isinstance(catfile, GitCatFile))
+    ok_(catfile is repo.cat_file)
+
+    obj = catfile.get('HEAD:file.txt')
+    eq_(obj.type, 'blob')
+    eq_(obj.size, 8)
+    eq_(obj.content, b'content\n')
+    eq_(catfile.get('HEAD:nonexistent'), None)
+
+    # many requests at once, more than would fit into pipe buffers
+    refs = ['HEAD:file.txt', 'HEAD:empty', 'HEAD:nonexistent'] * 5000
+    objs = catfile.get_many(refs)
+    eq_(len(objs), len(refs))
+    eq_([o.content if o else None for o in objs[:3]],
+        [b'content\n', b'', None])
+    eq_(objs[-3:], objs[:3])
+
+    # only sha, type and size
+    info = catfile.get_info('HEAD:file.txt')
+    eq_(info, obj._replace(content=None))
+    eq_(catfile.get_info_many(['HEAD:nonexistent', 'HEAD^{tree}'])[0], None)
+    eq_(catfile.get_info('HEAD^{tree}').type, 'tree')
+
+    # content of blobs only
+    eq_(catfile.read_blobs(['file.txt', 'empty', 'nonexistent'],
+                           treeish='HEAD'),
+        [b'content\n', b'', None])
+    eq_(catfile.read_blobs([obj.sha, 'HEAD^{tree}']), [b'content\n', None])
+
+    assert_raises(ValueError, catfile.get, 'HEAD\n')
+    catfile.close()
+    # gets restarted if needed
+    eq_(catfile.get('HEAD:file.txt').content, b'content\n')
+    catfile.close()
+
+
+@with_tree(tree={'file.txt': 'line1\nline2\n', 'latin.txt': 'ü'})
+def test_get_file_content(path):
+    repo = GitRepo(path, create=True)
+    repo.add(['file.txt', 'latin.txt'])
+    repo.commit("added")
+    eq_(repo.get_file_content('file.txt'), ['line1', 'line2'])
+    # bytes are converted to characters one to one
+    eq_(repo.get_file_content('latin.txt', branch='master'), ['\xc3\xbc'])
+    assert_raises(KeyError, repo.get_file_content, 'nonexistent')
+    assert_raises(KeyError, repo.get_file_content, 'file.txt', 'nobranch')
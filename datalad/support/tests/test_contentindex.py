@@ -0,0 +1,96 @@
+# emacs: -*- mode: python; py-indent-offset: 4; tab-width: 4; indent-tabs-mode: nil -*-
+# ex: set sts=4 ts=4 sw=4 noet:
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+#
+#   See COPYING file distributed along with the datalad package for the
+#   copyright and license terms.
+#
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+"""Test persistent index of annexed files
+
+"""
+
+import os
+from os.path import join as opj
+from os.path import exists
+
+from mock import patch
+
+from ..gitrepo import GitRepo
+from ..annexkeys import AnnexKeyInfo
+from ..annexbranch import get_location_log_path
+from ..contentindex import AnnexContentIndex
+from .test_annexbranch import _commit_annex_branch
+from .test_annexbranch import UUID1
+from ...tests.utils import with_tempfile
+from ...tests.utils import eq_, ok_, assert_false
+from ...tests.utils import skip_if_on_windows
+
+KEY1 = 'MD5E-s4--ad0234829205b9033196ba818f7a872b.txt'
+KEY2 = 'SHA256E-s10--' + 'a' * 64 + '.dat'
+OBJDIR1 = '.git/annex/objects/Fq/4M/%s' % KEY1
+OBJDIR2 = '.git/annex/objects/Zz/Zz/%s' % KEY2
+
+
+def _add_symlink(repo, relpath, objdir, key):
+    depth = relpath.count('/')
+    os.symlink('../' * depth + '%s/%s' % (objdir, key), opj(repo.path, relpath))
+    repo.add([relpath])
+    repo.commit("added %s" % relpath)
+
+
+@skip_if_on_windows
+@with_tempfile
+def test_AnnexContentIndex(path):
+    repo = GitRepo(path, create=True)
+    os.makedirs(opj(path, OBJDIR1))
+    with open(opj(path, OBJDIR1, KEY1), 'w') as f:
+        f.write('123\n')
+    os.makedirs(opj(path, 'sub'))
+    with open(opj(path, 'ingit.txt'), 'w') as f:
+        f.write('in git')
+    repo.add(['ingit.txt'])
+    _add_symlink(repo, 'present.txt', OBJDIR1, KEY1)
+    _add_symlink(repo, 'sub/present.txt', OBJDIR1, KEY1)
+    _add_symlink(repo, 'sub/absent.dat', OBJDIR2, KEY2)
+
+    index = AnnexContentIndex(path, catfile=repo.cat_file)
+    ok_(index.update() is index)
+    eq_(sorted(index), ['present.txt', 'sub/absent.dat', 'sub/present.txt'])
+    eq_(index.get('sub/present.txt'), AnnexKeyInfo(KEY1, 'MD5E', 4, True))
+    eq_(index.get('sub/absent.dat'), AnnexKeyInfo(KEY2, 'SHA256E', 10, False))
+    eq_(index.get('ingit.txt'), None)
+    eq_(index.totals,
+        {'annexed files in working tree': 3,
+         'size of annexed files in working tree': 18,
+         'local annex keys': 1,
+         'local annex size': 4})
+    ok_(exists(opj(path, '.git', 'datalad', 'annex-content.json')))
+
+    # another instance loads it and does not need to rebuild
+    index = AnnexContentIndex(path)
+    with patch.object(index, '_rebuild') as rebuild, \
+            patch.object(index, '_update_files') as update_files:
+        eq_(len(index), 3)
+        assert_false(rebuild.called)
+        assert_false(update_files.called)
+    eq_(index.totals['local annex size'], 4)
+
+    # new commits are taken into account incrementally
+    _add_symlink(repo, 'sub/another.dat', OBJDIR2, KEY2)
+    os.unlink(opj(path, 'present.txt'))
+    repo.remove(['present.txt'])
+    repo.commit("removed")
+    with patch.object(index, '_rebuild') as rebuild:
+        index.update()
+        assert_false(rebuild.called)
+    eq_(sorted(index), ['sub/absent.dat', 'sub/another.dat', 'sub/present.txt'])
+
+    # content obtained is noticed only after git-annex records it
+    os.makedirs(opj(path, OBJDIR2))
+    with open(opj(path, OBJDIR2, KEY2), 'w') as f:
+        f.write('0123456789')
+    eq_(index.update().get('sub/absent.dat').present, False)
+    _commit_annex_branch(repo, {get_location_log_path(KEY2): '1s 1 %s\n' % UUID1})
+    eq_(index.update().get('sub/absent.dat').present, True)
+    eq_(index.totals['local annex size'], 14)
@@ -0,0 +1,93 @@
+# emacs: -*- mode: python; py-indent-offset: 4; tab-width: 4; indent-tabs-mode: nil -*-
+# ex: set sts=4 ts=4 sw=4 noet:
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+#
+#   See COPYING file distributed along with the datalad package for the
+#   copyright and license terms.
+#
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+"""Test incremental verification of annexed content
+
+"""
+
+from ..gitrepo import GitRepo
+from ..exceptions import CommandError
+from ..fsck import AnnexFsck
+from ..fsck import AnnexFsckState
+from ..fsck import get_duration
+from ...tests.utils import with_tempfile
+from ...tests.utils import eq_, ok_, assert_raises, assert_in
+
+
+class FakeAnnex(object):
+    """Reports records for keys, failing `fail` and stopping with `code`"""
+
+    def __init__(self, path, keys, fail=(), code=None):
+        self.path = path
+        self.keys = keys
+        self.fail = fail
+        self.code = code
+        self.calls = []
+
+    def _run_annex_command_json(self, command, args=None, files=None, **kwargs):
+        self.calls.append((command, args, files))
+        for key in self.keys:
+            yield {'command': command, 'key': key, 'file': key.lower(),
+                   'success': key not in self.fail}
+        if self.code:
+            raise CommandError("git annex fsck", "failed", self.code)
+
+
+def test_get_duration():
+    eq_(get_duration(10), 10)
+    eq_(get_duration('30d'), 30 * 86400)
+    eq_(get_duration('1h30m'), 5400)
+    eq_(get_duration('90'), 90)
+    assert_raises(ValueError, get_duration, '1x')
+
+
+@with_tempfile
+def test_AnnexFsck(path):
+    GitRepo(path, create=True)
+    annex = FakeAnnex(path, ['K1', 'K2', 'K3'], code=101)
+    fsck = AnnexFsck(annex, schedule='7d', jobs=4)
+    records = list(fsck.run(time_limit=3600))
+    eq_([r['key'] for r in records], ['K1', 'K2', 'K3'])
+    eq_(annex.calls,
+        [('fsck', ['--incremental-schedule=7d', '--time-limit=3600s', '-J4'],
+          None)])
+
+    # state persists
+    state = AnnexFsckState(path)
+    eq_(sorted(state.keys), ['K1', 'K2', 'K3'])
+    ok_(state.get('K1')[1])
+    eq_(state.get('K4'), None)
+    eq_(state.get_failed(), [])
+    eq_(state.get_unverified(['K1', 'K4']), ['K4'])
+    # verified too long ago
+    timestamp = state.get('K1')[0]
+    eq_(state.get_unverified(['K1', 'K2'], period='1d',
+                             now=timestamp + 2 * 86400),
+        ['K1', 'K2'])
+
+    # next slice, with a failure
+    annex = FakeAnnex(path, ['K3', 'K4'], fail={'K3'}, code=1)
+    fsck = AnnexFsck(annex, schedule=86400)
+    eq_([r['success'] for r in fsck.run(files=['k3', 'k4'])], [False, True])
+    eq_(annex.calls,
+        [('fsck', ['--incremental-schedule=86400s'], ['k3', 'k4'])])
+    state = AnnexFsckState(path)
+    eq_(sorted(state.keys), ['K1', 'K2', 'K3', 'K4'])
+    eq_(state.get_failed(), ['K3'])
+    eq_(state.get_unverified(['K1', 'K3']), ['K3'])
+
+    # verification of presence only is not recorded
+    annex = FakeAnnex(path, ['K3'])
+    list(AnnexFsck(annex, schedule='7d').run(fast=True))
+    assert_in('--fast', annex.calls[0][1])
+    eq_(AnnexFsckState(path).get_failed(), ['K3'])
+
+    # other failures are not swallowed
+    annex = FakeAnnex(path, [], code=1)
+    with assert_raises(CommandError):
+        list(AnnexFsck(annex, schedule='7d').run())
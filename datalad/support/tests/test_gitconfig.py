@@ -0,0 +1,135 @@
+# emacs: -*- mode: python; py-indent-offset: 4; tab-width: 4; indent-tabs-mode: nil -*-
+# ex: set sts=4 ts=4 sw=4 noet:
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+#
+#   See COPYING file distributed along with the datalad package for the
+#   copyright and license terms.
+#
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+"""Test cached access to git configuration
+
+"""
+
+import os
+from os.path import join as opj
+
+from mock import patch
+from six.moves.configparser import NoOptionError
+
+from ..gitrepo import GitRepo
+from ..gitconfig import GitConfigSnapshot
+from ..gitconfig import get_config_snapshot
+from ..gitconfig import _string_to_value
+from ...tests.utils import with_tempfile
+from ...tests.utils import eq_, ok_, assert_raises, assert_false
+
+
+def test_string_to_value():
+    eq_(_string_to_value('1'), 1)
+    eq_(_string_to_value('1.5'), 1.5)
+    eq_(_string_to_value('true'), True)
+    eq_(_string_to_value('Off'), False)
+    eq_(_string_to_value(None), True)
+    eq_(_string_to_value('some/path'), 'some/path')
+
+
+@with_tempfile
+def test_GitConfigSnapshot(path):
+    repo = GitRepo(path, create=True)
+    config = repo.config
+    ok_(config is get_config_snapshot(repo.path))
+    ok_(isinstance(config, GitConfigSnapshot))
+    eq_(repo.get_remotes(), [])
+    assert_raises(NoOptionError, config.get_value, 'annex', 'direct')
+    eq_(config.get_value('annex', 'direct', default=None), None)
+    assert_false(config.has_option('remote "origin"', 'url'))
+
+    with repo.get_config_writer() as writer:
+        writer.set_value('remote "origin"', 'url', 'http://example.com')
+        writer.set_value('remote "origin"', 'pushurl', 'ssh://example.com')
+        writer.set_value('remote "a.b"', 'url', 'http://example.com/a.b')
+        writer.set_value('annex', 'direct', 'false')
+        writer.set_value('datalad', 'number', 3)
+        # nothing is written until the end
+        eq_(repo.get_remotes(), [])
+
+    eq_(repo.get_remotes(), ['origin', 'a.b'])
+    eq_(config.get_value('remote "origin"', 'url'), 'http://example.com')
+    eq_(config.get_value('remote.origin', 'pushUrl'), 'ssh://example.com')
+    eq_(repo.get_remote_url('a.b'), 'http://example.com/a.b')
+    eq_(repo.get_remote_url('a.b', push=True), None)
+    assert_raises(ValueError, repo.get_remote_url, 'nonexistent')
+    eq_(config.get_value('annex', 'direct'), False)
+    eq_(config.get_value('datalad', 'number'), 3)
+
+    # config is not reloaded while it doesn't change
+    with patch.object(config, '_load') as load:
+        eq_(config.get_value('datalad', 'number'), 3)
+        eq_(load.call_count, 0)
+
+    # but changes done by git itself are picked up
+    repo.add_remote('other', 'http://example.com/other')
+    eq_(repo.get_remotes(), ['origin', 'a.b', 'other'])
+
+
+@with_tempfile
+def test_GitConfigSnapshot_case(path):
+    repo = GitRepo(path, create=True)
+    repo.add_remote('MyRemote', 'http://example.com/my')
+    with repo.get_config_writer() as writer:
+        writer.set_value('branch "Feature"', 'remote', 'MyRemote')
+        writer.set_value('branch "Feature"', 'merge', 'refs/heads/Other')
+    # sections and options are case-insensitive, but not subsections
+    eq_(repo.get_remotes(), ['MyRemote'])
+    eq_(repo.get_remote_url('MyRemote'), 'http://example.com/my')
+    eq_(repo.config.get_value('Remote.MyRemote', 'URL'),
+        'http://example.com/my')
+    eq_(repo.config.get_all('REMOTE.MyRemote.url'), ['http://example.com/my'])
+    assert_raises(ValueError, repo.get_remote_url, 'myremote')
+    eq_(repo.get_tracking_branch('Feature'), ('MyRemote', 'refs/heads/Other'))
+    eq_(repo.get_tracking_branch('feature'), (None, None))
+
+
+@with_tempfile
+@with_tempfile(mkdir=True)
+def test_GitConfigSnapshot_user_remotes(path, home):
+    with open(opj(home, '.gitconfig'), 'w') as f:
+        f.write('[remote "user"]\n\turl = http://example.com\n')
+    with patch.dict(os.environ, {'HOME': home}):
+        repo = GitRepo(path, create=True)
+        repo.add_remote('origin', 'http://example.com/origin')
+        # user wide configuration is used
+        eq_(repo.config.get_value('remote.user', 'url'), 'http://example.com')
+        eq_(repo.config.get_subsections('remote'), ['user', 'origin'])
+        # but does not define remotes of the repository
+        eq_(repo.get_remotes(), ['origin'])
+
+
+def test_get_config_snapshot_bounded():
+    with patch('datalad.support.gitconfig._SNAPSHOTS_SIZE', 2):
+        first = get_config_snapshot('/first')
+        ok_(get_config_snapshot('/first') is first)
+        get_config_snapshot('/second')
+        # the least recently used is forgotten
+        get_config_snapshot('/third')
+        ok_(get_config_snapshot('/first') is not first)
+
+
+@with_tempfile
+def test_configure_remote(path):
+    repo = GitRepo(path, create=True)
+    repo.configure_remote('sibling', 'http://example.com')
+    eq_(repo.get_remote_url('sibling'), 'http://example.com')
+    eq_(repo.get_remote_url('sibling', push=True), None)
+    eq_(repo.config.get_value('remote.sibling', 'fetch'),
+        '+refs/heads/*:refs/remotes/sibling/*')
+    # the same as would be configured by git
+    ok_(any(l.startswith('sibling\thttp://example.com')
+            for l in repo.show_remotes(verbose=True)))
+
+    repo.configure_remote('sibling', 'http://example.com/2',
+                          pushurl='http://example.com/push')
+    eq_(repo.get_remote_url('sibling'), 'http://example.com/2')
+    eq_(repo.get_remote_url('sibling', push=True), 'http://example.com/push')
+    eq_(repo.config.get_all('remote.sibling.fetch'),
+        ['+refs/heads/*:refs/remotes/sibling/*'])
@@ -0,0 +1,115 @@
+# emacs: -*- mode: python; py-indent-offset: 4; tab-width: 4; indent-tabs-mode: nil -*-
+# ex: set sts=4 ts=4 sw=4 noet:
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+#
+#   See COPYING file distributed along with the datalad package for the
+#   copyright and license terms.
+#
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+"""Test reader of git's index
+
+"""
+
+from os.path import join as opj
+
+from mock import patch
+
+from ..gitrepo import GitRepo
+from ..gitindex import GitIndex
+from ...tests.utils import with_tree
+from ...tests.utils import eq_, ok_, assert_in, assert_not_in
+
+# sha of an empty blob
+EMPTY_SHA = 'e69de29bb2d1d6434b8b29ae775ad8c2e48c5391'
+
+
+def _ls_files(repo):
+    out, _ = repo._git_custom_command([], ['git', 'ls-files', '--stage', '-z'])
+    entries = {}
+    for line in out.split('\0'):
+        if line:
+            info, _, path = line.partition('\t')
+            mode, sha, stage = info.split(' ')
+            entries.setdefault(path, (int(mode, 8), sha))
+    return entries
+
+
+def _check_index(repo):
+    index = GitIndex(repo.path)
+    expected = _ls_files(repo)
+    eq_(list(index), sorted(expected))
+    for path, (mode, sha) in expected.items():
+        assert_in(path, index)
+        entry = index.get(path)
+        eq_((entry.mode, entry.sha), (mode, sha))
+    return index
+
+
+@with_tree(tree={'file.txt': 'content\n',
+                 'd': {'sub.txt': 'more', 'sub2': {'deep.dat': 'deep'}},
+                 'd.txt': '',
+                 'ü.txt': 'unicode'})
+def test_GitIndex(path):
+    repo = GitRepo(path, create=True)
+    index = repo.index
+    eq_(len(index), 0)
+    repo.add(['file.txt', 'd', 'd.txt', 'ü.txt'])
+
+    # it is re-read upon changes
+    eq_(len(index), 5)
+    ok_(index is repo.index)
+    eq_(sorted(repo.get_indexed_files()), sorted(_ls_files(repo)))
+    assert_in(opj('d', 'sub.txt'), index)
+    assert_not_in('d', index)
+    assert_not_in('nonexistent', index)
+    eq_(index.get('nonexistent'), None)
+    entry = index.get('file.txt')
+    eq_(entry.size, 8)
+    eq_(entry.mode, 0o100644)
+    ok_(entry.mtime > 0)
+
+    # prefix queries
+    eq_(index.get_files_under('d'),
+        ['d/sub.txt', 'd/sub2/deep.dat'])
+    eq_(index.get_files_under('d/sub2/'), ['d/sub2/deep.dat'])
+    eq_(index.get_files_under('file.txt'), [])
+    eq_(len(index.get_files_under('')), 5)
+    ok_(index.has_files_under('d/sub2'))
+    ok_(not index.has_files_under('file.txt'))
+
+    # parsed the same in all versions, with a name too long to have its
+    # length in flags, and with an extended flag (intent-to-add)
+    paths = index.paths
+    long_path = '/'.join(['x' * 200] * 25)
+    repo._git_custom_command(
+        [], ['git', 'update-index', '--add', '--cacheinfo',
+             '100644,%s,%s' % (EMPTY_SHA, long_path)])
+    # a new version of the index does not change what was returned before
+    assert_in(long_path, index.paths)
+    eq_(len(paths), 5)
+    with open(opj(path, 'new.txt'), 'w') as f:
+        f.write('new')
+    repo._git_custom_command([], ['git', 'add', '--intent-to-add', 'new.txt'])
+    for version in (2, 3, 4):
+        repo._git_custom_command(
+            [], ['git', 'update-index', '--index-version', str(version)])
+        index = _check_index(repo)
+        assert_in(long_path, index)
+        assert_in('new.txt', index)
+
+    # unresolved conflict has entries for multiple stages
+    p = repo.cmd_call_wrapper
+    p.run(['git', 'update-index', '--force-remove', 'd.txt'])
+    with open(opj(path, 'index-info'), 'w') as f:
+        for stage in (1, 2, 3):
+            f.write('100644 %s %d\td.txt\n' % (EMPTY_SHA, stage))
+    p.run('git update-index --index-info < index-info', shell=True)
+    index = _check_index(repo)
+    eq_(index.conflicts, {'d.txt'})
+
+    # split index is read via git
+    p.run(['git', 'update-index', '--split-index'])
+    with patch.object(GitIndex, '_read_ls_files', autospec=True,
+                      side_effect=GitIndex._read_ls_files) as read_ls_files:
+        _check_index(repo)
+        ok_(read_ls_files.called)
@@ -20,6 +20,7 @@ from datalad.utils import getpwd, chpwd
 # we want to test everything in gitrepo:
 from ..gitrepo import *
 from ..gitrepo import _normalize_path
+from ..gitrepo import _normalize_paths
 from ..exceptions import FileNotInRepositoryError
 
 
@@ -233,6 +234,42 @@ def test_normalize_path(git_path):
         eq_(result, opj('d1', 'testfile'), "_normalize_path() returned %s" % result)
 
 
+@with_tree(tree={'d1': {'d2': {'testfile': ''}}})
+@with_tempfile(mkdir=True)
+@assert_cwd_unchanged(ok_to_chdir=True)
+def test_normalize_paths(path, linkdir):
+    # repository path with a symlink in it, so realpath matters
+    link = opj(linkdir, 'repo')
+    os.symlink(path, link)
+    paths = ['testfile', opj('d1', 'testfile'), '',
+             opj(link, 'd1', 'd2', 'testfile'),
+             opj(path, 'd1', 'testfile'),
+             opj(path, 'd1', 'd2') + os.sep,
+             opj(path, 'd1', 'd2', pardir),
+             opj(path, 'd1', curdir),
+             path]
+    expected = ['testfile', opj('d1', 'testfile'), '',
+                opj('d1', 'd2', 'testfile'),
+                opj('d1', 'testfile'),
+                opj('d1', 'd2'),
+                'd1',
+                'd1',
+                curdir]
+    eq_(_normalize_paths(link, paths), expected)
+    eq_([_normalize_path(link, p) for p in paths], expected)
+
+    with chpwd(opj(path, 'd1', 'd2')):
+        paths = [opj(curdir, 'testfile'), opj(pardir, 'testfile'),
+                 'testfile', opj(link, 'd1')]
+        expected = [opj('d1', 'd2', 'testfile'), opj('d1', 'testfile'),
+                    'testfile', 'd1']
+        eq_(_normalize_paths(path, paths), expected)
+        eq_(_normalize_paths(link, paths), expected)
+
+    assert_raises(FileNotInRepositoryError, _normalize_paths, path,
+                  ['testfile', opj(path, pardir, 'outside')])
+
+
 def test_GitRepo_files_decorator():
 
     class testclass(object):
@@ -679,6 +716,54 @@ def test_GitRepo_get_merge_base(src):
     assert(repo.get_merge_base(['nonexistent', branch2]) is None)
 
 
+@with_tempfile(mkdir=True)
+def test_GitRepo_merge_without_checkout(src):
+    repo = GitRepo(src, create=True)
+    repo._git_custom_command('', ['git', 'config', 'user.name', 'DataLad Tester'])
+    repo._git_custom_command('', ['git', 'config', 'user.email', 'test@example.com'])
+
+    def commit_file(name, content):
+        with open(opj(src, name), 'w') as f:
+            f.write(content)
+        repo.add(name)
+        repo.commit('committing %s' % name)
+
+    commit_file('base.txt', 'base')
+    base = repo.get_hexsha()
+    repo.checkout('other', options='-b')
+    commit_file('other.txt', 'other')
+    repo.checkout('master')
+    commit_file('master.txt', 'master')
+    master = repo.get_hexsha()
+
+    tree = repo.merge_trees(base, 'master', 'other')
+    eq_(len(tree), 40)
+    merge = repo.commit_tree(tree, parents=['master', 'other'], msg='merged')
+    # master is not checked out, so its update would be visible only in refs
+    repo.update_ref('refs/heads/merged', merge)
+    eq_(sorted(repo.get_files('merged')),
+        ['base.txt', 'master.txt', 'other.txt'])
+    eq_(repo.get_merge_base(['merged', 'other']), repo.get_hexsha('other'))
+    eq_(repo.get_active_branch(), 'master')
+    assert_false(exists(opj(src, 'other.txt')))
+    assert_false(repo.dirty)
+    eq_([f for f in os.listdir(repo.repo.git_dir) if 'merge-index' in f], [])
+
+    # update only if still pointing to the old commit
+    assert_raises(CommandError, repo.update_ref, 'refs/heads/merged', master,
+                  old=base)
+    repo.update_ref('refs/heads/merged', master, old=merge)
+    eq_(repo.get_hexsha('merged'), master)
+
+    # the same file changed differently needs a worktree to be merged
+    commit_file('base.txt', 'changed in master')
+    repo.checkout('other')
+    commit_file('base.txt', 'changed in other')
+    repo.checkout('master')
+    eq_(repo.merge_trees(base, 'master', 'other'), None)
+    assert_false(repo.dirty)
+
+
 @with_tempfile(mkdir=True)
 def test_GitRepo_git_get_branch_commits(src):
 
@@ -0,0 +1,111 @@
+# emacs: -*- mode: python; py-indent-offset: 4; tab-width: 4; indent-tabs-mode: nil -*-
+# ex: set sts=4 ts=4 sw=4 noet:
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+#
+#   See COPYING file distributed along with the datalad package for the
+#   copyright and license terms.
+#
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+"""Test status of worktrees
+
+"""
+
+import os
+from os.path import join as opj
+
+from mock import patch
+
+from ..gitrepo import GitRepo
+from ..gitstatus import GitStatusRecord
+from ..gitstatus import get_status_cmd
+from ..gitstatus import parse_status
+from ...tests.utils import with_tree
+from ...tests.utils import eq_, ok_, assert_raises, assert_in, assert_not_in
+
+SHA = 'e69de29bb2d1d6cf6ad8bd2536b0ad2fdb8f7c8b'
+
+
+def test_parse_status():
+    records = [
+        '# branch.oid (initial)',
+        '1 M. N... 100644 100644 100644 %s %s file with space' % (SHA, SHA),
+        '2 R. N... 100644 100644 100644 %s %s R100 new' % (SHA, SHA),
+        'old',
+        'u UU N... 100644 100644 100644 100644 %s %s %s conflict'
+        % (SHA, SHA, SHA),
+        '1 .M SC.. 160000 160000 160000 %s %s sub' % (SHA, SHA),
+        '? untracked/',
+        '! ignored',
+        '']
+    eq_(list(parse_status(records)),
+        [GitStatusRecord('M.', 'file with space', None, 'N...'),
+         GitStatusRecord('R.', 'new', 'old', 'N...'),
+         GitStatusRecord('UU', 'conflict', None, 'N...'),
+         GitStatusRecord('.M', 'sub', None, 'SC..'),
+         GitStatusRecord('??', 'untracked/', None, 'N...'),
+         GitStatusRecord('!!', 'ignored', None, 'N...')])
+    assert_raises(ValueError, list, parse_status(['bogus']))
+
+
+def test_get_status_cmd():
+    eq_(get_status_cmd(untracked='no', untracked_cache=True, fsmonitor=False,
+                       renames=False, paths=['a']),
+        ['git', '-c', 'core.untrackedCache=true', '-c', 'status.renames=false',
+         'status', '--porcelain=v2', '-z', '--untracked-files=no', '--', 'a'])
+    assert_raises(ValueError, get_status_cmd, untracked='some')
+
+
+@with_tree(tree={'modified': 'content', 'deleted': 'content',
+                 'staged': 'content', 'renamed': 'some content',
+                 'd': {'sub': 'content'}})
+def test_GitRepo_get_status(path):
+    repo = GitRepo(path, create=True)
+    repo.add(['modified', 'deleted', 'staged', 'renamed', 'd'])
+    repo.commit("initial")
+    ok_(not repo.dirty)
+    eq_(list(repo.get_status()), [])
+
+    with open(opj(path, 'untracked'), 'w') as f:
+        f.write('new')
+    ok_(repo.dirty)
+    ok_(not repo.is_dirty(untracked=False))
+
+    with open(opj(path, 'modified'), 'w') as f:
+        f.write('changed')
+    with open(opj(path, 'staged'), 'w') as f:
+        f.write('changed')
+    repo.add('staged')
+    os.unlink(opj(path, 'deleted'))
+    repo._git_custom_command([], ['git', 'mv', 'renamed', 'moved'])
+    os.mkdir(opj(path, 'newdir'))
+    with open(opj(path, 'newdir', 'file'), 'w') as f:
+        f.write('new')
+
+    status = {r.path: r for r in repo.get_status()}
+    eq_({p: r.status for p, r in status.items()},
+        {'modified': '.M', 'deleted': '.D', 'staged': 'M.', 'moved': 'R.',
+         'untracked': '??', 'newdir/': '??'})
+    eq_(status['moved'].orig_path, 'renamed')
+    eq_(set(r.path for r in repo.get_status(untracked='all')
+            if r.status == '??'),
+        {'untracked', 'newdir/file'})
+    assert_not_in('untracked',
+                  [r.path for r in repo.get_status(untracked='no')])
+    eq_([r.path for r in repo.get_status(paths=['d', 'staged'])], ['staged'])
+    ok_(repo.is_dirty(untracked=False))
+
+
+@with_tree(tree={'file': 'content'})
+def test_GitRepo_is_dirty_stops_early(path):
+    repo = GitRepo(path, create=True)
+    consumed = []
+
+    def run_gen(cmd, **kwargs):
+        assert_in('--porcelain=v2', cmd)
+        eq_(kwargs['sep'], '\0')
+        for i in range(1000):
+            consumed.append(i)
+            yield '? file%d' % i
+    with patch.object(repo.cmd_call_wrapper, 'run_gen', run_gen):
+        ok_(repo.dirty)
+    eq_(consumed, [0])
@@ -0,0 +1,60 @@
+# emacs: -*- mode: python; py-indent-offset: 4; tab-width: 4; indent-tabs-mode: nil -*-
+# ex: set sts=4 ts=4 sw=4 noet:
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+#
+#   See COPYING file distributed along with the datalad package for the
+#   copyright and license terms.
+#
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+"""Test listing of git trees
+
+"""
+
+import os
+from os.path import join as opj
+
+from mock import patch
+
+from ..gitrepo import GitRepo
+from ..gittree import GitTreeEntry
+from ..gittree import iter_tree
+from ...cmd import GitRunner
+from ...tests.utils import with_tree
+from ...tests.utils import eq_, assert_raises
+
+# sha of an empty blob
+EMPTY_SHA = 'e69de29bb2d1d6434b8b29ae775ad8c2e48c5391'
+
+
+@with_tree(tree={'file.txt': '', 'd': {'sub with space.txt': 'some'}})
+def test_get_files(path):
+    repo = GitRepo(path, create=True)
+    os.symlink('file.txt', opj(path, 'link'))
+    repo.add(['file.txt', 'd', 'link'])
+    # a submodule is not a file
+    repo._git_custom_command(
+        [], ['git', 'update-index', '--add', '--cacheinfo',
+             '160000,%s,sub' % EMPTY_SHA])
+    repo.commit("initial")
+
+    entries = list(iter_tree(repo.cmd_call_wrapper, 'HEAD'))
+    eq_([e.path for e in entries],
+        ['d/sub with space.txt', 'file.txt', 'link', 'sub'])
+    eq_(entries[1], GitTreeEntry('100644', 'blob', EMPTY_SHA, 'file.txt'))
+    eq_([e.mode for e in entries[2:]], ['120000', '160000'])
+
+    expected = ['d/sub with space.txt', 'file.txt', 'link']
+    eq_(repo.get_files('master'), expected)
+    # the same tree is listed only once, even if reached differently
+    with patch.object(GitRunner, 'run_gen') as run_gen:
+        eq_(repo.get_files('HEAD'), expected)
+        eq_(repo.get_files(repo.repo.head.commit.hexsha), expected)
+        eq_(GitRepo(path).get_files('master'), expected)
+        run_gen.assert_not_called()
+
+    repo.checkout('other', options='-b')
+    repo.remove('file.txt')
+    repo.commit("removed")
+    eq_(repo.get_files('other'), ['d/sub with space.txt', 'link'])
+    eq_(repo.get_files('master'), expected)
+    assert_raises(ValueError, repo.get_files, 'nonexistent')
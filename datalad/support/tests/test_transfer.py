@@ -0,0 +1,125 @@
+# emacs: -*- mode: python; py-indent-offset: 4; tab-width: 4; indent-tabs-mode: nil -*-
+# ex: set sts=4 ts=4 sw=4 noet:
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+#
+#   See COPYING file distributed along with the datalad package for the
+#   copyright and license terms.
+#
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+"""Test parallel transfers of annexed content
+
+"""
+
+from threading import Lock
+
+from mock import MagicMock
+
+from ..transfer import AnnexTransfer
+from ...tests.utils import eq_, ok_, assert_in
+
+
+class FakeAnnex(object):
+    """Records annex invocations and reports success for all but `fail`"""
+
+    def __init__(self, locations, fail=(), dirs=None):
+        self.locations = locations
+        self.dirs = dirs or {}
+        self.fail = fail
+        self.calls = []
+        self._lock = Lock()
+        self.config = MagicMock()
+        self.config.get_value.side_effect = \
+            lambda section, option, default=None: {
+                ('remote.slow', 'datalad-jobs'): '1',
+                ('remote.slow', 'annex-uuid'): 'uuid-slow',
+                ('remote.fast', 'annex-uuid'): 'uuid-fast',
+            }.get((section, option), default)
+        self.annex_branch = MagicMock()
+        self.annex_branch.get_locations.side_effect = \
+            lambda keys: {k: self.locations[k[4:]] for k in keys}
+
+    def get_remotes(self):
+        return ['slow', 'fast']
+
+    def get_file_key(self, f, batch=False):
+        return 'KEY-%s' % f
+
+    def _run_annex_command_json(self, command, args=None, files=None, **kwargs):
+        with self._lock:
+            self.calls.append((command, args, files))
+        if files:
+            # annex reports on files within directories
+            reported = sum((self.dirs.get(f, [f]) for f in files), [])
+        elif '--all' in args:
+            reported = sorted(self.locations)
+        else:
+            reported = [a for a in args if a.startswith('KEY')]
+        for f in reported:
+            yield {'command': command, 'action': {'file': f},
+                   'byte-progress': 1}
+            record = {'command': command, 'success': (command, f) not in self.fail}
+            record['key' if f.startswith('KEY') else 'file'] = f
+            yield record
+
+
+def test_AnnexTransfer_get():
+    files = ['f%d' % i for i in range(6)]
+    locations = {'f0': ['uuid-slow'], 'f1': ['uuid-fast'],
+                 'f2': ['uuid-slow', 'uuid-fast'], 'f3': [],
+                 'f4': ['uuid-fast', 'uuid-other'], 'f5': ['uuid-slow']}
+    annex = FakeAnnex(locations, fail={('get', 'f5')})
+    progress = []
+    transfer = AnnexTransfer(annex, jobs=4, progress=progress.append)
+    eq_(transfer.get_remote_jobs('slow'), 1)
+    eq_(transfer.get_remote_jobs('fast'), 4)
+
+    results = transfer.get(files)
+    # results are in the order of files
+    eq_([r['file'] for r in results], files)
+    ok_(all(r['success'] for r in results[:5]))
+    assert_in({'command': 'get', 'action': {'file': 'f0'}, 'byte-progress': 1},
+              progress)
+
+    calls = {tuple(c[1]): c[2] for c in annex.calls[:-1]}
+    eq_(calls[('--from=slow', '--json-progress')], ['f0', 'f5'])
+    eq_(calls[('--from=fast', '-J4', '--json-progress')], ['f1', 'f2', 'f4'])
+    eq_(calls[('-J4', '--json-progress')], ['f3'])
+    # f5 failed to be obtained from a specific remote, so annex was asked
+    # once again to get it from anywhere
+    eq_(annex.calls[-1], ('get', ['-J4', '--json-progress'], ['f5']))
+    eq_(len(annex.calls), 4)
+
+
+def test_AnnexTransfer_serial():
+    annex = FakeAnnex({})
+    transfer = AnnexTransfer(annex, jobs=1)
+    eq_(len(transfer.get(['a', 'b'])), 2)
+    eq_(annex.calls, [('get', [], ['a', 'b'])])
+
+
+def test_AnnexTransfer_copy_drop():
+    annex = FakeAnnex({}, fail={('drop', 'KEY-b')})
+    transfer = AnnexTransfer(annex, jobs=3)
+    eq_([r['file'] for r in transfer.copy_to(['a', 'b'], 'slow')], ['a', 'b'])
+    eq_(annex.calls[-1], ('copy', ['--to=slow'], ['a', 'b']))
+    transfer.copy_to(['a'], 'fast', options=['--fast'])
+    eq_(annex.calls[-1], ('copy', ['--to=fast', '--fast', '-J3'], ['a']))
+
+    annex.calls = []
+    results = transfer.drop(['KEY-a', 'KEY-b', 'KEY-c', 'KEY-d'], key=True)
+    eq_([(r['key'], r['success']) for r in results],
+        [('KEY-a', True), ('KEY-b', False), ('KEY-c', True), ('KEY-d', True)])
+    eq_(sorted(c[1] for c in annex.calls),
+        [['--key', 'KEY-%s' % k] for k in 'abcd'])
+
+
+def test_AnnexTransfer_unmatched_records():
+    annex = FakeAnnex({'d/b': [], 'd/a': [], 'c': []},
+                      dirs={'d': ['d/b', 'd/a']})
+    transfer = AnnexTransfer(annex, jobs=1)
+    # records for files within a directory follow the requested files
+    eq_([r['file'] for r in transfer.drop(['d', 'c'])], ['c', 'd/b', 'd/a'])
+    eq_([r['file'] for r in transfer.copy_to(['d'], 'fast')], ['d/b', 'd/a'])
+    eq_([r['file'] for r in transfer.get(['c', 'd'])], ['c', 'd/b', 'd/a'])
+    eq_([r['file'] for r in transfer.drop(None, options=['--all'])],
+        ['c', 'd/a', 'd/b'])
@@ -0,0 +1,76 @@
+# emacs: -*- mode: python; py-indent-offset: 4; tab-width: 4; indent-tabs-mode: nil -*-
+# ex: set sts=4 ts=4 sw=4 noet:
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+#
+#   See COPYING file distributed along with the datalad package for the
+#   copyright and license terms.
+#
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+"""Test compact representation of whereis results
+
+"""
+
+from ..whereis import WhereisResult
+from ..whereis import WEB_UUID
+from ...tests.utils import eq_, ok_, assert_raises
+from ...tests.utils import assert_in, assert_not_in
+
+UUID = "e605dca6-446a-11e0-8b2a-002170d25c55"
+
+
+def _records(here=True, urls=None):
+    return [
+        {'uuid': UUID, 'description': 'me@host:~/repo [here]', 'here': here},
+        {'uuid': WEB_UUID, 'description': 'web', 'here': False,
+         'urls': urls or []},
+    ]
+
+
+def test_WhereisResult():
+    result = WhereisResult()
+    for i in range(100):
+        result.add('file%d' % i, _records())
+    result.add('withurl', _records(urls=['http://example.com/a',
+                                         'http://example.com/b']))
+    result.add('webonly', _records()[1:])
+
+    eq_(len(result), 102)
+    # remotes are stored only once, as well as their combinations
+    eq_(len(result.remotes), 2)
+    ok_(result._files['file0'] is result._files['file99'])
+    eq_(list(result._urls), ['withurl'])
+
+    # backward compatible with dicts of records
+    eq_(set(result['file0']), {UUID, WEB_UUID})
+    eq_(set(result['webonly'].keys()), {WEB_UUID})
+    assert_in(UUID, result['file0'])
+    assert_not_in(UUID, result['webonly'])
+    eq_(result['file0'][UUID],
+        {'description': 'me@host:~/repo [here]', 'here': True, 'urls': []})
+    eq_(result['file0'][WEB_UUID]['urls'], [])
+    eq_(result['withurl'][WEB_UUID]['urls'],
+        ['http://example.com/a', 'http://example.com/b'])
+    assert_not_in('uuid', result['file0'][WEB_UUID])
+    eq_(result['file1'],
+        {UUID: {'description': 'me@host:~/repo [here]', 'here': True, 'urls': []},
+         WEB_UUID: {'description': 'web', 'here': False, 'urls': []}})
+    eq_(result['file1'], result['file2'])
+    eq_(result.get_uuids('webonly'), [WEB_UUID])
+    with assert_raises(KeyError):
+        result['file0']['bogus']
+    with assert_raises(KeyError):
+        result['bogus']
+    # modifying a returned record does not affect others
+    result['file0'][WEB_UUID]['urls'].append('http://example.com/c')
+    eq_(result['file1'][WEB_UUID]['urls'], [])
+
+    # re-adding a file replaces its records
+    result.add('withurl', _records(here=False))
+    eq_(result['withurl'][WEB_UUID]['urls'], [])
+    eq_(result['withurl'][UUID]['here'], False)
+    eq_(len(result.remotes), 3)
+    ok_('withurl' not in result._urls)
+
+    # web remote is always described as such
+    with assert_raises(AssertionError):
+        result.add('bogusweb', [{'uuid': WEB_UUID, 'description': 'bogus'}])
@@ -0,0 +1,251 @@
+# emacs: -*- mode: python; py-indent-offset: 4; tab-width: 4; indent-tabs-mode: nil -*-
+# ex: set sts=4 ts=4 sw=4 noet:
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+#
+#   See COPYING file distributed along with the datalad package for the
+#   copyright and license terms.
+#
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+"""Parallel transfers of annexed content (get, copy, drop)
+
+Transfers are ran by git-annex itself with `-J` jobs, consuming its --json
+(and --json-progress) output as a stream.  For `get` files are distributed
+among the remotes which have their content (according to the git-annex
+branch), so every remote gets its own annex process limited to the number
+of jobs allowed for that remote.
+
+"""
+
+import logging
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+
+from datalad import cfg
+from .annexkeys import get_key_size
+
+lgr = logging.getLogger('datalad.annex.transfer')
+
+
+class AnnexTransfer(object):
+    """Engine to run transfers of annexed content for a repository
+
+    Number of concurrent transfers is `jobs` per annex process, and for
+    a particular remote no more than its limit, taken from `remote_jobs` or
+    from `remote.<name>.datalad-jobs` git config option of the repository.
+    """
+
+    def __init__(self, repo, jobs=None, remote_jobs=None, progress=None):
+        """
+        Parameters
+        ----------
+        repo: AnnexRepo
+        jobs: int, optional
+          number of parallel transfers.  If not specified, taken from
+          'annex.transfer jobs' datalad configuration, which defaults to 1
+        remote_jobs: dict, optional
+          maximal number of parallel transfers per remote name
+        progress: callable, optional
+          to be called with each progress record (as produced by annex with
+          --json-progress).  If not provided, no progress is requested
+        """
+        self.repo = repo
+        if jobs is None:
+            jobs = int(cfg.get('annex', 'transfer jobs', default=1))
+        self.jobs = max(1, jobs)
+        self.remote_jobs = remote_jobs or {}
+        self.progress = progress
+
+    def get_remote_jobs(self, remote):
+        """Return maximal number of parallel transfers for a remote"""
+        if remote in self.remote_jobs:
+            jobs = self.remote_jobs[remote]
+        else:
+            jobs = self.repo.config.get_value('remote.%s' % remote,
+                                              'datalad-jobs',
+                                              default=self.jobs)
+        return max(1, min(int(jobs), self.jobs))
+
+    def _get_remotes_by_uuid(self):
+        remotes = {}
+        for remote in self.repo.get_remotes():
+            uuid = self.repo.config.get_value('remote.%s' % remote,
+                                              'annex-uuid', default=None)
+            if uuid:
+                remotes[uuid] = remote
+        return remotes
+
+    def _run(self, command, args, files, jobs, **kwargs):
+        """Run a single annex process and return its records for files/keys"""
+        args = list(args)
+        if jobs > 1:
+            args.append('-J%d' % jobs)
+        if self.progress is not None:
+            args.append('--json-progress')
+        records = []
+        for record in self.repo._run_annex_command_json(
+                command, args=args, files=files, **kwargs):
+            if 'success' not in record:
+                # progress report
+                if self.progress is not None:
+                    self.progress(record)
+                continue
+            records.append(record)
+        return records
+
+    def _run_groups(self, command, groups, **kwargs):
+        """Run annex processes for groups of (args, files, jobs) concurrently"""
+        if len(groups) == 1:
+            return [self._run(command, *groups[0], **kwargs)]
+        pool = ThreadPool(len(groups))
+        try:
+            return pool.map(lambda g: self._run(command, *g, **kwargs), groups)
+        finally:
+            pool.close()
+            pool.join()
+
+    @staticmethod
+    def _order(files, records, key=False):
+        """Sort records in the order of files they were reported for
+
+        Records for files (or keys) not among `files`, e.g. for files within
+        a directory or when ran with --all, follow in the order annex reported
+        them.
+        """
+        wanted = set(files or [])
+        by_file = {}
+        unmatched = []
+        for record in records:
+            f = record.get('key') if key and 'key' in record \
+                else record.get('file')
+            if f in wanted and f not in by_file:
+                by_file[f] = record
+            else:
+                unmatched.append(record)
+        return [by_file[f] for f in files or [] if f in by_file] + unmatched
+
+    def _get_jobs(self, remote):
+        """Return number of jobs for an annex process getting from `remote`
+
+        Without a remote annex picks remotes on its own, so no limit of any
+        particular remote could be applied, and `jobs` is used
+        """
+        return self.get_remote_jobs(remote) if remote else self.jobs
+
+    def get(self, files, options=None, **kwargs):
+        """Get content of files, from multiple remotes in parallel
+
+        Returns
+        -------
+        list of dict
+          records reported by annex for files, in the order of files.
+          Files which already have content are not reported
+        """
+        options = options[:] if options else []
+        groups = self._group_by_remote(files, options)
+        lgr.debug("Getting %d files using %d annex process(es)",
+                  len(files), len(groups))
+        results = OrderedDict()
+        failed = []
+        for (remote, _), records in zip(
+                groups.items(),
+                self._run_groups(
+                    'get',
+                    [(options + (['--from=%s' % remote] if remote else []),
+                      group_files,
+                      self._get_jobs(remote))
+                     for remote, group_files in groups.items()],
+                    **kwargs)):
+            for record in records:
+                if remote and not record.get('success'):
+                    # let annex try other remotes
+                    failed.append(record['file'])
+                else:
+                    results[record['file']] = record
+        if failed:
+            lgr.debug("Retrying %d files without specifying a remote",
+                      len(failed))
+            # as for any other file annex should get from wherever it decides
+            for record in self._run('get', options, failed,
+                                    self._get_jobs(None), **kwargs):
+                results[record['file']] = record
+        return self._order(files, results.values())
+
+    def _group_by_remote(self, files, options):
+        """Distribute files among remotes which have their content
+
+        Returns
+        -------
+        OrderedDict
+          {remote: files}, where remote is None for files to get from
+          wherever annex decides
+        """
+        if self.jobs == 1 or len(files) < 2 \
+                or any(o.startswith('--from') for o in options):
+            return OrderedDict([(None, files)])
+        remotes = self._get_remotes_by_uuid()
+        keys = []
+        for f in files:
+            try:
+                keys.append(self.repo.get_file_key(f, batch=True))
+            except Exception:
+                # not annexed -- annex will report on it
+                keys.append(None)
+        try:
+            locations = self.repo.annex_branch.get_locations(
+                [k for k in keys if k])
+        except Exception as exc:
+            lgr.debug("Could not get locations of files: %s", exc)
+            locations = {}
+        groups = OrderedDict()
+        load = {}
+        for f, key in zip(files, keys):
+            uuids = locations.get(key, []) if key else []
+            candidates = [remotes[u] for u in uuids if u in remotes]
+            if not candidates:
+                remote = None
+            else:
+                # the least loaded (in bytes per allowed job) remote
+                remote = min(candidates,
+                             key=lambda r: load.get(r, 0) / float(self.get_remote_jobs(r)))
+                load[remote] = load.get(remote, 0) + (get_key_size(key) or 1)
+            groups.setdefault(remote, []).append(f)
+        return groups
+
+    def copy_to(self, files, remote, options=None, **kwargs):
+        """Copy content of files to a remote
+
+        Returns
+        -------
+        list of dict
+          records reported by annex for files, in the order of files
+        """
+        args = ['--to=%s' % remote] + (options or [])
+        records = self._run('copy', args, files, self.get_remote_jobs(remote),
+                            **kwargs)
+        return self._order(files, records)
+
+    def drop(self, files, options=None, key=False, **kwargs):
+        """Drop content of files (or keys)
+
+        Returns
+        -------
+        list of dict
+          records reported by annex for files (or keys), in the order of files
+        """
+        options = options[:] if options else []
+        jobs = self.jobs
+        remotes = [o.split('=', 1)[1] for o in options if o.startswith('--from=')]
+        if remotes:
+            jobs = self.get_remote_jobs(remotes[0])
+        if not key:
+            return self._order(files,
+                               self._run('drop', options, files, jobs, **kwargs))
+        # annex does not take multiple --key's, so drop them in parallel
+        # processes instead
+        groups = [(options + ['--key', k], None, 1) for k in files]
+        records = []
+        for i in range(0, len(groups), jobs):
+            for group_records in self._run_groups('drop', groups[i:i + jobs],
+                                                  **kwargs):
+                records.extend(group_records)
+        return self._order(files, records, key=True)
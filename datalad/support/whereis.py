@@ -0,0 +1,168 @@
+# emacs: -*- mode: python; py-indent-offset: 4; tab-width: 4; indent-tabs-mode: nil -*-
+# ex: set sts=4 ts=4 sw=4 noet:
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+#
+#   See COPYING file distributed along with the datalad package for the
+#   copyright and license terms.
+#
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+"""Compact representation of `git annex whereis` results for many files
+
+Usually there are only a handful of remotes, which are the same for
+thousands of files.  So every remote (uuid, description, here) is stored only
+once in a table, every distinct combination of remotes is stored once as a
+tuple of indices into that table, and per file only a reference to such
+a tuple is kept, plus urls for those (few) files which have any.
+
+Records in the familiar form of `{uuid: {'description', 'here', 'urls'}}`
+are produced on request.
+"""
+
+import logging
+from collections import namedtuple
+
+try:
+    from collections.abc import Mapping
+except ImportError:  # pragma: no cover
+    # PY2
+    from collections import Mapping
+
+lgr = logging.getLogger('datalad.annex.whereis')
+
+# uuid of the special remote annex uses for urls
+WEB_UUID = "00000000-0000-0000-0000-000000000001"
+
+WhereisRemote = namedtuple('WhereisRemote', ['uuid', 'description', 'here'])
+
+
+class RemotesTable(object):
+    """Interned remote records, addressed by their index"""
+
+    def __init__(self):
+        self._remotes = []
+        self._indexes = {}
+
+    def __len__(self):
+        return len(self._remotes)
+
+    def __getitem__(self, index):
+        return self._remotes[index]
+
+    def __iter__(self):
+        return iter(self._remotes)
+
+    def intern(self, uuid, description, here):
+        """Return index of the remote record, adding it if not known yet"""
+        remote = WhereisRemote(uuid, description, here)
+        index = self._indexes.get(remote)
+        if index is None:
+            index = self._indexes[remote] = len(self._remotes)
+            self._remotes.append(remote)
+        return index
+
+
+class FileLocations(Mapping):
+    """Read-only view {uuid: {'description', 'here', 'urls'}} for a single file
+    """
+
+    __slots__ = ('_table', '_indexes', '_urls')
+
+    def __init__(self, table, indexes, urls=None):
+        self._table = table
+        self._indexes = indexes
+        self._urls = urls or {}
+
+    def _find(self, uuid):
+        for index in self._indexes:
+            if self._table[index].uuid == uuid:
+                return index
+        raise KeyError(uuid)
+
+    def __getitem__(self, uuid):
+        index = self._find(uuid)
+        remote = self._table[index]
+        return {'description': remote.description,
+                'here': remote.here,
+                'urls': list(self._urls.get(index, []))}
+
+    def __iter__(self):
+        return (self._table[index].uuid for index in self._indexes)
+
+    def __len__(self):
+        return len(self._indexes)
+
+    def __contains__(self, uuid):
+        return any(self._table[index].uuid == uuid for index in self._indexes)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+class WhereisResult(Mapping):
+    """Results of `git annex whereis --json` per file (or key)
+
+    Mapping of file -> FileLocations, which compares equal to (and could be
+    used instead of) `{uuid: {'description', 'here', 'urls'}}` per file.
+    """
+
+    def __init__(self, table=None):
+        """
+        Parameters
+        ----------
+        table: RemotesTable, optional
+          to share interned remotes among results (e.g. of the same repository)
+        """
+        self.remotes = table if table is not None else RemotesTable()
+        self._combinations = {}
+        # file -> tuple of indexes into self.remotes
+        self._files = {}
+        # file -> {index: tuple of urls}, only for files with urls
+        self._urls = {}
+
+    def add(self, name, records):
+        """Add locations of a file (or key)
+
+        Parameters
+        ----------
+        name: str
+        records: list of dict
+          as reported by annex in the 'whereis' field, with 'uuid',
+          'description', 'here' and (optionally) 'urls'
+        """
+        indexes = []
+        urls = {}
+        for record in records:
+            if record['uuid'] == WEB_UUID:
+                assert(record.get('description') == 'web')
+            index = self.remotes.intern(
+                record['uuid'], record.get('description'), record.get('here'))
+            indexes.append(index)
+            if record.get('urls'):
+                urls[index] = tuple(record['urls'])
+        indexes = tuple(indexes)
+        self._files[name] = self._combinations.setdefault(indexes, indexes)
+        if urls:
+            self._urls[name] = urls
+        else:
+            self._urls.pop(name, None)
+
+    def __getitem__(self, name):
+        return FileLocations(self.remotes, self._files[name],
+                             self._urls.get(name))
+
+    def __iter__(self):
+        return iter(self._files)
+
+    def __len__(self):
+        return len(self._files)
+
+    def __contains__(self, name):
+        return name in self._files
+
+    def __repr__(self):
+        return "<WhereisResult files=%d remotes=%d>" \
+               % (len(self._files), len(self.remotes))
+
+    def get_uuids(self, name):
+        """Return uuids of remotes which have the file, without brewing records"""
+        return [self.remotes[index].uuid for index in self._files[name]]
@@ -1,8 +1,20 @@
 """
 Helper to provide heavy load on stdout and stderr
+
+With an argument 'interleaved', writes large chunks without newlines
+alternating between the streams, starting with stderr, and flushing after
+each, so a reader which waits for a line on one stream would get stuck
 """
 import sys
 
 if __name__ == "__main__":
-    x = str(list(range(1000))) + '\n'
-    [(sys.stdout.writelines(x), sys.stderr.writelines(x)) for i in range(100)]
+    if sys.argv[1:] == ['interleaved']:
+        x = str(list(range(1000)))
+        for i in range(100):
+            for stream in (sys.stderr, sys.stdout):
+                stream.write(x * 10)
+                stream.flush()
+        sys.stdout.write('\n')
+    else:
+        x = str(list(range(1000))) + '\n'
+        [(sys.stdout.writelines(x), sys.stderr.writelines(x)) for i in range(100)]
@@ -10,16 +10,22 @@
 """
 
 from mock import patch
+from mock import MagicMock
+import errno
 import os
 from os.path import dirname, join as opj
 import sys
 import logging
 import shlex
 
+from six import PY3
+
 from .utils import ok_, eq_, assert_is, assert_equal, assert_false, \
-    assert_true, assert_greater, assert_raises, assert_in, SkipTest
+    assert_true, assert_greater, assert_raises, assert_in, assert_not_in, \
+    SkipTest
 
 from ..cmd import Runner, link_file_load
+from ..cmd import get_cmdline_chunks
 from ..support.exceptions import CommandError
 from ..support.protocol import DryRunProtocol
 from .utils import with_tempfile, assert_cwd_unchanged, \
@@ -185,18 +191,18 @@ def check_runner_heavy_output(log_online):
 
     #do it again with capturing:
     with swallow_logs():
-        ret = runner.run(cmd, log_stderr=True, log_stdout=True, expect_stderr=True)
+        ret = runner.run(cmd, log_stderr=True, log_stdout=True,
+                         expect_stderr=True, log_online=log_online)
+    eq_(ret[0], ret[1])
+    eq_(len(ret[0].splitlines()), 100)
 
-    return
-    # and now original problematic command with a massive single line
-    if not log_online:
-        # We know it would get stuck in online mode
-        cmd = '%s -c "import sys; x=str(list(range(1000))); ' \
-              '[(sys.stdout.write(x), sys.stderr.write(x)) ' \
-              'for i in range(100)];"' % sys.executable
-        with swallow_logs():
-            ret = runner.run(cmd, log_stderr=True, log_stdout=True,
-                             expect_stderr=True)
+    # and now massive chunks without newlines interleaved on both streams
+    with swallow_logs():
+        ret = runner.run(cmd + ' interleaved', log_stderr=True,
+                         log_stdout=True, expect_stderr=True,
+                         log_online=log_online)
+    eq_(ret[0], ret[1] + '\n')
+    eq_(len(ret[1]), 100 * 10 * len(str(list(range(1000)))))
 
 
 def test_runner_heavy_output():
@@ -204,6 +210,110 @@ def test_runner_heavy_output():
         yield check_runner_heavy_output, log_online
 
 
+def test_runner_callbacks():
+    runner = Runner()
+    cmd = [sys.executable, opj(dirname(__file__), "heavyoutput.py"),
+           "interleaved"]
+    out, err = [], []
+    ret = runner.run(cmd, stdout_callback=out.append,
+                     stderr_callback=err.append)
+    # passed to callbacks only
+    eq_(ret, ('', ''))
+    out, err = ''.join(out), ''.join(err)
+    eq_(out, err + '\n')
+    eq_(len(err), 100 * 10 * len(str(list(range(1000)))))
+
+    # callback for one of the streams
+    with swallow_logs(new_level=logging.DEBUG) as cml:
+        out = []
+        ret = runner.run([sys.executable, "-c",
+                          "import sys; sys.stdout.write('out'); "
+                          "sys.stderr.write('err')"],
+                         stdout_callback=out.append, expect_stderr=True)
+        eq_(ret, ('', 'err'))
+        eq_(out, ['out'])
+        assert_in('stderr| err', cml.out)
+        assert_not_in('stdout|', cml.out)
+
+    if not PY3:
+        # chunks are passed as bytes
+        return
+    # multibyte characters are not split among chunks
+    out = []
+    runner.run([sys.executable, "-c",
+                "import os; [os.write(1, b) for b in [b'\\xc3', b'\\xbc']]"],
+               stdout_callback=out.append)
+    eq_(u''.join(out), u'\xfc')
+
+
+def test_runner_gen():
+    runner = Runner()
+    cmd = [sys.executable, "-c",
+           "import sys; sys.stdout.write('0\\n1\\n2\\n'); sys.stderr.write('err')"]
+    with swallow_logs(new_level=logging.DEBUG) as cml:
+        gen = runner.run_gen(cmd, expect_stderr=True)
+        # nothing is ran until we ask for the output
+        assert_false(cml.out)
+        eq_(list(gen), ['0\n', '1\n', '2\n'])
+        assert_in('stderr| err', cml.out)
+
+    # we could stop consuming at any point
+    gen = runner.run_gen([sys.executable, "-c",
+                          "while True: print('spam')"])
+    eq_(next(gen), 'spam\n')
+    gen.close()
+
+    # records could be separated by e.g. NUL instead of newlines
+    gen = runner.run_gen([sys.executable, "-c",
+                          "import sys; sys.stdout.write('a b\\0c\\nd\\0\\0e')"],
+                         sep='\0')
+    eq_(list(gen), ['a b', 'c\nd', '', 'e'])
+
+    # failure is reported once the output was consumed
+    gen = runner.run_gen([sys.executable, "-c",
+                          "import sys; print('out'); sys.exit(2)"],
+                         expect_fail=True)
+    eq_(next(gen), 'out\n')
+    with assert_raises(CommandError) as cme:
+        next(gen)
+    eq_(cme.exception.code, 2)
+
+    # dry run yields nothing and just records the command
+    dry = DryRunProtocol()
+    eq_(list(Runner(protocol=dry).run_gen(cmd)), [])
+    eq_(dry[0]['command'], cmd)
+
+
+def test_get_cmdline_chunks():
+    eq_(get_cmdline_chunks([]), [[]])
+    eq_(get_cmdline_chunks(['a', 'b']), [['a', 'b']])
+    # each argument costs its length + 9 bytes
+    files = ['f%d' % i for i in range(10)]  # 11 bytes each
+    eq_(get_cmdline_chunks(files, max_size=21), [[f] for f in files])
+    eq_(get_cmdline_chunks(files, max_size=44),
+        [files[i:i + 4] for i in range(0, 10, 4)])
+    # base command is accounted for
+    eq_(get_cmdline_chunks(files, base_cmd=['git', 'add'], max_size=46),
+        [files[i:i + 2] for i in range(0, 10, 2)])
+    # a file which doesn't fit alone still goes on its own
+    eq_(get_cmdline_chunks(['a' * 100, 'b'], max_size=50), [['a' * 100], ['b']])
+    # sizes are in bytes, not characters
+    eq_(len(get_cmdline_chunks([u'\u0414' * 10] * 2, max_size=50)), 2)
+
+
+def test_runner_chunked():
+    runner = Runner()
+    files = [str(i) for i in range(2000)]
+    cmd = [sys.executable, '-c', 'import sys; print(" ".join(sys.argv[1:]))']
+    out, err = runner.run_chunked(cmd, files)
+    eq_(out, ' '.join(files) + '\n')
+    with patch('datalad.cmd.CMD_MAX_ARG', 2000):
+        for parallel in (False, True):
+            out, err = runner.run_chunked(cmd, files, parallel=parallel, jobs=3)
+            eq_(out.split(), files)  # order is preserved
+            ok_(out.count('\n') > 1)  # and it was ran multiple times
+
+
 @with_tempfile
 def test_link_file_load(tempfile):
     tempfile2 = tempfile + '_'
@@ -256,6 +366,80 @@ def test_link_file_load(tempfile):
     os.unlink(tempfile2)  # TODO: next two with_tempfile
 
 
+@with_tempfile(mkdir=True)
+def test_link_file_load_copy(path):
+    from .. import cmd
+    src = opj(path, 'src')
+    # larger than a single chunk of any copy method
+    content = os.urandom(3 * 1024 * 1024 + 1)
+    with open(src, 'wb') as f:
+        f.write(content)
+
+    def check_copy(dst):
+        with open(dst, 'rb') as f:
+            ok_(f.read() == content)
+        ok_(os.stat(src).st_ino != os.stat(dst).st_ino)
+        os.unlink(dst)
+
+    # every method available copies all of the content (if supported here)
+    for name, method in cmd._COPY_METHODS:
+        dst = opj(path, name)
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            try:
+                method(fsrc.fileno(), fdst.fileno(), len(content))
+            except (IOError, OSError) as exc:
+                assert_in(exc.errno, cmd._UNSUPPORTED_ERRNOS)
+                os.unlink(dst)
+                continue
+        check_copy(dst)
+
+    # unsupported methods are skipped, and the first working one remembered
+    def unsupported(*args):
+        raise OSError(errno.EXDEV, "TEST")
+    methods = [('unsupported', unsupported)] + cmd._COPY_METHODS[-1:]
+    with patch.object(cmd, '_COPY_METHODS', methods), \
+            patch.dict(cmd._copy_methods, clear=True):
+        eq_(cmd._copy_file(src, opj(path, 'dst')), 'copy')
+        check_copy(opj(path, 'dst'))
+        eq_(list(cmd._copy_methods.values()), ['copy'])
+        methods[0] = ('unsupported', None)
+        eq_(cmd._copy_file(src, opj(path, 'dst')), 'copy')
+        check_copy(opj(path, 'dst'))
+
+    # in-kernel copies which stop early are not taken for done
+    def copy_file_range(src_fd, dst_fd, count):
+        # copies the first chunk only
+        if os.lseek(dst_fd, 0, os.SEEK_CUR):
+            return 0
+        return os.write(dst_fd, os.read(src_fd, 1024))
+
+    def sendfile(dst_fd, src_fd, offset, count):
+        return copy_file_range(src_fd, dst_fd, count)
+    methods = [('copy_file_range', cmd._copy_file_range),
+               ('sendfile', cmd._copy_sendfile)] + cmd._COPY_METHODS[-1:]
+    with patch.object(cmd, '_COPY_METHODS', methods), \
+            patch.dict(cmd._copy_methods, clear=True), \
+            patch('os.copy_file_range', copy_file_range, create=True), \
+            patch('os.sendfile', sendfile, create=True):
+        eq_(cmd._copy_file(src, opj(path, 'dst')), 'copy')
+        check_copy(opj(path, 'dst'))
+        eq_(list(cmd._copy_methods.values()), ['copy'])
+
+    # file is copied if it cannot be linked, and linking is not tried again
+    link = MagicMock(side_effect=OSError(errno.EXDEV, "TEST"))
+    with patch('os.link', link), \
+            patch.object(cmd, '_link_unsupported', set()):
+        link_file_load(src, opj(path, 'dst'))
+        check_copy(opj(path, 'dst'))
+        link_file_load(src, opj(path, 'dst'))
+        check_copy(opj(path, 'dst'))
+    eq_(link.call_count, 1)
+
+    # other failures are not hidden
+    with patch('os.link', side_effect=OSError(errno.ENOENT, "TEST")):
+        assert_raises(OSError, link_file_load, src, opj(path, 'dst'))
+
+
 @with_tempfile(mkdir=True)
 def test_runner_failure(dir_):
     from ..support.annexrepo import AnnexRepo
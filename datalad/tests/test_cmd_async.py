@@ -0,0 +1,118 @@
+# emacs: -*- mode: python; py-indent-offset: 4; tab-width: 4; indent-tabs-mode: nil -*-
+# ex: set sts=4 ts=4 sw=4 noet:
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+#
+#   See COPYING file distributed along with the datalad package for the
+#   copyright and license terms.
+#
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+"""Test running commands via asyncio
+
+"""
+
+import logging
+import os
+import sys
+import time
+
+from .utils import ok_, eq_, assert_raises, assert_in, assert_greater
+from .utils import swallow_logs, with_tempfile, SkipTest
+
+from ..cmd import HAVE_ASYNC
+from ..support.exceptions import CommandError
+from ..support.protocol import DryRunProtocol
+from ..support.protocol import ExecutionTimeProtocol
+
+if not HAVE_ASYNC:
+    raise SkipTest("Requires Python >= 3.5")
+
+import asyncio
+from ..cmd_async import AsyncRunner, AsyncGitRunner, gather
+# defines coroutines, which would not even compile under older Pythons
+from .utils_async import tracked_job
+
+
+def _run(aw):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(aw)
+    finally:
+        loop.close()
+
+
+def _python(code):
+    return [sys.executable, '-c', code]
+
+
+def test_AsyncRunner():
+    runner = AsyncRunner()
+    with swallow_logs(new_level=logging.DEBUG) as cml:
+        eq_(_run(runner.run(_python("print('out')"))), ('out\n', ''))
+        assert_in('stdout| out', cml.out)
+    eq_(_run(runner.run('echo abc | tr a-z A-Z', cwd=os.curdir)),
+        ('ABC\n', ''))
+    eq_(_run(runner.run(['echo', 'a b'], shell=True)), ('a b\n', ''))
+
+    with assert_raises(CommandError) as cme:
+        _run(runner.run(
+            _python("import sys; sys.stderr.write('err'); sys.exit(3)"),
+            expect_fail=True))
+    eq_(cme.exception.code, 3)
+    eq_(cme.exception.stderr, 'err')
+
+
+def test_AsyncRunner_protocols():
+    dry = DryRunProtocol()
+    cmd = ['git', 'status']
+    eq_(_run(AsyncRunner(protocol=dry).run(cmd)), ('DRY', 'DRY'))
+    eq_(dry[0]['command'], cmd)
+
+    timed = ExecutionTimeProtocol()
+    _run(AsyncRunner(protocol=timed).run(_python("pass")))
+    eq_(len(timed), 1)
+    ok_(timed[0]['duration'] >= 0)
+
+
+@with_tempfile(mkdir=True)
+def test_AsyncGitRunner(path):
+    os.environ['GIT_DIR'] = os.path.relpath(path)
+    try:
+        out, _ = _run(AsyncGitRunner().run(
+            _python("import os; print(os.environ['GIT_DIR'])")))
+    finally:
+        del os.environ['GIT_DIR']
+    eq_(out.rstrip(), os.path.abspath(path))
+
+
+def test_gather():
+    runner = AsyncRunner()
+    cmds = [_python("import time; time.sleep(0.2); print(%d)" % i)
+            for i in range(8)]
+    t0 = time.time()
+    results = _run(runner.run_many(cmds, jobs=8))
+    eq_([int(out) for out, _ in results], list(range(8)))
+    # ran concurrently
+    assert_greater(8 * 0.2, time.time() - t0)
+
+    # limited concurrency
+    running = []
+    maximal = []
+    eq_(_run(gather((tracked_job(i, running, maximal) for i in range(20)),
+                    jobs=3)),
+        list(range(20)))
+    eq_(max(maximal), 3)
+
+    # failure cancels the rest, killing commands running already
+    cmds = [_python("import sys; sys.exit(1)")] + \
+        [_python("import time; time.sleep(30)")] * 4
+    t0 = time.time()
+    with swallow_logs():
+        assert_raises(CommandError, _run, runner.run_many(cmds, jobs=2))
+    assert_greater(10, time.time() - t0)
+
+    # or exceptions are returned
+    with swallow_logs():
+        results = _run(runner.run_many(cmds[:1] + [_python("pass")],
+                                       return_exceptions=True))
+    ok_(isinstance(results[0], CommandError))
+    eq_(results[1], ('', ''))
@@ -12,16 +12,26 @@ Note: DryRunProtocol and NullProtocol are already (kind of) tested within
       test_cmd.py
 """
 
+import json
 import os
+import subprocess
+import sys
 from os.path import normpath
+from os.path import join as opj
+from mock import patch
 from nose.tools import ok_, eq_, assert_is, assert_equal, assert_greater, \
     assert_raises, assert_in, assert_is_instance, assert_true, assert_false
 
 from ..support.protocol import DryRunProtocol, DryRunExternalsProtocol, \
     NullProtocol, ExecutionTimeProtocol, ExecutionTimeExternalsProtocol, \
-    ProtocolInterface
+    ProtocolInterface, ResourceUsageProtocol, get_command_kind, \
+    CassetteRecordProtocol, CassetteReplayProtocol, get_cassette_protocol
+from ..support.exceptions import CommandError
 from ..support.gitrepo import GitRepo
+from ..support.catfile import GitCatFile
+from ..support.annexrepo import BatchedAnnex
 from ..cmd import Runner
+from ..cmd import get_cmdline_chunks
 from .utils import with_tempfile
 from .utils import swallow_logs
 
@@ -146,6 +156,208 @@ def test_ExecutionTimeExternalsProtocol(path1, path2):
     assert_equal(len(timer_protocol), 2)
 
 
+def test_get_command_kind():
+    eq_(get_command_kind(['git', '-c', 'a=b', '-C', 'dir', 'status', '-z']),
+        'git status')
+    eq_(get_command_kind(['git', '--git-dir', 'x', 'annex', '--debug',
+                          'add', 'file']),
+        'git annex add')
+    eq_(get_command_kind(['git-annex', 'find']), 'git-annex find')
+    eq_(get_command_kind(['/usr/bin/wget', '-q', 'url']), 'wget')
+    eq_(get_command_kind([]), '')
+
+
+@with_tempfile(mkdir=True)
+@with_tempfile
+def test_ResourceUsageProtocol(path, protocol_file):
+    protocol = ResourceUsageProtocol()
+    runner = Runner(protocol=protocol)
+
+    runner.run(['git', 'init'], cwd=path)
+    runner.run([sys.executable, '-c', "print('x' * 1000)"])
+    eq_(list(runner.run_gen(['git', 'status', '--porcelain'], cwd=path)),
+        [])
+    with swallow_logs():
+        assert_raises(Exception, runner.run,
+                      [sys.executable, '-c', 'import sys; sys.exit(3)'])
+        assert_raises(Exception, runner.run, ['git', 'status'],
+                      cwd=path + '-nonexistent')
+    # callables are not recorded
+    runner.call(len, [])
+    eq_(len(protocol), 5)
+
+    init, python, status, failed, nonexistent = protocol
+    eq_(init['kind'], 'git init')
+    eq_(init['cwd'], path)
+    eq_(init['status'], 0)
+    ok_(init['end'] >= init['start'])
+    ok_(init['stdout_bytes'] > 0)
+    eq_(python['stdout_bytes'], 1001)
+    eq_(python['stderr_bytes'], 0)
+    eq_(status['kind'], 'git status')
+    eq_(status['stdout_bytes'], 0)
+    eq_(failed['status'], 3)
+    ok_(nonexistent['exception'] is not None)
+    ok_('status' not in nonexistent)
+    if hasattr(os, 'wait4'):
+        ok_(python['utime'] + python['stime'] > 0)
+        ok_(python['maxrss'] > 0)
+
+    summary = dict((row['kind'], row) for row in protocol.get_summary())
+    eq_(summary['git status']['count'], 2)
+    eq_(summary['git status']['failed'], 1)
+    eq_(summary[os.path.basename(sys.executable)]['count'], 2)
+    eq_(summary[os.path.basename(sys.executable)]['failed'], 1)
+    assert_in('git status', str(protocol))
+
+    protocol.write_to_file(protocol_file)
+    try:
+        with open(protocol_file) as f:
+            eq_(f.read(), str(protocol))
+        with open(protocol_file + '.json') as f:
+            trace = json.load(f)
+    finally:
+        os.unlink(protocol_file + '.json')
+    events = trace['traceEvents']
+    eq_(len(events), 5)
+    eq_(events[0]['name'], 'git init')
+    eq_(events[0]['ph'], 'X')
+    eq_(events[0]['args']['command'], 'git init')
+    ok_(events[1]['ts'] >= events[0]['ts'] + events[0]['dur'])
+
+
+@with_tempfile(mkdir=True)
+@with_tempfile
+def test_CassetteProtocols(path, cassette):
+    recorder = CassetteRecordProtocol(cassette, root=path)
+    runner = Runner(protocol=recorder)
+
+    commit = ['git', '-c', 'user.name=Tester', '-c', 'user.email=t@example.com',
+              'commit', '--allow-empty', '-q', '-m', 'msg']
+
+    def run_all(runner, path):
+        results = [
+            runner.run(['git', 'init', path]),
+            runner.run('echo "$VAR"', cwd=path, env=dict(os.environ, VAR='1')),
+            # the same command again, with other output
+            runner.run(commit, cwd=path),
+            list(runner.run_gen(['git', 'log', '-z', '--format=%s'],
+                                cwd=path, sep='\0')),
+            runner.run(commit, cwd=path),
+            list(runner.run_gen(['git', 'log', '-z', '--format=%s'],
+                                cwd=path, sep='\0'))]
+        with swallow_logs():
+            with assert_raises(CommandError) as cme:
+                runner.run(['git', 'log', 'nonexistent'], cwd=path)
+        results.append((cme.exception.code, cme.exception.stderr))
+        return results
+
+    recorded = run_all(runner, path)
+    eq_(recorded[1], ('1\n', ''))
+    eq_(recorded[3], ['msg'])
+    eq_(recorded[5], ['msg', 'msg'])
+    eq_(len(recorder), 7)
+    eq_(recorder[0]['command'], ['git', 'init', '{root}'])
+    eq_(recorder[1]['cwd'], '{root}')
+    eq_(recorder[1]['env'], {'VAR': '1'})
+    recorder.write_to_file()
+
+    # replayed elsewhere without running anything
+    other = path + '-replayed'
+    replayer = CassetteReplayProtocol(cassette, root=other)
+    with patch('subprocess.Popen') as popen:
+        eq_(run_all(Runner(protocol=replayer), other), recorded)
+        ok_(not popen.called)
+    eq_(len(replayer), 7)
+    eq_(replayer[0]['command'], ['git', 'init', other])
+    # all results were used
+    assert_raises(RuntimeError, Runner(protocol=replayer).run,
+                  ['git', 'init', other])
+
+    # selected via environment and shared among runners
+    with patch.dict(os.environ, {'DATALAD_CMD_PROTOCOL': 'replay',
+                                 'DATALAD_CMD_CASSETTE': cassette,
+                                 'DATALAD_CMD_CASSETTE_ROOT': path}):
+        protocol = Runner().protocol
+        ok_(isinstance(protocol, CassetteReplayProtocol))
+        ok_(protocol is Runner().protocol)
+        ok_(protocol is get_cassette_protocol('replay', cassette, root=path))
+        eq_(Runner().run(['git', 'init', path]), recorded[0])
+
+    # which requires a cassette
+    for mode in ('record', 'replay'):
+        with patch.dict(os.environ, {'DATALAD_CMD_PROTOCOL': mode}):
+            os.environ.pop('DATALAD_CMD_CASSETTE', None)
+            with assert_raises(ValueError) as cme:
+                Runner()
+            assert_in('DATALAD_CMD_CASSETTE', str(cme.exception))
+
+
+@with_tempfile(mkdir=True)
+@with_tempfile
+def test_CassetteProtocols_persistent_processes(path, cassette):
+    runner = Runner(cwd=path)
+    runner.run(['git', 'init'])
+    runner.run(['git', '-c', 'user.name=Tester', '-c', 'user.email=t@example.com',
+                'commit', '--allow-empty', '-q', '-m', 'msg'])
+    refs = ['HEAD', 'HEAD^{tree}', 'nonexistent']
+
+    def run_all(protocol, path):
+        catfile = GitCatFile(path, protocol=protocol)
+        results = [catfile.get_many(refs), catfile.get_info_many(refs)]
+        catfile.close()
+        for window in (1, 2):
+            annex = BatchedAnnex('lookupkey', path=path, window=window,
+                                 protocol=protocol)
+            results.append(annex(['file1', 'file 2']))
+            annex.close()
+        return results
+
+    recorder = CassetteRecordProtocol(cassette, root=path)
+    real_popen = subprocess.Popen
+    # annex is not needed to be available: cat replies with the request
+    with patch('datalad.support.annexrepo.Popen',
+               lambda cmd, **kwargs: real_popen(['cat'], **kwargs)):
+        recorded = run_all(recorder, path)
+    eq_(recorded[0][0].type, 'commit')
+    ok_(recorded[0][0].content.startswith(b'tree '))
+    eq_(recorded[0][2], None)
+    eq_(recorded[1][1].content, None)
+    eq_(recorded[2:], [['file1', 'file 2']] * 2)
+    recorder.write_to_file()
+
+    other = path + '-replayed'
+    replayer = CassetteReplayProtocol(cassette, root=other)
+    with patch('datalad.support.catfile.Popen') as catfile_popen, \
+            patch('datalad.support.annexrepo.Popen') as annex_popen:
+        eq_(run_all(replayer, other), recorded)
+        ok_(not catfile_popen.called)
+        ok_(not annex_popen.called)
+    # all responses were used
+    assert_raises(RuntimeError, GitCatFile(other, protocol=replayer).get,
+                  'HEAD')
+
+
+@with_tempfile(mkdir=True)
+@with_tempfile
+def test_CassetteReplayProtocol_chunked(path, cassette):
+    files = ['file%d' % i for i in range(10)]
+    with patch('datalad.cmd.CMD_MAX_ARG', 64):
+        recorder = CassetteRecordProtocol(cassette, root=path)
+        recorded = Runner(protocol=recorder, cwd=path).run_chunked(
+            ['echo'], files)
+        eq_(recorded, (''.join(' '.join(chunk) + '\n' for chunk in
+                               get_cmdline_chunks(files, ['echo'])), ''))
+        assert_greater(len(recorder), 1)
+        recorder.write_to_file()
+
+        replayer = CassetteReplayProtocol(cassette, root=path)
+        with patch('subprocess.Popen') as popen:
+            eq_(Runner(protocol=replayer, cwd=path).run_chunked(
+                ['echo'], files), recorded)
+            ok_(not popen.called)
+
+
 @with_tempfile
 def test_DryRunProtocol(path):
 
@@ -0,0 +1,27 @@
+# emacs: -*- mode: python; py-indent-offset: 4; tab-width: 4; indent-tabs-mode: nil -*-
+# ex: set sts=4 ts=4 sw=4 noet:
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+#
+#   See COPYING file distributed along with the datalad package for the
+#   copyright and license terms.
+#
+# ## ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+"""Helpers for testing datalad.cmd_async
+
+Uses syntax of Python >= 3.5, so import it only if `HAVE_ASYNC` (see
+datalad.cmd), i.e. not at the top of test modules collected with any Python
+"""
+
+import asyncio
+
+
+async def tracked_job(i, running, maximal, delay=0.01):
+    """Sleep for `delay`, recording the number of `running` jobs in `maximal`
+
+    Returns `i`
+    """
+    running.append(i)
+    maximal.append(len(running))
+    await asyncio.sleep(delay)
+    running.remove(i)
+    return i